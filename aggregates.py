@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Cached aggregate figures: counts and totals that only change when conversations are imported or deleted.
+
+Figures are kept in process memory, shared by every request and worker thread, and tagged with the
+database's data version: a counter in settings that db.import_conversations_data,
+db.import_conversations_sharded and db.delete_conversation advance (bump_version) in the same
+transaction as their writes. A read that finds a different version, after a write by this process or
+another one (a CLI ingest), drops the cached figures. Browsing then pays one settings lookup per figure
+instead of a full-table count. The version also goes into the API's and conversation pages' ETags
+(http_cache).
+
+Pin toggles change none of these figures, so they advance a separate counter, the pins version
+(bump_pins_version), which only the ETags of responses that show pin state include.
+"""
+
+import threading
+
+MAX_ENTRIES = 512  # figures kept per database; keyed ones (per search or filter) can be many
+
+_VERSION_SQL = 'SELECT value FROM settings WHERE key = ?'
+_BUMP_SQL = '''
+    INSERT INTO settings (key, value) VALUES (?, '1')
+    ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+'''
+
+_lock = threading.Lock()
+_cache = {}  # database file -> (data version, {key: value})
+
+
+def _version(conn, key):
+    row = conn.execute(_VERSION_SQL, (key,)).fetchone()
+    return int(row[0]) if row and row[0] else 0
+
+
+def data_version(conn):
+    """The database's current data version (0 before the first import or delete)."""
+    return _version(conn, 'data_version')
+
+
+def bump_version(conn):
+    """Advance the data version, in the caller's transaction; every write that changes counts calls this."""
+    conn.execute(_BUMP_SQL, ('data_version',))
+
+
+def pins_version(conn):
+    """The database's current pins version (0 before the first pin toggle)."""
+    return _version(conn, 'pins_version')
+
+
+def bump_pins_version(conn):
+    """Advance the pins version, in the caller's transaction. Cached figures are kept."""
+    conn.execute(_BUMP_SQL, ('pins_version',))
+
+
+def get(conn, key, compute):
+    """compute(conn), cached under key until the data version changes. key must be hashable.
+
+    The value is shared between threads, so callers must not modify it.
+    """
+    database = conn.execute('PRAGMA database_list').fetchone()[2]
+    version = data_version(conn)
+    with _lock:
+        entry = _cache.get(database)
+        if entry is not None and entry[0] == version and key in entry[1]:
+            return entry[1][key]
+    value = compute(conn)
+    with _lock:
+        entry = _cache.get(database)
+        if entry is None or entry[0] != version:
+            entry = _cache[database] = (version, {})
+        figures = entry[1]
+        if len(figures) >= MAX_ENTRIES:
+            del figures[next(iter(figures))]
+        figures[key] = value
+    return value
+
+
+def clear():
+    """Drop every cached figure (tests, or after replacing the database file)."""
+    with _lock:
+        _cache.clear()
@@ -4,13 +4,16 @@
 """Flask app: creation, config, blueprint and filter registration."""
 
 import os
+import threading
 
 from flask import Flask, has_request_context, request
 from werkzeug.exceptions import RequestEntityTooLarge
 
 import db
+import migrations
 from csrf import get_csrf_token
 from filters import register_filters
+from routes.api import bp as api_bp
 from routes.main import bp as main_bp
 
 
@@ -37,6 +40,33 @@ app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_UPLOAD_MB", "100")) *
 app.teardown_appcontext(db.close_db)
 register_filters(app)
 app.register_blueprint(main_bp)
+app.register_blueprint(api_bp)
+
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+@app.before_request
+def ensure_schema():
+    """Check the database once per process, before the first request under any server (flask run, WSGI).
+
+    A new database is created and schema.sql applied (db.init_db), which is quick. Pending migrations on
+    an existing one can take minutes (backfills), so they are never run inside a request: every request
+    gets a 503 naming the migrate command until they have been applied.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return None
+    with _schema_lock:
+        if _schema_ready:
+            return None
+        if migrations.needs_upgrade(db.get_db()):
+            return ("The database schema is out of date. Run `python init_db.py migrate` "
+                    "(back up large databases first), then reload this page."), 503
+        db.init_db()
+        _schema_ready = True
+    return None
 
 
 @app.context_processor
@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Compact an existing database: move long message values into the deduplicated blob store and prune unused blobs.
+
+--compress also turns on the compress_content setting and compresses large stored values (new imports then
+compress too); --decompress turns it off and inflates them again.
+"""
+import argparse
+import os
+import sys
+
+from app import app
+from db import get_db, init_db, set_setting
+import storage
+
+
+def main():
+    from db import DATABASE_PATH
+    parser = argparse.ArgumentParser(description="Compact the ChatGPT Browser database in place.")
+    parser.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards so the file actually shrinks on disk")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--compress",
+        action="store_true",
+        help=f"Enable compressed storage and zlib-compress stored values of {storage.COMPRESS_MIN_LENGTH}+ characters",
+    )
+    mode.add_argument("--decompress", action="store_true", help="Disable compressed storage and inflate compressed values")
+    args = parser.parse_args()
+    if not os.path.exists(DATABASE_PATH):
+        print(f"Error: database not found: {DATABASE_PATH}", file=sys.stderr)
+        sys.exit(1)
+    size_before = os.path.getsize(DATABASE_PATH)
+    with app.app_context():
+        init_db()  # brings older databases up to date (migrations, content_blobs)
+        if args.compress or args.decompress:
+            set_setting('compress_content', 'true' if args.compress else 'false')
+        conn = get_db()
+        compress = storage.compression_enabled(conn)
+        moved = storage.dedup_existing(conn, compress=compress, progress=lambda n: print(f"Moved {n} values", file=sys.stderr))
+        pruned = storage.prune_blobs(conn)
+        recoded = 0
+        if args.compress or args.decompress:
+            recoded = storage.recode_blobs(
+                conn, compress, progress=lambda n: print(f"{'Compressed' if compress else 'Inflated'} {n} blobs", file=sys.stderr),
+            )
+        if args.vacuum:
+            print("Running VACUUM...", file=sys.stderr)
+            conn.execute('VACUUM')
+    size_after = os.path.getsize(DATABASE_PATH)
+    print(f"Moved {moved} values into the blob store, pruned {pruned} unused blobs.")
+    if args.compress or args.decompress:
+        print(f"{'Compressed' if args.compress else 'Inflated'} {recoded} blobs.")
+    print(f"Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,55 @@
 # Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
 """Database access: connection lifecycle, schema init, settings, and conversation import."""
 
+import collections
+import contextlib
+import functools
+import hashlib
+import itertools
 import json
+import multiprocessing
 import os
+import queue
 import sqlite3
 import sys
+import tempfile
+import time
+import zlib
+from collections.abc import Iterable
 
 from flask import g
 
+import aggregates
+import facets
+import search
+import storage
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.environ.get('DATABASE_PATH') or os.path.join(BASE_DIR, 'chatgpt.db')
 
 IMPORT_BATCH_SIZE = 50
 
+# Tables copied from each shard into the main database by import_conversations_sharded, in FK order.
+SHARD_MERGE_TABLES = (
+    'conversations',
+    'content_blobs',
+    'messages',
+    'message_metadata',
+    'message_children',
+    'canonical_thread',
+    'conversation_summary',
+    'conversation_facets',
+)
+
+# Connection settings for cold loads (see _bulk_load); the previous values are restored afterwards.
+BULK_LOAD_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'OFF'),
+    ('cache_size', -262144),  # KiB, i.e. 256 MiB of page cache
+    ('temp_store', 'MEMORY'),
+    ('foreign_keys', 'OFF'),  # the importer only links messages it has inserted
+)
+
 
 def get_db():
     try:
@@ -45,12 +82,19 @@ def _close_if_not_from_g(conn):
         conn.close()
 
 
-def init_db():
-    """Create schema and defaults. Uses schema.sql. Uses get_db() so tests can patch it; run within app.app_context() when calling from CLI."""
-    conn = get_db()
+def _apply_schema(conn):
+    """Bring conn up to date: pending migrations (existing databases), then schema.sql, whose statements are idempotent."""
+    import migrations  # migrations' steps call back into this module
+    migrations.upgrade(conn)
     schema_path = os.path.join(BASE_DIR, 'schema.sql')
     with open(schema_path, encoding='utf-8') as f:
         conn.executescript(f.read())
+
+
+def init_db():
+    """Create schema and defaults. Uses schema.sql. Uses get_db() so tests can patch it; run within app.app_context() when calling from CLI."""
+    conn = get_db()
+    _apply_schema(conn)
     conn.commit()
 
 
@@ -98,101 +142,884 @@ def _parse_timestamp(ts):
         return None
 
 
-def import_conversations_data(data):
-    """Import a list of conversation dicts into the database. Used by both web upload and CLI ingest."""
-    if not isinstance(data, list):
-        data = [data]
-    total = len(data)
-    print(f"Importing {total} conversations...")
-    conn = get_db()
-    imported = 0
-    for conversation in data:
-        try:
+def _as_conversation_iterable(data):
+    """Accept a list, any iterable of conversation dicts (e.g. a ConversationStream), or a single dict."""
+    if isinstance(data, (dict, str, bytes)) or not isinstance(data, Iterable):
+        return [data]
+    return data
+
+
+_CONVERSATION_SQL = '''
+    INSERT OR REPLACE INTO conversations
+    (id, create_time, update_time, title)
+    VALUES (?, ?, ?, ?)
+'''
+_MESSAGE_SQL = '''
+    INSERT OR REPLACE INTO messages
+    (id, conversation_id, role, content, create_time, update_time, parent_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+_METADATA_SQL = '''
+    INSERT OR REPLACE INTO message_metadata
+    (message_id, message_type, model_slug, citations,
+     content_references, finish_details, is_complete,
+     request_id, timestamp_, message_source, serialization_metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_DELETE_CHILDREN_SQL = 'DELETE FROM message_children WHERE parent_id = ?'
+_FINGERPRINT_SQL = '''
+    INSERT OR REPLACE INTO conversation_fingerprints
+    (conversation_id, update_time, fingerprint)
+    VALUES (?, ?, ?)
+'''
+_DELETE_FINGERPRINT_SQL = 'DELETE FROM conversation_fingerprints WHERE conversation_id = ?'
+_CHILD_SQL = '''
+    INSERT INTO message_children (parent_id, child_id)
+    VALUES (?, ?)
+'''
+_DELETE_THREAD_SQL = 'DELETE FROM canonical_thread WHERE conversation_id = ?'
+_THREAD_SQL = '''
+    INSERT INTO canonical_thread (conversation_id, position, message_id)
+    VALUES (?, ?, ?)
+'''
+_DELETE_FACETS_SQL = 'DELETE FROM conversation_facets WHERE conversation_id = ?'
+_FACET_SQL = '''
+    INSERT INTO conversation_facets (facet, value, conversation_id)
+    VALUES (?, ?, ?)
+'''
+_DELETE_TEXT_SQL = 'DELETE FROM message_text WHERE message_id = ?'
+_TEXT_SQL = 'INSERT INTO message_text (message_id, conversation_id, body) VALUES (?, ?, ?)'
+_SUMMARY_SQL = '''
+    INSERT OR REPLACE INTO conversation_summary
+    (conversation_id, message_count, canonical_length, first_message_time, last_message_time, models)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+def _time_key(value):
+    """Sort key for a create_time as stored (float at import, TEXT once read back); missing sorts first."""
+    try:
+        return (1, float(value))
+    except (TypeError, ValueError):
+        return (0, 0.0)
+
+
+def _canonical_thread_rows(conversation_id, messages):
+    """canonical_thread rows for messages given as (id, create_time, parent_id), root at position 1.
+
+    The leaf is the message no other message names as parent with the latest create_time (the first
+    such in input order on a tie); the thread is that leaf and its parent chain within the conversation.
+    """
+    by_id = {}
+    for message_id, create_time, parent_id in messages:
+        by_id[message_id] = (create_time, parent_id)
+    parents = {parent_id for _, parent_id in by_id.values()}
+    leaves = [message_id for message_id in by_id if message_id not in parents]
+    if not leaves:
+        return []
+    node = max(leaves, key=lambda message_id: _time_key(by_id[message_id][0]))
+    path = []
+    seen = set()
+    while node in by_id and node not in seen:  # seen guards against parent cycles
+        path.append(node)
+        seen.add(node)
+        node = by_id[node][1]
+    return [(conversation_id, position, message_id) for position, message_id in enumerate(reversed(path), start=1)]
+
+
+def _summary_row(conversation_id, message_count, canonical_length, create_times, models):
+    """conversation_summary row: counts, first/last message time (ignoring missing ones) and sorted distinct models."""
+    times = [key[1] for key in map(_time_key, create_times) if key[0]]
+    models = sorted({model for model in models if model and isinstance(model, str)})
+    return (
+        conversation_id,
+        message_count,
+        canonical_length,
+        min(times) if times else None,
+        max(times) if times else None,
+        json.dumps(models),
+    )
+
+
+def _conversation_fingerprint(conversation):
+    """Stable hash of a conversation's full export JSON (key order independent)."""
+    canonical = json.dumps(conversation, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _conversation_rows(conversation, compress=False, fingerprint=None):
+    """Normalize one export conversation into ready-to-insert rows. Pure Python, no DB access.
+
+    Returns None (after reporting) when the conversation has no id. Otherwise a dict with:
+    'id'; 'conversation' row; 'fingerprint' row (None unless fingerprint is given, i.e. delta imports); 'messages' as [(message_row, metadata_row or None)]
+    in mapping order; 'children' as [(message_id, raw children list)] for those messages; 'thread' as
+    canonical_thread rows (_canonical_thread_rows); 'summary' as its conversation_summary row; 'facets'
+    as its conversation_facets rows (facets.facet_rows); 'text' as
+    message_text rows (message_id, conversation_id, body) for every written message, body '' when it has
+    nothing searchable (search.message_text); 'blobs'
+    as [(ref, data)] for long values stored by reference (storage.store_value, compressed when compress
+    is set); and 'error' when the mapping itself could not be walked (the conversation row is still
+    written, but not counted as imported).
+    """
+    conversation_id = conversation.get('id')
+    if not conversation_id:
+        print("Skipping conversation: missing ID")
+        return None
+    rows = {
+        'id': conversation_id,
+        'conversation': (
+            conversation_id,
+            conversation.get('create_time', ''),
+            conversation.get('update_time', ''),
+            conversation.get('title', ''),
+        ),
+        'fingerprint': (
+            conversation_id,
+            conversation.get('update_time', ''),
+            fingerprint,
+        ) if fingerprint else None,
+        'messages': [],
+        'children': [],
+        'thread': [],
+        'summary': None,
+        'facets': [],
+        'text': [],
+        'blobs': [],
+        'error': None,
+    }
+    blobs = {}
+    texts = {}
+    kinds = {}
+    try:
+        messages = conversation.get('mapping', {})
+        for message_id, message_data in messages.items():
+            try:
+                message = message_data.get('message', {})
+                if not message:
+                    continue
+                author = message.get('author', {})
+                content = message.get('content', {})
+                message_row = (
+                    message_id,
+                    conversation_id,
+                    author.get('role', ''),
+                    storage.store_value(json.dumps(content.get('parts', [])), blobs, compress),
+                    _parse_timestamp(message.get('create_time')),
+                    _parse_timestamp(message.get('update_time')),
+                    message_data.get('parent', ''),
+                )
+                texts[message_id] = search.message_text(content.get('parts', []))
+                kinds[message_id] = facets.content_types(content)
+            except Exception as e:
+                print(f"Error processing message {message_id}: {str(e)}")
+                continue
+            metadata_row = None
+            try:
+                metadata = message.get('metadata', {})
+                if metadata:
+                    metadata_row = (
+                        message_id,
+                        metadata.get('message_type', ''),
+                        metadata.get('model_slug', ''),
+                        storage.store_value(json.dumps(metadata.get('citations', [])), blobs, compress),
+                        storage.store_value(json.dumps(metadata.get('content_references', [])), blobs, compress),
+                        storage.store_value(json.dumps(metadata.get('finish_details', {})), blobs, compress),
+                        metadata.get('is_complete', False),
+                        metadata.get('request_id', ''),
+                        metadata.get('timestamp', ''),
+                        metadata.get('message_source', ''),
+                        storage.store_value(json.dumps(metadata.get('serialization_metadata', {})), blobs, compress),
+                    )
+            except Exception as e:
+                # The message row is still written; only its metadata is lost.
+                print(f"Error processing message {message_id}: {str(e)}")
+            rows['messages'].append((message_row, metadata_row))
+            rows['children'].append((message_id, message_data.get('children', [])))
+        rows['thread'] = _canonical_thread_rows(conversation_id, [(m[0], m[4], m[6]) for m, _ in rows['messages']])
+        latest = {m[0]: (m, meta) for m, meta in rows['messages']}  # a repeated message id is written once
+        rows['summary'] = _summary_row(
+            conversation_id,
+            len(latest),
+            len(rows['thread']),
+            [m[4] for m, _ in latest.values()],
+            [meta[2] for _, meta in latest.values() if meta is not None],
+        )
+        rows['facets'] = facets.facet_rows(
+            conversation_id,
+            [meta[2] for _, meta in latest.values() if meta is not None],
+            [m[2] for m, _ in latest.values()],
+            set().union(*(kinds[message_id] for message_id in latest)),
+        )
+        rows['text'] = [(message_id, conversation_id, texts[message_id]) for message_id in latest]
+    except Exception as e:
+        rows['error'] = str(e)
+    rows['blobs'] = list(blobs.items())
+    return rows
+
+
+def _build_conversation_rows(conversation, compress=False, known=None):
+    """_conversation_rows that reports failures instead of raising, so it is safe to map in a worker pool.
+
+    known (delta imports) maps conversation id -> stored fingerprint. The fingerprint is then computed
+    first, on the raw dict, and a conversation whose fingerprint matches is not normalized at all:
+    the result is {'id': ..., 'unchanged': True}.
+    """
+    try:
+        fingerprint = None
+        if known is not None:
+            fingerprint = _conversation_fingerprint(conversation)
             conversation_id = conversation.get('id')
-            if not conversation_id:
-                print("Skipping conversation: missing ID")
+            if conversation_id and known.get(conversation_id) == fingerprint:
+                return {'id': conversation_id, 'unchanged': True}
+        return _conversation_rows(conversation, compress, fingerprint)
+    except Exception as e:
+        print(f"Error processing conversation: {str(e)}")
+        return None
+
+
+_worker_known = None  # the delta import's stored fingerprints, in each pool worker
+
+
+def _init_worker(known):
+    global _worker_known
+    _worker_known = known
+
+
+def _build_in_worker(conversation, compress=False):
+    return _build_conversation_rows(conversation, compress, _worker_known)
+
+
+def _iter_conversation_rows(data, workers=1, compress=False, known=None):
+    """Yield _build_conversation_rows(conversation, compress, known) for each conversation, in input order.
+
+    With workers > 1 the normalization (mapping walk, json.dumps of parts and metadata, timestamp
+    parsing) and the delta fingerprint check run in a process pool while the caller keeps writing. known
+    is handed to each worker once, at start. Input is taken one window at a time, with at most two
+    windows in flight, so a streamed export is never pulled into memory whole.
+    """
+    if workers <= 1:
+        for conversation in data:
+            yield _build_conversation_rows(conversation, compress, known)
+        return
+    build = functools.partial(_build_in_worker, compress=compress)
+    window = workers * IMPORT_BATCH_SIZE
+    chunksize = max(1, IMPORT_BATCH_SIZE // 4)
+    iterator = iter(data)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(known,)) as pool:
+        pending = None
+        while True:
+            chunk = list(itertools.islice(iterator, window))
+            result = pool.map_async(build, chunk, chunksize=chunksize) if chunk else None
+            if pending is not None:
+                yield from pending.get()
+            if result is None:
+                break
+            pending = result
+
+
+_DONE = object()
+
+
+@contextlib.contextmanager
+def _phase(timings, name):
+    """Add the wall time of the block to timings[name] (no-op when timings is None)."""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def _timed_iter(iterable, timings, name):
+    """Yield from iterable, charging the time spent producing each item to timings[name]."""
+    iterator = iter(iterable)
+    while True:
+        with _phase(timings, name):
+            item = next(iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+def _linkable_children(parent_id, children, inserted_message_ids):
+    """Child ids to link under parent_id: only ids inserted in this conversation, in order.
+
+    A repeated child id would violate the message_children primary key, which aborts the rest of
+    that parent's links; stop at the same point so every writer produces identical rows.
+    """
+    linked = []
+    try:
+        for child_id in children:
+            if child_id not in inserted_message_ids:
                 continue
-            create_time = conversation.get('create_time', '')
-            update_time = conversation.get('update_time', '')
-            title = conversation.get('title', '')
-            conn.execute('''
-                INSERT OR REPLACE INTO conversations
-                (id, create_time, update_time, title)
-                VALUES (?, ?, ?, ?)
-            ''', (conversation_id, create_time, update_time, title))
-            messages = conversation.get('mapping', {})
+            if child_id in linked:
+                raise sqlite3.IntegrityError('UNIQUE constraint failed: message_children.parent_id, message_children.child_id')
+            linked.append(child_id)
+    except Exception as e:
+        print(f"Error processing message_children for {parent_id}: {str(e)}")
+    return linked
+
+
+def _delete_messages(conn, conversation_ids):
+    """Delete the messages of these conversations with their metadata, links and search text.
+
+    Run before a conversation is rewritten, so messages missing from the new export (pruned branches)
+    do not linger.
+    """
+    ids = [(conversation_id,) for conversation_id in conversation_ids]
+    conn.executemany('DELETE FROM message_metadata WHERE message_id IN (SELECT id FROM messages WHERE conversation_id = ?)', ids)
+    conn.executemany('DELETE FROM message_children WHERE parent_id IN (SELECT id FROM messages WHERE conversation_id = ?) OR child_id IN (SELECT id FROM messages WHERE conversation_id = ?)', [i * 2 for i in ids])
+    conn.executemany('DELETE FROM messages WHERE conversation_id = ?', ids)
+    conn.executemany('DELETE FROM message_text WHERE conversation_id = ?', ids)
+
+
+def _existing_conversations(conn, conversation_ids):
+    """The subset of conversation_ids already in the database (primary-key lookups)."""
+    conversation_ids = list(conversation_ids)
+    if not conversation_ids:
+        return set()
+    placeholders = ', '.join('?' * len(conversation_ids))
+    return {r[0] for r in conn.execute(f'SELECT id FROM conversations WHERE id IN ({placeholders})', conversation_ids)}
+
+
+def _write_conversation(conn, rows, timings=None):
+    """Write one conversation's rows statement by statement. Returns 1 if imported, else 0.
+
+    A conversation already in the database has its old messages deleted first (_delete_messages), and
+    its thread and facets replaced. New conversations skip those deletes: under _bulk_load the indexes
+    they would use are dropped, so each would scan its table.
+    """
+    conversation_id = rows['id']
+    try:
+        with _phase(timings, 'messages'):
+            existing = _existing_conversations(conn, [conversation_id])
+            conn.execute(_CONVERSATION_SQL, rows['conversation'])
+            if rows['error']:
+                raise ValueError(rows['error'])
+            _delete_messages(conn, existing)
+            storage.write_blobs(conn, rows['blobs'])
             inserted_message_ids = set()
             # Pass 1: insert all messages so every id exists before we add message_children
             # (message_children FK requires both parent_id and child_id to exist in messages)
-            for message_id, message_data in messages.items():
+            for message_row, metadata_row in rows['messages']:
+                message_id = message_row[0]
                 try:
-                    message = message_data.get('message', {})
-                    if not message:
-                        continue
-                    author = message.get('author', {})
-                    content = message.get('content', {})
-                    role = author.get('role', '')
-                    content_text = json.dumps(content.get('parts', []))
-                    msg_create_time = _parse_timestamp(message.get('create_time'))
-                    msg_update_time = _parse_timestamp(message.get('update_time'))
-                    parent_id = message_data.get('parent', '')
-                    conn.execute('''
-                        INSERT OR REPLACE INTO messages
-                        (id, conversation_id, role, content, create_time, update_time, parent_id)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (message_id, conversation_id, role, content_text,
-                          msg_create_time, msg_update_time, parent_id))
+                    conn.execute(_MESSAGE_SQL, message_row)
                     inserted_message_ids.add(message_id)
-                    metadata = message.get('metadata', {})
-                    if metadata:
-                        conn.execute('''
-                            INSERT OR REPLACE INTO message_metadata
-                            (message_id, message_type, model_slug, citations,
-                             content_references, finish_details, is_complete,
-                             request_id, timestamp_, message_source, serialization_metadata)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            message_id,
-                            metadata.get('message_type', ''),
-                            metadata.get('model_slug', ''),
-                            json.dumps(metadata.get('citations', [])),
-                            json.dumps(metadata.get('content_references', [])),
-                            json.dumps(metadata.get('finish_details', {})),
-                            metadata.get('is_complete', False),
-                            metadata.get('request_id', ''),
-                            metadata.get('timestamp', ''),
-                            metadata.get('message_source', ''),
-                            json.dumps(metadata.get('serialization_metadata', {}))
-                        ))
+                    if metadata_row is not None:
+                        conn.execute(_METADATA_SQL, metadata_row)
                 except Exception as e:
                     print(f"Error processing message {message_id}: {str(e)}")
                     continue
+        with _phase(timings, 'children'):
             # Pass 2: insert message_children only where both parent and child were inserted
-            for message_id, message_data in messages.items():
-                if message_id not in inserted_message_ids:
+            for message_id, children in rows['children']:
+                if message_id not in inserted_message_ids or not children:
                     continue
                 try:
-                    children = message_data.get('children', [])
-                    if not children:
-                        continue
-                    conn.execute('DELETE FROM message_children WHERE parent_id = ?', (message_id,))
-                    for child_id in children:
-                        if child_id not in inserted_message_ids:
-                            continue
-                        conn.execute('''
-                            INSERT INTO message_children (parent_id, child_id)
-                            VALUES (?, ?)
-                        ''', (message_id, child_id))
+                    conn.execute(_DELETE_CHILDREN_SQL, (message_id,))
+                    for child_id in _linkable_children(message_id, children, inserted_message_ids):
+                        conn.execute(_CHILD_SQL, (message_id, child_id))
                 except Exception as e:
                     print(f"Error processing message_children for {message_id}: {str(e)}")
                     continue
-            imported += 1
-            if imported % IMPORT_BATCH_SIZE == 0:
-                conn.commit()
-                print(f"Imported {imported} / {total} conversations", file=sys.stderr)
-        except Exception as e:
-            print(f"Error processing conversation {conversation_id}: {str(e)}")
+        with _phase(timings, 'derived'):
+            texts = [row for row in rows['text'] if row[0] in inserted_message_ids]
+            conn.executemany(_DELETE_TEXT_SQL, [(row[0],) for row in texts])
+            conn.executemany(_TEXT_SQL, [row for row in texts if row[2]])
+            if existing:
+                conn.execute(_DELETE_THREAD_SQL, (conversation_id,))
+                conn.execute(_DELETE_FACETS_SQL, (conversation_id,))
+            conn.executemany(_THREAD_SQL, rows['thread'])
+            conn.execute(_SUMMARY_SQL, rows['summary'])
+            conn.executemany(_FACET_SQL, rows['facets'])
+            _write_fingerprint(conn, rows)
+        return 1
+    except Exception as e:
+        print(f"Error processing conversation {conversation_id}: {str(e)}")
+        return 0
+
+
+def _write_batch_bulk(conn, batch, timings=None):
+    """Write a batch of built conversations with one executemany per statement. Returns the number imported.
+
+    Produces the same rows as calling _write_conversation on each entry in order: conversations already
+    in the database (and only those) lose their old messages, thread and facets first, a conversation repeated in the batch keeps only its
+    last entry's messages, messages and metadata keep their order (so INSERT OR REPLACE resolves
+    duplicates the same way) and, for a parent that appears in several conversations, the last non-empty
+    children list wins. If any statement fails (e.g. a value SQLite cannot bind), the batch is rolled back
+    and replayed row by row for per-row error handling.
+    """
+    conn.execute('SAVEPOINT import_bulk')
+    try:
+        with _phase(timings, 'messages'):
+            complete = [rows for rows in batch if not rows['error']]
+            existing = _existing_conversations(conn, {rows['id'] for rows in complete})
+            conn.executemany(_CONVERSATION_SQL, [rows['conversation'] for rows in batch])
+            _delete_messages(conn, existing)
+            written = list({rows['id']: rows for rows in complete}.values())
+            storage.write_blobs(conn, [blob for rows in written for blob in rows['blobs']])
+            conn.executemany(_MESSAGE_SQL, [m for rows in written for m, _ in rows['messages']])
+            conn.executemany(_METADATA_SQL, [meta for rows in written for _, meta in rows['messages'] if meta is not None])
+        with _phase(timings, 'children'):
+            links = {}
+            for rows in written:
+                inserted_message_ids = {m[0] for m, _ in rows['messages']}
+                for message_id, children in rows['children']:
+                    if children:
+                        links[message_id] = _linkable_children(message_id, children, inserted_message_ids)
+            conn.executemany(_DELETE_CHILDREN_SQL, [(parent_id,) for parent_id in links])
+            conn.executemany(_CHILD_SQL, [(parent_id, child_id) for parent_id, child_ids in links.items() for child_id in child_ids])
+        with _phase(timings, 'derived'):
+            threads = {rows['id']: rows['thread'] for rows in complete}  # a repeated conversation: last one wins
+            conn.executemany(_DELETE_THREAD_SQL, [(conversation_id,) for conversation_id in threads if conversation_id in existing])
+            conn.executemany(_THREAD_SQL, [row for thread in threads.values() for row in thread])
+            texts = {row[0]: row for rows in written for row in rows['text']}  # a repeated message: last one wins
+            conn.executemany(_DELETE_TEXT_SQL, [(message_id,) for message_id in texts])
+            conn.executemany(_TEXT_SQL, [row for row in texts.values() if row[2]])
+            conn.executemany(_SUMMARY_SQL, [rows['summary'] for rows in complete])
+            conversation_facets = {rows['id']: rows['facets'] for rows in complete}
+            conn.executemany(_DELETE_FACETS_SQL, [(conversation_id,) for conversation_id in conversation_facets if conversation_id in existing])
+            conn.executemany(_FACET_SQL, [row for facet_rows in conversation_facets.values() for row in facet_rows])
+            for rows in complete:
+                _write_fingerprint(conn, rows)
+    except (sqlite3.Error, ValueError, OverflowError) as e:
+        conn.execute('ROLLBACK TO import_bulk')
+        conn.execute('RELEASE import_bulk')
+        print(f"Bulk write failed ({e}); retrying batch row by row", file=sys.stderr)
+        return sum(_write_conversation(conn, rows, timings) for rows in batch)
+    conn.execute('RELEASE import_bulk')
+    for rows in batch:
+        if rows['error']:
+            print(f"Error processing conversation {rows['id']}: {rows['error']}")
+    return len(complete)
+
+
+def _write_fingerprint(conn, rows):
+    """Store the conversation's fingerprint, or drop a stale one when this import computed none (not delta)."""
+    if rows['fingerprint'] is None:
+        conn.execute(_DELETE_FINGERPRINT_SQL, (rows['id'],))
+    else:
+        conn.execute(_FINGERPRINT_SQL, rows['fingerprint'])
+
+
+def _stored_fingerprints(conn):
+    """conversation id -> fingerprint recorded by earlier delta imports."""
+    return dict(conn.execute('SELECT conversation_id, fingerprint FROM conversation_fingerprints').fetchall())
+
+
+@contextlib.contextmanager
+def _bulk_load(conn, timings=None):
+    """Tune conn for a cold load: drop secondary indexes and relax durability, then rebuild and ANALYZE.
+
+    Primary keys stay, so the importer's own lookups keep their indexes. If the process dies mid-load
+    the dropped indexes come back the next time schema.sql is applied (any import, or init_db).
+    """
+    conn.commit()
+    saved = [(name, conn.execute(f'PRAGMA {name}').fetchone()[0]) for name, _ in BULK_LOAD_PRAGMAS]
+    indexes = [tuple(r) for r in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).fetchall()]
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+    conn.commit()
+    for name, value in BULK_LOAD_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    try:
+        yield
+    finally:
+        conn.commit()
+        print(f"Rebuilding {len(indexes)} indexes and running ANALYZE...", file=sys.stderr)
+        with _phase(timings, 'index_rebuild'):
+            for _, sql in indexes:
+                conn.execute(sql)
+            conn.execute('ANALYZE')
+            conn.commit()
+        for name, value in saved:
+            conn.execute(f'PRAGMA {name} = {value}')
+
+
+_CHECKPOINT_SQL = '''
+    INSERT OR REPLACE INTO ingest_checkpoints
+        (source, size, mtime, conversations, last_conversation_id, byte_offset, complete, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+'''
+
+
+def get_ingest_checkpoint(source):
+    """Return the saved ingest checkpoint for a source path as a dict, or None."""
+    conn = get_db()
+    try:
+        _apply_schema(conn)
+        row = conn.execute('SELECT * FROM ingest_checkpoints WHERE source = ?', (source,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        _close_if_not_from_g(conn)
+
+
+def _track_positions(data, position, positions):
+    """Yield data unchanged, appending position() after each item so offsets can follow rows through the pool."""
+    for conversation in data:
+        positions.append(position())
+        yield conversation
+
+
+def _row_count(rows):
+    """Rows a built conversation writes (conversation, messages, metadata); used for progress reporting."""
+    return 1 + sum(1 if meta is None else 2 for _, meta in rows['messages'])
+
+
+def import_conversations_data(data, bulk=False, workers=1, delta=False, progress=None, bulk_load=False,
+                              checkpoint=None, timings=None):
+    """Import conversation dicts into the database. Used by both web upload and CLI ingest.
+
+    data may be a list, a single conversation dict, or an iterable that yields conversations
+    lazily (export_reader.ConversationStream), so the full export never has to be in memory.
+    With bulk=True rows are collected per IMPORT_BATCH_SIZE conversations and written with
+    executemany (see _write_batch_bulk); the resulting rows are identical to the default path.
+    With workers > 1 conversations are normalized in a process pool and this process stays the
+    single SQLite writer, committing in input order.
+    With delta=True each conversation's content fingerprint is computed before it is normalized (in the
+    pool with workers > 1) and stored; a conversation whose fingerprint matches the stored one is skipped
+    without being normalized or written (and not counted in the return value). Other imports compute no
+    fingerprints and drop those of the conversations they write, so a later delta import rewrites them.
+    A commit that wrote conversations also advances the data version (aggregates.bump_version).
+    progress, if given, is called as progress(imported, rows) after every commit.
+    bulk_load=True applies _bulk_load for the duration (first-time / --init-db ingests).
+    checkpoint, if given, is a dict with the source identity ('source', 'size', 'mtime'), 'offset' (a
+    callable returning the input position after the conversation just read, e.g. a ConversationStream's
+    offset), 'conversations' (how many were consumed before this run) and optionally 'last_conversation_id'. Every commit then also records
+    the consumed count, last conversation id and offset in ingest_checkpoints, in the same transaction.
+    timings, if given, is a dict that accumulates seconds per phase: 'parse' (pulling conversations from
+    data, i.e. JSON decoding when streaming), 'normalize' (building rows, or waiting on the pool),
+    'messages' (pass 1: conversation, message and metadata rows), 'children' (pass 2: message_children),
+    'derived' (search text and its FTS index, canonical thread, summary, facets and the fingerprint),
+    'commit', and 'index_rebuild' with bulk_load.
+    """
+    data = _as_conversation_iterable(data)
+    total = len(data) if hasattr(data, '__len__') else None
+    print(f"Importing {total} conversations..." if total is not None else "Importing conversations...")
+    conn = get_db()
+    _apply_schema(conn)
+    compress = storage.compression_enabled(conn)
+    imported = 0
+    skipped = 0
+    rows_written = 0
+    batch = []
+    positions = collections.deque()
+    consumed = checkpoint['conversations'] if checkpoint else 0
+    last_id = checkpoint.get('last_conversation_id') if checkpoint else None
+    offset = None
+    if checkpoint is not None:
+        data = _track_positions(data, checkpoint['offset'], positions)
+        offset = checkpoint['offset']()
+    if timings is not None:
+        data = _timed_iter(data, timings, 'parse')
+    known = _stored_fingerprints(conn) if delta else None
+    conversation_rows = _iter_conversation_rows(data, workers, compress, known)
+    if timings is not None:
+        # 'read' covers parse + normalize; normalize is split out once the loop is done.
+        conversation_rows = _timed_iter(conversation_rows, timings, 'read')
+
+    committed = 0
+
+    def commit(complete=False):
+        nonlocal committed
+        with _phase(timings, 'commit'):
+            if imported != committed:
+                aggregates.bump_version(conn)
+                committed = imported
+            if checkpoint is not None:
+                conn.execute(_CHECKPOINT_SQL, (
+                    checkpoint['source'], checkpoint['size'], checkpoint['mtime'],
+                    consumed, last_id, offset, complete,
+                ))
+            conn.commit()
+
+    def report():
+        if total is not None:
+            print(f"Imported {imported} / {total} conversations", file=sys.stderr)
+        else:
+            print(f"Imported {imported} conversations", file=sys.stderr)
+        if progress is not None:
+            progress(imported, rows_written)
+
+    with _bulk_load(conn, timings) if bulk_load else contextlib.nullcontext():
+        for rows in conversation_rows:
+            if checkpoint is not None:
+                consumed += 1
+                offset = positions.popleft()
+                if rows is not None:
+                    last_id = rows['id']
+            if rows is None:
+                continue
+            if rows.get('unchanged'):
+                skipped += 1
+                continue
+            rows_written += _row_count(rows)
+            if bulk:
+                batch.append(rows)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    imported += _write_batch_bulk(conn, batch, timings)
+                    batch = []
+                    commit()
+                    report()
+            elif _write_conversation(conn, rows, timings):
+                imported += 1
+                if imported % IMPORT_BATCH_SIZE == 0:
+                    commit()
+                    report()
+        if batch:
+            imported += _write_batch_bulk(conn, batch, timings)
+        commit(complete=True)
+    _close_if_not_from_g(conn)
+    if timings is not None:
+        timings['normalize'] = timings.pop('read', 0.0) - timings.get('parse', 0.0)
+    if progress is not None:
+        progress(imported, rows_written)
+    if delta:
+        print(f"Skipped {skipped} unchanged conversations", file=sys.stderr)
+    return imported
+
+
+def _shard_of(conversation, shards):
+    """Stable shard number for a conversation, so repeats of one id always land in the same shard."""
+    conversation_id = conversation.get('id') if isinstance(conversation, dict) else None
+    return zlib.crc32(str(conversation_id).encode('utf-8', 'surrogatepass')) % shards
+
+
+def _shard_writer(index, path, batches, results, compress=False):
+    """Shard process: normalize and bulk-write the conversation batches it receives into its own SQLite file."""
+    conn = sqlite3.connect(path)
+    _apply_schema(conn)
+    # Shards are scratch files read once by the merge: no secondary indexes, no FTS triggers, no durability.
+    for kind, name in conn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL").fetchall():
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    conn.execute('PRAGMA synchronous = OFF')
+    imported = 0
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        rows = [r for r in (_build_conversation_rows(c, compress) for c in batch) if r is not None]
+        if rows:
+            imported += _write_batch_bulk(conn, rows)
+        conn.commit()
+    conn.close()
+    results.put((index, imported))
+
+
+def _send(batches, item, process):
+    """Put item on a shard's bounded queue, failing instead of blocking forever if the shard has died."""
+    while True:
+        try:
+            batches.put(item, timeout=1)
+            return
+        except queue.Full:
+            if not process.is_alive():
+                raise RuntimeError(f'Shard writer {process.name} exited unexpectedly')
+
+
+def _collect_shard_counts(results, processes):
+    counts = {}
+    while len(counts) < len(processes):
+        try:
+            index, imported = results.get(timeout=1)
+        except queue.Empty:
+            dead = [p.name for i, p in enumerate(processes) if i not in counts and not p.is_alive()]
+            if dead and results.empty():
+                raise RuntimeError(f'Shard writer {dead[0]} exited unexpectedly')
             continue
+        counts[index] = imported
+    return counts
+
+
+def _merge_shard(conn, path):
+    """Copy one shard into the main database with set-based INSERT ... SELECT, then commit."""
+    conn.commit()
+    conn.execute('ATTACH DATABASE ? AS shard', (path,))
+    try:
+        # Same rule as the row writers: a conversation written in full (one with a summary) that is already
+        # in the database loses its old messages, thread, facets and any delta fingerprint. On a cold load
+        # there is none, and these deletes (which scan when _bulk_load has dropped the indexes) are skipped.
+        rewrites = conn.execute('''
+            SELECT 1 FROM shard.conversation_summary s
+            WHERE EXISTS (SELECT 1 FROM main.conversations c WHERE c.id = s.conversation_id)
+            LIMIT 1
+        ''').fetchone()
+        if rewrites:
+            rewritten = 'SELECT id FROM main.messages WHERE conversation_id IN (SELECT conversation_id FROM shard.conversation_summary)'
+            conn.execute(f'DELETE FROM main.message_metadata WHERE message_id IN ({rewritten})')
+            conn.execute(f'DELETE FROM main.message_children WHERE parent_id IN ({rewritten}) OR child_id IN ({rewritten})')
+            for table in ('message_text', 'messages', 'canonical_thread', 'conversation_facets', 'conversation_fingerprints'):
+                conn.execute(f'DELETE FROM main."{table}" WHERE conversation_id IN (SELECT conversation_id FROM shard.conversation_summary)')
+        # Every message the shard wrote has its links replaced by the newly imported ones (none, if its
+        # children are gone); message_children's primary key serves this.
+        conn.execute('DELETE FROM main.message_children WHERE parent_id IN (SELECT id FROM shard.messages)')
+        for table in SHARD_MERGE_TABLES:
+            columns = ', '.join(f'"{r[1]}"' for r in conn.execute(f'PRAGMA shard.table_info("{table}")').fetchall())
+            conn.execute(f'INSERT OR REPLACE INTO main."{table}" ({columns}) SELECT {columns} FROM shard."{table}"')
+        # message_text ids are local to each file, so its rows are re-inserted (the main triggers index them).
+        conn.execute('DELETE FROM main.message_text WHERE message_id IN (SELECT id FROM shard.messages)')
+        conn.execute('INSERT INTO main.message_text (message_id, conversation_id, body) SELECT message_id, conversation_id, body FROM shard.message_text')
+        aggregates.bump_version(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute('DETACH DATABASE shard')
+
+
+def import_conversations_sharded(data, shards, bulk_load=False, progress=None):
+    """Import conversations through N shard processes, each writing its own temporary SQLite file.
+
+    Conversations are partitioned by a hash of their id and streamed to the shards in batches (bounded
+    queues, so the export is never held whole). Each shard applies schema.sql, normalizes its conversations
+    and writes them with _write_batch_bulk; the shards are then merged into the main database one at a time
+    via ATTACH and INSERT OR REPLACE ... SELECT over SHARD_MERGE_TABLES. The result matches
+    import_conversations_data except where two conversations in different shards share a message id.
+    Compression follows the main database's compress_content setting.
+    bulk_load=True wraps the merge in _bulk_load. progress(imported, rows) is called after each shard merge,
+    and each merge advances the data version (aggregates.bump_version).
+    Returns the number of conversations imported.
+    """
+    data = _as_conversation_iterable(data)
+    print(f"Importing conversations into {shards} shards...")
+    conn = get_db()
+    _apply_schema(conn)
     conn.commit()
+    compress = storage.compression_enabled(conn)
+    ctx = multiprocessing.get_context()
+    with tempfile.TemporaryDirectory(prefix='chatgpt-ingest-shards-') as workdir:
+        paths = [os.path.join(workdir, f'shard-{i}.db') for i in range(shards)]
+        results = ctx.Queue()
+        queues = [ctx.Queue(maxsize=2) for _ in range(shards)]
+        processes = [
+            ctx.Process(target=_shard_writer, args=(i, paths[i], queues[i], results, compress), name=f'shard-{i}', daemon=True)
+            for i in range(shards)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            pending = [[] for _ in range(shards)]
+            for conversation in data:
+                i = _shard_of(conversation, shards)
+                pending[i].append(conversation)
+                if len(pending[i]) >= IMPORT_BATCH_SIZE:
+                    _send(queues[i], pending[i], processes[i])
+                    pending[i] = []
+            for i in range(shards):
+                if pending[i]:
+                    _send(queues[i], pending[i], processes[i])
+                _send(queues[i], None, processes[i])
+            counts = _collect_shard_counts(results, processes)
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+
+        imported = 0
+        start_changes = conn.total_changes
+        with _bulk_load(conn) if bulk_load else contextlib.nullcontext():
+            for i, path in enumerate(paths):
+                _merge_shard(conn, path)
+                imported += counts[i]
+                print(f"Merged shard {i + 1} / {shards} ({imported} conversations)", file=sys.stderr)
+                if progress is not None:
+                    progress(imported, conn.total_changes - start_changes)
     _close_if_not_from_g(conn)
     return imported
+
+
+def delete_conversation(conn, conversation_id):
+    """Delete a conversation with its messages, metadata, links, search text, canonical thread, summary, facets, fingerprint and pin.
+
+    Also advances the data version (aggregates.bump_version). Caller commits.
+    """
+    _delete_messages(conn, [conversation_id])
+    conn.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+    conn.execute('DELETE FROM canonical_thread WHERE conversation_id = ?', (conversation_id,))
+    conn.execute('DELETE FROM conversation_summary WHERE conversation_id = ?', (conversation_id,))
+    conn.execute('DELETE FROM conversation_facets WHERE conversation_id = ?', (conversation_id,))
+    conn.execute('DELETE FROM conversation_fingerprints WHERE conversation_id = ?', (conversation_id,))
+    conn.execute('DELETE FROM pins WHERE conversation_id = ?', (conversation_id,))
+    aggregates.bump_version(conn)
+
+
+def rebuild_canonical_threads(conn, missing_only=True, batch_size=500, progress=None, commit=True):
+    """Compute canonical_thread from stored messages, for conversations imported before it existed.
+
+    With missing_only=False every conversation is recomputed. Commits per batch of conversations unless
+    commit=False (the caller's transaction, e.g. a migration step). Returns the number given a thread.
+    """
+    query = 'SELECT id FROM conversations'
+    if missing_only:
+        query += ' c WHERE NOT EXISTS (SELECT 1 FROM canonical_thread t WHERE t.conversation_id = c.id)'
+    conversation_ids = [r[0] for r in conn.execute(query).fetchall()]
+    rebuilt = 0
+    for i in range(0, len(conversation_ids), batch_size):
+        chunk = conversation_ids[i:i + batch_size]
+        messages = {}
+        placeholders = ','.join('?' * len(chunk))
+        for conversation_id, message_id, create_time, parent_id in conn.execute(
+            f'SELECT conversation_id, id, create_time, parent_id FROM messages WHERE conversation_id IN ({placeholders}) ORDER BY rowid',
+            chunk,
+        ):
+            messages.setdefault(conversation_id, []).append((message_id, create_time, parent_id))
+        threads = [_canonical_thread_rows(conversation_id, messages.get(conversation_id, [])) for conversation_id in chunk]
+        conn.executemany(_DELETE_THREAD_SQL, [(conversation_id,) for conversation_id in chunk])
+        conn.executemany(_THREAD_SQL, [row for thread in threads for row in thread])
+        if commit:
+            conn.commit()
+        rebuilt += sum(1 for thread in threads if thread)
+        if progress is not None:
+            progress(rebuilt)
+    return rebuilt
+
+
+def rebuild_conversation_summaries(conn, missing_only=True, batch_size=500, progress=None, commit=True):
+    """Compute conversation_summary from stored rows, for conversations imported before it existed.
+
+    Run after rebuild_canonical_threads so canonical lengths are known. With missing_only=False every
+    conversation is recomputed. Commits per batch unless commit=False. Returns the number of summaries written.
+    """
+    query = 'SELECT id FROM conversations'
+    if missing_only:
+        query += ' c WHERE NOT EXISTS (SELECT 1 FROM conversation_summary s WHERE s.conversation_id = c.id)'
+    conversation_ids = [r[0] for r in conn.execute(query).fetchall()]
+    written = 0
+    for i in range(0, len(conversation_ids), batch_size):
+        chunk = conversation_ids[i:i + batch_size]
+        placeholders = ','.join('?' * len(chunk))
+        messages = {}
+        for conversation_id, create_time, model_slug in conn.execute(
+            f'SELECT m.conversation_id, m.create_time, mm.model_slug FROM messages m '
+            f'LEFT JOIN message_metadata mm ON mm.message_id = m.id WHERE m.conversation_id IN ({placeholders})',
+            chunk,
+        ):
+            times, models = messages.setdefault(conversation_id, ([], []))
+            times.append(create_time)
+            models.append(model_slug)
+        lengths = dict(conn.execute(
+            f'SELECT conversation_id, COUNT(*) FROM canonical_thread WHERE conversation_id IN ({placeholders}) GROUP BY conversation_id',
+            chunk,
+        ).fetchall())
+        summaries = []
+        for conversation_id in chunk:
+            times, models = messages.get(conversation_id, ([], []))
+            summaries.append(_summary_row(conversation_id, len(times), lengths.get(conversation_id, 0), times, models))
+        conn.executemany(_SUMMARY_SQL, summaries)
+        if commit:
+            conn.commit()
+        written += len(summaries)
+        if progress is not None:
+            progress(written)
+    return written
@@ -0,0 +1,182 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Streaming reader for ChatGPT exports: yields one conversation at a time from conversations.json or the export .zip."""
+
+import contextlib
+import io
+import json
+import os
+import zipfile
+
+READ_CHUNK_SIZE = 1 << 20  # characters per read; grows while a single conversation spans chunks
+
+_WHITESPACE = ' \t\n\r'
+
+
+class ConversationStream:
+    """Iterate conversation dicts from a text file object without loading the whole export.
+
+    A top-level array is decoded element by element, so peak memory is roughly one conversation
+    plus one read chunk. A top-level object is treated as a single conversation (same as the
+    importer's dict handling). Malformed input raises json.JSONDecodeError.
+
+    offset is the UTF-8 byte position just past the last conversation yielded. Passing it back as
+    resume_offset (with fp positioned at that byte) continues the array from the next conversation.
+    """
+
+    def __init__(self, fp, chunk_size=READ_CHUNK_SIZE, resume_offset=0):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._resumed = resume_offset > 0
+        # Byte offsets are counted incrementally from _mark so each character is encoded once.
+        self._mark = 0
+        self._mark_bytes = resume_offset
+        self.offset = resume_offset
+
+    def _advance_mark(self, pos):
+        self._mark_bytes += len(self._buf[self._mark:pos].encode('utf-8'))
+        self._mark = pos
+
+    def _fill(self, size):
+        """Append up to size characters to the buffer, dropping the already-consumed prefix."""
+        if self._pos:
+            self._advance_mark(self._pos)
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+            self._mark = 0
+        chunk = self._fp.read(size)
+        if not chunk:
+            self._eof = True
+        else:
+            self._buf += chunk
+
+    def _next_char(self):
+        """Skip whitespace and return the next significant character without consuming it ('' at EOF)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                return ''
+            self._fill(self._chunk_size)
+
+    def _error(self, msg):
+        return json.JSONDecodeError(msg, self._buf, self._pos)
+
+    def _decode_value(self):
+        """Decode one JSON value at the current position, reading more input until it is complete."""
+        self._next_char()
+        want = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            else:
+                # A value ending exactly at the buffer edge may be a truncated number; confirm with more input.
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    self._advance_mark(end)
+                    self.offset = self._mark_bytes
+                    return value
+            # Grow the read size so a conversation larger than one chunk is re-scanned O(log n) times.
+            self._fill(want)
+            want = max(want, len(self._buf) - self._pos)
+
+    def __iter__(self):
+        if self._resumed:
+            # Positioned just past a conversation inside the top-level array.
+            yield from self._array_tail()
+            return
+        first = self._next_char()
+        if first == '':
+            return
+        if first == '{':
+            yield self._decode_value()
+            if self._next_char() != '':
+                raise self._error('Extra data after top-level object')
+            return
+        if first != '[':
+            raise self._error('Expected a JSON array or object')
+        self._pos += 1
+        if self._next_char() == ']':
+            self._pos += 1
+        else:
+            yield self._decode_value()
+            yield from self._array_tail()
+            return
+        if self._next_char() != '':
+            raise self._error('Extra data after top-level array')
+
+    def _array_tail(self):
+        """Yield the remaining array elements after one has been consumed, through the closing ']'."""
+        while True:
+            sep = self._next_char()
+            self._pos += 1
+            if sep == ']':
+                break
+            if sep != ',':
+                self._pos -= 1
+                raise self._error("Expected ',' or ']' between conversations")
+            yield self._decode_value()
+        if self._next_char() != '':
+            raise self._error('Extra data after top-level array')
+
+
+def _conversations_member(zf):
+    """Name of conversations.json inside an export archive (shallowest match if nested in a folder)."""
+    names = [n for n in zf.namelist() if n == 'conversations.json' or n.endswith('/conversations.json')]
+    if not names:
+        raise ValueError('No conversations.json found in export archive')
+    return min(names, key=lambda n: (n.count('/'), n))
+
+
+@contextlib.contextmanager
+def open_export(source, offset=0):
+    """Yield a text stream of conversations.json from a path or seekable binary file object.
+
+    Export zips are detected by content and conversations.json is decompressed on the fly from
+    inside the archive, so nothing is extracted to disk. A file object passed in is left open.
+    offset skips that many bytes of conversations.json (a ConversationStream offset) without decoding them.
+    """
+    is_path = isinstance(source, (str, os.PathLike))
+    if zipfile.is_zipfile(source):
+        if not is_path:
+            source.seek(0)
+        with zipfile.ZipFile(source) as zf:
+            member = zf.open(_conversations_member(zf))
+            member.seek(offset)
+            with io.TextIOWrapper(member, encoding='utf-8', newline='') as f:
+                yield f
+    elif is_path:
+        with open(source, 'rb') as raw:
+            raw.seek(offset)
+            with io.TextIOWrapper(raw, encoding='utf-8', newline='') as f:
+                yield f
+    else:
+        source.seek(offset)
+        f = io.TextIOWrapper(source, encoding='utf-8', newline='')
+        try:
+            yield f
+        finally:
+            f.detach()
+
+
+@contextlib.contextmanager
+def open_conversation_stream(source, resume_offset=0, chunk_size=READ_CHUNK_SIZE):
+    """Yield a ConversationStream over source, starting after the conversation ending at resume_offset."""
+    with open_export(source, offset=resume_offset) as f:
+        yield ConversationStream(f, chunk_size=chunk_size, resume_offset=resume_offset)
+
+
+def iter_conversations(source, chunk_size=READ_CHUNK_SIZE):
+    """Yield conversation dicts one at a time from conversations.json or an export .zip (path or file object)."""
+    with open_conversation_stream(source, chunk_size=chunk_size) as stream:
+        yield from stream
@@ -0,0 +1,184 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Conversation facets: filter the conversation list by model, role, content type and date range.
+
+The importer records one conversation_facets row per distinct value of each facet in a conversation
+(facet_rows); delete removes them. Filtering and facet counts are lookups on that table's primary key
+(facet, value, conversation_id) instead of scans of message_metadata and the content JSON of every
+message. Date ranges filter on the indexed conversations.update_ts.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import storage
+
+FACETS = ('model', 'role', 'content_type')
+
+# Part content_type -> content_type facet value; string parts and 'text' parts are 'text'.
+PART_CONTENT_TYPES = {
+    'text': 'text',
+    'image_asset_pointer': 'image',
+    'audio_transcription': 'audio',
+    'audio_asset_pointer': 'audio',
+    'real_time_user_audio_video_asset_pointer': 'video',
+    'video_container_asset_pointer': 'video',
+}
+# Message-level content.content_type values that make the whole message code.
+CODE_CONTENT_TYPES = ('code', 'execution_output')
+
+_FACET_SQL = 'INSERT OR IGNORE INTO conversation_facets (facet, value, conversation_id) VALUES (?, ?, ?)'
+
+
+def content_types(content):
+    """content_type facet values for one message's export content dict."""
+    if not isinstance(content, dict):
+        return set()
+    if content.get('content_type') in CODE_CONTENT_TYPES:
+        return {'code'}
+    return parts_content_types(content.get('parts', []))
+
+
+def parts_content_types(parts):
+    """content_type facet values for a list of content parts (as stored in messages.content)."""
+    kinds = set()
+    if not isinstance(parts, list):
+        return kinds
+    for part in parts:
+        if isinstance(part, str):
+            if part.strip():
+                kinds.add('text')
+        elif isinstance(part, dict):
+            kinds.add(PART_CONTENT_TYPES.get(part.get('content_type') or part.get('type'), 'other'))
+    return kinds
+
+
+def facet_rows(conversation_id, models, roles, kinds):
+    """conversation_facets rows (facet, value, conversation_id) for the distinct non-empty values given."""
+    rows = []
+    for facet, values in (('model', models), ('role', roles), ('content_type', kinds)):
+        for value in sorted({v for v in values if v and isinstance(v, str)}):
+            rows.append((facet, value, conversation_id))
+    return rows
+
+
+def _day_start(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_filters(args):
+    """Filters from request args: repeated model / role / content_type values, and from / to as YYYY-MM-DD (UTC, inclusive).
+
+    Returns a dict with a list per facet (empty when unfiltered), 'from' and 'to' as the given strings
+    (None when missing or invalid), and 'from_ts' / 'to_ts' as the epoch-second bounds [from_ts, to_ts).
+    """
+    filters = {facet: [v for v in args.getlist(facet) if v] for facet in FACETS}
+    start, end = _day_start(args.get('from')), _day_start(args.get('to'))
+    filters['from'] = args.get('from') if start else None
+    filters['to'] = args.get('to') if end else None
+    filters['from_ts'] = start.timestamp() if start else None
+    filters['to_ts'] = (end + timedelta(days=1)).timestamp() if end else None
+    return filters
+
+
+def is_filtered(filters):
+    return any(filters.get(facet) for facet in FACETS) or filters.get('from_ts') is not None or filters.get('to_ts') is not None
+
+
+def query_args(filters):
+    """The filters as url_for keyword arguments, so links keep them."""
+    args = {facet: filters[facet] for facet in FACETS if filters.get(facet)}
+    for key in ('from', 'to'):
+        if filters.get(key):
+            args[key] = filters[key]
+    return args
+
+
+def filter_key(filters):
+    """The filters as a hashable value, for caching figures per filter (aggregates.get)."""
+    return tuple((facet, tuple(filters.get(facet) or ())) for facet in FACETS) + (filters.get('from_ts'), filters.get('to_ts'))
+
+
+def filter_clause(filters, exclude=None):
+    """SQL conditions on conversations c for the filters (values within a facet OR'd, facets AND'ed) and their args.
+
+    exclude leaves one facet out, for that facet's own counts.
+    """
+    where, args = [], []
+    for facet in FACETS:
+        values = filters.get(facet)
+        if facet == exclude or not values:
+            continue
+        placeholders = ','.join('?' * len(values))
+        where.append(f'c.id IN (SELECT conversation_id FROM conversation_facets WHERE facet = ? AND value IN ({placeholders}))')
+        args.extend([facet, *values])
+    if filters.get('from_ts') is not None:
+        where.append('c.update_ts >= ?')
+        args.append(filters['from_ts'])
+    if filters.get('to_ts') is not None:
+        where.append('c.update_ts < ?')
+        args.append(filters['to_ts'])
+    return where, args
+
+
+def facet_counts(conn, filters):
+    """Conversations per value of each facet, most first: {facet: [(value, count)]}.
+
+    Each facet is counted under all the other filters but not its own, so every value stays selectable.
+    """
+    counts = {}
+    for facet in FACETS:
+        where, args = filter_clause(filters, exclude=facet)
+        sql = 'SELECT value, COUNT(*) FROM conversation_facets WHERE facet = ?'
+        if where:
+            sql += f' AND conversation_id IN (SELECT c.id FROM conversations c WHERE {" AND ".join(where)})'
+        sql += ' GROUP BY value ORDER BY COUNT(*) DESC, value'
+        counts[facet] = [tuple(row) for row in conn.execute(sql, (facet, *args)).fetchall()]
+    return counts
+
+
+def index_existing(conn, batch_size=500, progress=None, commit=True):
+    """Record facets for conversations that have none, from stored messages. Returns the number of conversations done.
+
+    Content types come from the stored content parts (message-level content_type is not stored, so
+    code messages count by their parts). Commits per batch unless commit=False.
+    """
+    conversation_ids = [r[0] for r in conn.execute(
+        'SELECT id FROM conversations c WHERE NOT EXISTS (SELECT 1 FROM conversation_facets f WHERE f.conversation_id = c.id)'
+    ).fetchall()]
+    done = 0
+    for i in range(0, len(conversation_ids), batch_size):
+        chunk = conversation_ids[i:i + batch_size]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT m.conversation_id, m.role, m.content, mm.model_slug FROM messages m '
+            f'LEFT JOIN message_metadata mm ON mm.message_id = m.id WHERE m.conversation_id IN ({placeholders})',
+            chunk,
+        ).fetchall()
+        resolved = storage.resolve_rows(
+            conn, [{'conversation_id': r[0], 'role': r[1], 'content': r[2], 'model_slug': r[3]} for r in rows],
+            storage.MESSAGE_COLUMNS,
+        )
+        values = {conversation_id: ([], [], set()) for conversation_id in chunk}
+        for row in resolved:
+            models, roles, kinds = values[row['conversation_id']]
+            models.append(row['model_slug'])
+            roles.append(row['role'])
+            try:
+                kinds.update(parts_content_types(json.loads(row['content'])) if row['content'] else ())
+            except (TypeError, ValueError):
+                pass
+        conn.executemany(_FACET_SQL, [
+            row for conversation_id, (models, roles, kinds) in values.items()
+            for row in facet_rows(conversation_id, models, roles, kinds)
+        ])
+        if commit:
+            conn.commit()
+        done += len(chunk)
+        if progress is not None:
+            progress(done)
+    return done
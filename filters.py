@@ -9,7 +9,9 @@ from datetime import datetime, timezone
 
 import bleach
 import markdown
-from markupsafe import Markup
+from markupsafe import escape, Markup
+
+import search
 
 ALLOWED_MD_TAGS = [
     'p', 'br', 'strong', 'em', 'b', 'i', 'u', 'code', 'pre', 'ul', 'ol', 'li', 'a',
@@ -135,6 +137,14 @@ def render_part_filter(part, dev_mode=False):
     return _render_content_part(part, dev_mode=bool(dev_mode))
 
 
+def highlight_snippet(snippet):
+    """Template filter: escape a search snippet and turn its match markers into <mark> tags."""
+    if not snippet:
+        return Markup('')
+    html = str(escape(snippet))
+    return Markup(html.replace(search.SNIPPET_START, '<mark>').replace(search.SNIPPET_END, '</mark>'))
+
+
 def register_filters(app):
     """Register all template filters on the Flask app."""
     app.template_filter('fromjson')(fromjson)
@@ -144,3 +154,4 @@ def register_filters(app):
     app.template_filter('json_loads')(json_loads_filter)
     app.template_filter('markdown')(markdown_filter)
     app.template_filter('render_part')(render_part_filter)
+    app.template_filter('highlight_snippet')(highlight_snippet)
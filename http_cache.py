@@ -0,0 +1,54 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Conditional GET for responses that only change on import, delete, pin or a settings change: ETags and 304s.
+
+A handler derives its ETag from cheap lookups (the conversation row's update_time, the data version from
+aggregates, the settings it renders with) and calls not_modified() before doing the real work. If the
+client's If-None-Match holds that ETag, the 304 goes back straight away, without querying or rendering
+messages. Otherwise the handler builds the response and passes it through set_validators().
+
+ETags also include BOOT_ID, so a restart (possibly with new code or templates) invalidates them.
+Last-Modified is sent for information only: If-Modified-Since alone is not honoured, because update_time
+does not move when a rendering setting changes.
+"""
+
+import hashlib
+import json
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, request
+
+CACHE_CONTROL = 'no-cache'  # clients may store responses but must revalidate each time
+BOOT_ID = uuid.uuid4().hex
+
+
+def make_etag(*parts):
+    """Strong ETag value (unquoted) for JSON-serializable parts."""
+    key = json.dumps([BOOT_ID, *parts], separators=(',', ':'), default=str)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def last_modified(timestamp):
+    """Epoch seconds (number or numeric string, e.g. update_time) as a UTC datetime, or None."""
+    try:
+        return datetime.fromtimestamp(float(timestamp), tz=timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def set_validators(response, etag, modified=None, cache_control=CACHE_CONTROL):
+    """Attach the ETag, Last-Modified (if given) and Cache-Control to response; returns it."""
+    response.set_etag(etag)
+    if modified is not None:
+        response.last_modified = modified
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified(etag, modified=None, cache_control=CACHE_CONTROL):
+    """A 304 response if the request's If-None-Match matches etag, else None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return set_validators(current_app.response_class(status=304), etag, modified, cache_control)
@@ -0,0 +1,125 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Background import jobs: uploads are spooled to disk and imported one at a time on a worker thread.
+
+Jobs live in this process's memory (the app runs as a single process); /import/status/<id> polls them.
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+
+import db
+from export_reader import iter_conversations
+
+MAX_FINISHED_JOBS = 20  # finished jobs kept for status polling; older ones are forgotten
+
+_jobs = {}
+_lock = threading.Lock()
+_queue = queue.Queue()
+_worker = None
+
+
+def _update(job_id, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def _forget_old_jobs():
+    finished = sorted(
+        (j for j in _jobs.values() if j['state'] in ('done', 'failed')),
+        key=lambda j: j['finished_at'],
+    )
+    for job in finished[:-MAX_FINISHED_JOBS]:
+        del _jobs[job['id']]
+
+
+def _run(job_id, path):
+    size = os.path.getsize(path)
+    started = time.time()
+    _update(job_id, state='running', started_at=started)
+    try:
+        with open(path, 'rb') as fp:
+            def progress(imported, rows):
+                # Bytes consumed from the spooled file drive the ETA; conversation totals are unknown while streaming.
+                _update(job_id, conversations=imported, rows=rows,
+                        fraction=min(fp.tell() / size, 1.0) if size else 1.0)
+
+            n = db.import_conversations_data(iter_conversations(fp), bulk=True, progress=progress)
+        _update(job_id, state='done', conversations=n, fraction=1.0)
+    except Exception as e:
+        _update(job_id, state='failed', error=str(e))
+    finally:
+        with _lock:
+            _jobs[job_id]['finished_at'] = time.time()
+            _forget_old_jobs()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _work():
+    while True:
+        job_id, path = _queue.get()
+        try:
+            _run(job_id, path)
+        finally:
+            _queue.task_done()
+
+
+def start_import_job(path, filename=''):
+    """Queue an import of the spooled export at path (deleted when the job ends). Returns the job id."""
+    global _worker
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _jobs[job_id] = {
+            'id': job_id,
+            'filename': filename,
+            'state': 'queued',
+            'conversations': 0,
+            'rows': 0,
+            'fraction': 0.0,
+            'error': None,
+            'queued_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='import-jobs', daemon=True)
+            _worker.start()
+    _queue.put((job_id, path))
+    return job_id
+
+
+def get_job_status(job_id):
+    """Snapshot of a job with derived rates (rows_per_sec, eta_seconds), or None if unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        status = dict(job)
+    status['rows_per_sec'] = None
+    status['eta_seconds'] = None
+    if status['started_at']:
+        elapsed = (status['finished_at'] or time.time()) - status['started_at']
+        if elapsed > 0:
+            status['rows_per_sec'] = round(status['rows'] / elapsed, 1)
+        if status['state'] == 'running' and status['fraction'] > 0:
+            status['eta_seconds'] = round(elapsed * (1 - status['fraction']) / status['fraction'], 1)
+    return status
+
+
+def wait_for_job(job_id, timeout=None):
+    """Block until the job has finished (used by CLI-style callers and tests). Returns its status."""
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        status = get_job_status(job_id)
+        if status is None or status['state'] in ('done', 'failed'):
+            return status
+        if deadline is not None and time.time() >= deadline:
+            return status
+        time.sleep(0.01)
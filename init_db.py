@@ -6,12 +6,19 @@ import os
 import sys
 
 from app import app
-from db import init_db
+from db import get_db, init_db
 
 
 def main():
     from db import DATABASE_PATH
-    parser = argparse.ArgumentParser(description="Initialize or reset the ChatGPT Browser database.")
+    parser = argparse.ArgumentParser(description="Initialize, reset or migrate the ChatGPT Browser database.")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=("migrate", "status"),
+        help="migrate: apply pending schema migrations to an existing database; "
+             "status: show its schema version and pending migrations.",
+    )
     parser.add_argument(
         "--force", "--reset",
         dest="force",
@@ -19,9 +26,19 @@ def main():
         help="If the database exists, delete it and create a fresh one (destroys all data).",
     )
     args = parser.parse_args()
+    if args.command:
+        if args.force:
+            parser.error("--force cannot be combined with a command")
+        if not os.path.exists(DATABASE_PATH):
+            print(f"Database not found: {DATABASE_PATH}", file=sys.stderr)
+            print("Run init_db.py without a command to create it.", file=sys.stderr)
+            sys.exit(1)
+        run_command(args.command)
+        return
     if os.path.exists(DATABASE_PATH) and not args.force:
         print(f"Database already exists: {DATABASE_PATH}", file=sys.stderr)
-        print("Use --force to delete it and create a fresh database (all data will be lost).", file=sys.stderr)
+        print("Use --force to delete it and create a fresh database (all data will be lost),", file=sys.stderr)
+        print("or 'init_db.py migrate' to upgrade its schema in place.", file=sys.stderr)
         sys.exit(1)
     if os.path.exists(DATABASE_PATH):
         os.remove(DATABASE_PATH)
@@ -29,5 +46,25 @@ def main():
         init_db()
     print("Database initialized successfully!")
 
+
+def run_command(command):
+    """Run the migrate or status command against the existing database."""
+    import migrations
+    with app.app_context():
+        conn = get_db()
+        if command == "status":
+            print(f"Schema version: {migrations.current_version(conn)} (latest {migrations.LATEST_VERSION})")
+            for migration in migrations.pending(conn):
+                print(f"  pending {migration.version}: {migration.description}")
+            return
+        try:
+            applied = migrations.upgrade(conn)
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+        init_db()
+        print(f"Applied {len(applied)} migration(s); schema version is now {migrations.current_version(conn)}.")
+
+
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,255 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Versioned schema migrations: bring databases created by older releases up to the current schema in place.
+
+schema.sql always describes the current schema, and a database created from it is stamped with the latest
+version in schema_version. A database from an older release has a lower version (0 if it predates
+schema_version). upgrade() runs its pending MIGRATIONS oldest first, each in its own transaction, and
+records each in schema_version when it commits. db._apply_schema calls upgrade() before running
+schema.sql, so imports and `python app.py` (at startup) migrate automatically. Other servers (flask run,
+WSGI) do not migrate inside a request, since backfills can take minutes: app.ensure_schema answers 503
+until `python init_db.py migrate` has run. `python init_db.py migrate` does the same
+explicitly with progress output, and `python init_db.py status` lists what is pending.
+
+To change the schema, edit schema.sql for new databases and append a Migration that makes the same change
+to existing ones. A step must not commit, and must tolerate a database that already has its change (one
+created from schema.sql by a build that predates schema_version).
+"""
+
+import collections
+import json
+import sys
+
+import db
+import facets
+import search
+
+Migration = collections.namedtuple('Migration', 'version description apply')
+
+_SCHEMA_VERSION_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_xinfo("{table}")').fetchall()}
+
+
+def _add_conversation_timestamps(conn, progress):
+    columns = _columns(conn, 'conversations')
+    if 'update_ts' not in columns:
+        conn.execute("ALTER TABLE conversations ADD COLUMN update_ts REAL GENERATED ALWAYS AS (CAST(NULLIF(update_time, '') AS REAL)) VIRTUAL")
+    if 'update_week' not in columns:
+        conn.execute('ALTER TABLE conversations ADD COLUMN update_week INTEGER GENERATED ALWAYS AS (CAST(update_ts / 604800 AS INTEGER)) VIRTUAL')
+    progress('building indexes')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_update_ts ON conversations(update_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_update_week ON conversations(update_week)')
+
+
+def _backfill_canonical_threads(conn, progress):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS canonical_thread (
+            conversation_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            message_id TEXT NOT NULL,
+            PRIMARY KEY (conversation_id, position)
+        ) WITHOUT ROWID
+    ''')
+    db.rebuild_canonical_threads(conn, progress=lambda n: progress(f'{n} threads'), commit=False)
+
+
+def _backfill_conversation_summaries(conn, progress):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_summary (
+            conversation_id TEXT PRIMARY KEY,
+            message_count INTEGER NOT NULL,
+            canonical_length INTEGER NOT NULL,
+            first_message_time REAL,
+            last_message_time REAL,
+            models TEXT NOT NULL DEFAULT '[]'
+        )
+    ''')
+    db.rebuild_conversation_summaries(conn, progress=lambda n: progress(f'{n} summaries'), commit=False)
+
+
+def _index_message_text(conn, progress):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS message_text (
+            id INTEGER PRIMARY KEY,
+            message_id TEXT NOT NULL UNIQUE,
+            conversation_id TEXT NOT NULL,
+            body TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+            body, content='message_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS message_text_ai AFTER INSERT ON message_text BEGIN
+            INSERT INTO message_fts (rowid, body) VALUES (new.id, new.body);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS message_text_ad AFTER DELETE ON message_text BEGIN
+            INSERT INTO message_fts (message_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        END
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_message_text_conversation_id ON message_text(conversation_id)')
+    search.index_existing(conn, progress=lambda n: progress(f'{n} messages indexed'), commit=False)
+
+
+def _index_titles(conn, progress):
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS title_fts USING fts5(
+            title, content='conversations', content_rowid='rowid', tokenize='trigram'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_title_bi BEFORE INSERT ON conversations BEGIN
+            INSERT INTO title_fts (title_fts, rowid, title) SELECT 'delete', rowid, title FROM conversations WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_title_ai AFTER INSERT ON conversations BEGIN
+            INSERT INTO title_fts (rowid, title) VALUES (new.rowid, new.title);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_title_ad AFTER DELETE ON conversations BEGIN
+            INSERT INTO title_fts (title_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS conversations_title_au AFTER UPDATE OF title ON conversations BEGIN
+            INSERT INTO title_fts (title_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            INSERT INTO title_fts (rowid, title) VALUES (new.rowid, new.title);
+        END
+    ''')
+    progress('indexing titles')
+    conn.execute("INSERT INTO title_fts (title_fts) VALUES ('rebuild')")
+
+
+def _backfill_conversation_facets(conn, progress):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_facets (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            conversation_id TEXT NOT NULL,
+            PRIMARY KEY (facet, value, conversation_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_conversation_facets_conversation_id ON conversation_facets(conversation_id)')
+    facets.index_existing(conn, progress=lambda n: progress(f'{n} conversations'), commit=False)
+
+
+def _index_list_order(conn, progress):
+    progress('building index')
+    conn.execute('DROP INDEX IF EXISTS idx_conversations_update_ts')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_update_ts_id ON conversations(update_ts, id)')
+
+
+def _move_pins_to_table(conn, progress):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pins (
+            conversation_id TEXT PRIMARY KEY,
+            pinned_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if not _table_exists(conn, 'settings'):
+        return
+    row = conn.execute("SELECT value FROM settings WHERE key = 'pinned_conversation_ids'").fetchone()
+    try:
+        pinned = json.loads(row[0]) if row and row[0] else []
+    except ValueError:
+        pinned = []
+    if isinstance(pinned, list):
+        conn.executemany(
+            'INSERT OR IGNORE INTO pins (conversation_id) SELECT id FROM conversations WHERE id = ?',
+            [(conversation_id,) for conversation_id in pinned if isinstance(conversation_id, str)],
+        )
+    conn.execute("DELETE FROM settings WHERE key = 'pinned_conversation_ids'")
+
+
+# Append only; never renumber or edit a released step.
+MIGRATIONS = (
+    Migration(1, 'Add indexed numeric update_ts and update_week to conversations', _add_conversation_timestamps),
+    Migration(2, 'Store the canonical thread of existing conversations', _backfill_canonical_threads),
+    Migration(3, 'Store summaries of existing conversations', _backfill_conversation_summaries),
+    Migration(4, 'Build the full-text search index over existing messages', _index_message_text),
+    Migration(5, 'Build the trigram index over conversation titles', _index_titles),
+    Migration(6, 'Record model, role and content type facets of existing conversations', _backfill_conversation_facets),
+    Migration(7, 'Index conversations on (update_ts, id) for keyset pagination', _index_list_order),
+    Migration(8, 'Move pinned conversations from settings to the pins table', _move_pins_to_table),
+)
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn):
+    """Highest migration version recorded for this database (0 if it has no schema_version)."""
+    if not _table_exists(conn, 'schema_version'):
+        return 0
+    return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+
+
+def pending(conn):
+    """Migrations not yet applied to this database, oldest first."""
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def needs_upgrade(conn):
+    """True for an existing database (one with tables) that has pending migrations; new ones are only stamped."""
+    return _table_exists(conn, 'conversations') and bool(pending(conn))
+
+
+def _print_progress(message):
+    print(message, file=sys.stderr)
+
+
+def upgrade(conn, progress=_print_progress):
+    """Apply pending migrations in order; a database with no tables yet is just stamped with LATEST_VERSION.
+
+    Each step runs in a BEGIN IMMEDIATE transaction and is recorded in schema_version in that same
+    transaction. A failing step is rolled back and raised as RuntimeError; earlier steps stay applied.
+    Returns the migrations applied.
+    """
+    conn.commit()
+    fresh = not _table_exists(conn, 'conversations')
+    conn.execute(_SCHEMA_VERSION_SQL)
+    if fresh:
+        conn.executemany(
+            'INSERT OR IGNORE INTO schema_version (version, description) VALUES (?, ?)',
+            [(m.version, m.description) for m in MIGRATIONS],
+        )
+        conn.commit()
+        return []
+    applied = []
+    for migration in pending(conn):
+        conn.execute('BEGIN IMMEDIATE')
+        if current_version(conn) >= migration.version:  # another process got here first
+            conn.rollback()
+            continue
+        progress(f'Applying migration {migration.version}/{LATEST_VERSION}: {migration.description}')
+        try:
+            migration.apply(conn, lambda message: progress(f'  {message}'))
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (migration.version, migration.description),
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(f'Migration {migration.version} ({migration.description}) failed: {e}') from e
+        applied.append(migration)
+    return applied
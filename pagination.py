@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Keyset (cursor) pagination of the conversation list: pinned first, then newest first on (update_ts, id).
+
+A cursor is an opaque token naming one conversation's (pinned, update_ts, id). The page after it is the
+next per_page entries of idx_conversations_update_ts_id from that key, so a deep page costs one index
+seek like the first page, where LIMIT/OFFSET reads and discards every row before it. The list is read in
+parts: pinned conversations (a handful, found through the pins table), then the rest, each with the
+conversations without an update_ts last, by id descending.
+"""
+
+import base64
+import json
+
+# (pinned, dated) of each part of the list, in list order
+_PARTS = ((True, True), (True, False), (False, True), (False, False))
+
+
+def encode_cursor(row):
+    """Cursor token for a list row (anything with 'pinned', 'update_ts' and 'id')."""
+    key = json.dumps([1 if row['pinned'] else 0, row['update_ts'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """(pinned, update_ts, id) from a cursor token, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        pinned, ts, conversation_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (TypeError, ValueError):
+        return None
+    if pinned not in (0, 1) or not isinstance(conversation_id, str) or not (ts is None or isinstance(ts, (int, float))):
+        return None
+    return bool(pinned), ts, conversation_id
+
+
+def _part_condition(part):
+    pinned, dated = part
+    return [
+        'c.id IN (SELECT conversation_id FROM pins)' if pinned else 'c.id NOT IN (SELECT conversation_id FROM pins)',
+        'c.update_ts IS NOT NULL' if dated else 'c.update_ts IS NULL',
+    ]
+
+
+def _part_order(part, ascending):
+    if part[1]:
+        return 'c.update_ts, c.id' if ascending else 'c.update_ts DESC, c.id DESC'
+    return 'c.id' if ascending else 'c.id DESC'
+
+
+def _segments(after, before):
+    """(conditions, args, order) of each index range to read, in reading order.
+
+    Going back (before), ranges are read oldest first and the caller reverses the rows.
+    """
+    cursor = before if before is not None else after
+    if cursor is None:
+        return [(_part_condition(part), [], _part_order(part, False)) for part in _PARTS]
+    pinned, ts, conversation_id = cursor
+    i = _PARTS.index((pinned, ts is not None))
+    conditions = _part_condition(_PARTS[i])[:1]
+    op = '>' if before is not None else '<'
+    if ts is None:
+        conditions += ['c.update_ts IS NULL', f'c.id {op} ?']
+        args = [conversation_id]
+    else:
+        conditions.append(f'(c.update_ts, c.id) {op} (?, ?)')
+        args = [ts, conversation_id]
+    if before is not None:
+        rest = [(_part_condition(part), [], _part_order(part, True)) for part in reversed(_PARTS[:i])]
+    else:
+        rest = [(_part_condition(part), [], _part_order(part, False)) for part in _PARTS[i + 1:]]
+    return [(conditions, args, _part_order(_PARTS[i], before is not None))] + rest
+
+
+def keyset_page(conn, select, where, args, per_page, after=None, before=None):
+    """One page of rows in list order, as (rows, newer, older).
+
+    select is 'SELECT ... FROM ...' over conversations c, and must select c.id, c.update_ts and a pinned
+    flag; where and args are its extra conditions. after / before are decoded cursors (at most one): the
+    page holds the rows just after / before that key, or the first rows when neither is given. newer and
+    older are cursor tokens for the adjacent pages (newer goes with before=, older with after=), None at
+    either end.
+    """
+    rows = []
+    for conditions, segment_args, order in _segments(after, before):
+        sql = f"{select} WHERE {' AND '.join([*where, *conditions])} ORDER BY {order} LIMIT ?"
+        rows.extend(conn.execute(sql, (*args, *segment_args, per_page + 1 - len(rows))).fetchall())
+        if len(rows) > per_page:
+            break
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+        if not rows:
+            return rows, None, _cursor_token(before)
+        return rows, encode_cursor(rows[0]) if more else None, encode_cursor(rows[-1])
+    if not rows:
+        return rows, _cursor_token(after) if after else None, None
+    return rows, encode_cursor(rows[0]) if after is not None else None, encode_cursor(rows[-1]) if more else None
+
+
+def _cursor_token(cursor):
+    pinned, ts, conversation_id = cursor
+    return encode_cursor({'pinned': pinned, 'update_ts': ts, 'id': conversation_id})
@@ -0,0 +1,144 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""JSON API: read-only conversation data for scripts and dashboards.
+
+Every response carries a strong ETag from the data version (aggregates.data_version), plus the
+conversation's update_time for single-conversation endpoints. Responses that show pin state also
+include the pins version (the list) or the conversation's pinned flag (the detail). A request whose
+If-None-Match matches gets a 304 before any list or message query runs (http_cache).
+"""
+
+import json
+
+from flask import Blueprint, jsonify, request
+
+import aggregates
+import db
+import http_cache
+from routes.main import (
+    _build_export_mapping,
+    _conversation_summary,
+    _count_conversations,
+    _facet_counts,
+    _get_canonical_path_rows,
+    _list_args,
+    _list_conversations,
+)
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+def _conversation_json(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'create_time': row['create_time'],
+        'update_time': row['update_time'],
+        'message_count': row['message_count'],
+        'pinned': bool(row['pinned']),
+    }
+
+
+def _conversation_or_404(conn, conversation_id):
+    """(conversation row, None), or (None, 404 response) if there is no such conversation."""
+    conversation = conn.execute('''
+        SELECT c.id, c.title, c.create_time, c.update_time,
+               EXISTS (SELECT 1 FROM pins p WHERE p.conversation_id = c.id) AS pinned
+        FROM conversations c
+        WHERE c.id = ?
+    ''', (conversation_id,)).fetchone()
+    if conversation is None:
+        return None, (jsonify({'error': 'Conversation not found'}), 404)
+    return conversation, None
+
+
+def _parts(content):
+    try:
+        return json.loads(content) if content else []
+    except (TypeError, ValueError):
+        return []
+
+
+@bp.route('/conversations')
+def list_conversations():
+    """Conversation list, pinned first, then newest first, with the list page's q and facet filters and cursor paging.
+
+    Pass a response's next_cursor as ?after= for the following page, or prev_cursor as ?before= for the
+    one before it. total and facets (counts per facet value) come from the aggregates cache.
+    """
+    conn = db.get_db()
+    etag = http_cache.make_etag('conversations', aggregates.data_version(conn), aggregates.pins_version(conn),
+                                sorted(request.args.items(multi=True)))
+    unchanged = http_cache.not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    q, filters, per_page, after, before = _list_args()
+    rows, newer, older, similar = _list_conversations(conn, q, filters, per_page, after, before)
+    total = len(rows) if similar else _count_conversations(conn, q, filters)
+    counts = {
+        facet: [{'value': value, 'count': count} for value, count in values]
+        for facet, values in _facet_counts(conn, filters).items()
+    }
+    return http_cache.set_validators(jsonify({
+        'total': total,
+        'per_page': per_page,
+        'next_cursor': older,
+        'prev_cursor': newer,
+        'similar': similar,
+        'conversations': [_conversation_json(row) for row in rows],
+        'facets': counts,
+    }), etag)
+
+
+@bp.route('/conversations/<conversation_id>')
+def conversation_detail(conversation_id):
+    """One conversation with its summary figures and full message tree (the JSON export's mapping)."""
+    conn = db.get_db()
+    conversation, error = _conversation_or_404(conn, conversation_id)
+    if error:
+        return error
+    etag = http_cache.make_etag('conversation', conversation_id, conversation['update_time'],
+                                aggregates.data_version(conn), conversation['pinned'])
+    unchanged = http_cache.not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    summary = _conversation_summary(conn, conversation_id)
+    return http_cache.set_validators(jsonify({
+        **dict(conversation),
+        'pinned': bool(conversation['pinned']),
+        'message_count': summary['message_count'],
+        'canonical_length': summary['canonical_length'],
+        'first_message_time': summary['first_message_time'],
+        'last_message_time': summary['last_message_time'],
+        'models': summary['models'],
+        'mapping': _build_export_mapping(conn, conversation_id),
+    }), etag)
+
+
+@bp.route('/conversations/<conversation_id>/canonical')
+def canonical_thread(conversation_id):
+    """The conversation's canonical thread (newest branch), root first."""
+    conn = db.get_db()
+    conversation, error = _conversation_or_404(conn, conversation_id)
+    if error:
+        return error
+    etag = http_cache.make_etag('canonical', conversation_id, conversation['update_time'],
+                                aggregates.data_version(conn))
+    unchanged = http_cache.not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    messages = [{
+        'id': row['id'],
+        'role': row['role'],
+        'parts': _parts(row['content']),
+        'create_time': row['create_time'],
+        'update_time': row['update_time'],
+        'parent_id': row['parent_id'],
+    } for row in _get_canonical_path_rows(conn, conversation_id)]
+    return http_cache.set_validators(jsonify({
+        'id': conversation['id'],
+        'title': conversation['title'],
+        'update_time': conversation['update_time'],
+        'messages': messages,
+    }), etag)
@@ -3,15 +3,23 @@
 # Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
 """Main routes: index, conversations, import, settings, toggles."""
 
+import itertools
 import json
 import os
 import tempfile
 from datetime import datetime, timezone
 
-from flask import after_this_request, Blueprint, flash, make_response, redirect, render_template, request, send_file, session, url_for
+from flask import after_this_request, Blueprint, flash, jsonify, make_response, redirect, render_template, request, send_file, session, url_for
 
+import aggregates
 import db
-from csrf import validate_csrf
+import facets
+import http_cache
+import import_jobs
+import pagination
+import search
+import storage
+from csrf import get_csrf_token, validate_csrf
 from content_helpers import (
     _attach_content_parts,
     _message_has_displayable_content,
@@ -22,62 +30,182 @@ bp = Blueprint('main', __name__)
 
 
 MESSAGE_PAGE_SIZE = 50  # full conversation view pagination (#29)
+PAGE_CACHE_CONTROL = 'private, no-cache'  # conversation pages embed the session's CSRF token
 
 
-@bp.route('/')
-def index():
+def _page_validators(conn, view, conversation, *rendering):
+    """(ETag, Last-Modified) of a conversation page, from the conversation row and the data version.
+
+    rendering lists everything else the page depends on (settings, session overrides, page number); the
+    session's CSRF token is added since forms embed it. Computing them reads no message rows.
+    """
+    etag = http_cache.make_etag(view, conversation['id'], conversation['update_time'],
+                                aggregates.data_version(conn), get_csrf_token(), rendering)
+    return etag, http_cache.last_modified(conversation['update_time'])
+
+
+def _conversation_summary(conn, conversation_id):
+    """conversation_summary figures as a dict (models decoded), cached in aggregates until the next import or delete."""
+    return aggregates.get(conn, ('summary', conversation_id), lambda c: _read_conversation_summary(c, conversation_id))
+
+
+def _read_conversation_summary(conn, conversation_id):
+    """conversation_summary row as a dict. Aggregated from messages when no row is stored."""
+    row = conn.execute('SELECT * FROM conversation_summary WHERE conversation_id = ?', (conversation_id,)).fetchone()
+    if row is not None:
+        summary = dict(row)
+        summary['models'] = json.loads(summary['models'])
+        return summary
+    row = conn.execute('''
+        SELECT COUNT(*) AS message_count,
+               MIN(CAST(m.create_time AS REAL)) AS first_message_time,
+               MAX(CAST(m.create_time AS REAL)) AS last_message_time
+        FROM messages m
+        WHERE m.conversation_id = ?
+    ''', (conversation_id,)).fetchone()
+    models = [r[0] for r in conn.execute('''
+        SELECT DISTINCT mm.model_slug
+        FROM messages m
+        JOIN message_metadata mm ON mm.message_id = m.id
+        WHERE m.conversation_id = ? AND mm.model_slug != ''
+        ORDER BY mm.model_slug
+    ''', (conversation_id,)).fetchall()]
+    return {'conversation_id': conversation_id, 'canonical_length': None, 'models': models, **dict(row)}
+
+
+_LIST_COLUMNS = '''c.id, c.title, c.create_time, c.update_time, c.update_ts,
+                   EXISTS (SELECT 1 FROM pins p WHERE p.conversation_id = c.id) AS pinned,
+                   COALESCE(s.message_count, (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id)) AS message_count'''
+
+
+def _list_source(q, filters):
+    """(source, where, args) selecting the conversation list for title search q and facets.parse_filters output.
+
+    q of search.TITLE_MIN_LENGTH or more characters matches title substrings through the trigram index,
+    shorter ones use LIKE.
+    """
+    where, args = facets.filter_clause(filters)
+    source = 'conversations c'
+    match = search.title_query(q) if q else None
+    if match is not None:
+        source = 'title_fts f JOIN conversations c ON c.rowid = f.rowid'
+        where.insert(0, 'title_fts MATCH ?')
+        args.insert(0, match)
+    elif q:
+        where.insert(0, 'c.title LIKE ?')
+        args.insert(0, '%' + q + '%')
+    return source, where, args
+
+
+def _count_conversations(conn, q, filters):
+    """Conversations matching title search q and the filters; cached in aggregates until the next import or delete."""
+    def count(conn):
+        source, where, args = _list_source(q, filters)
+        condition = f" WHERE {' AND '.join(where)}" if where else ''
+        return conn.execute(f'SELECT COUNT(*) FROM {source}{condition}', args).fetchone()[0]
+    return aggregates.get(conn, ('conversation_count', q, facets.filter_key(filters)), count)
+
+
+def _facet_counts(conn, filters):
+    """facets.facet_counts, cached in aggregates until the next import or delete."""
+    return aggregates.get(conn, ('facet_counts', facets.filter_key(filters)), lambda c: facets.facet_counts(c, filters))
+
+
+def _list_conversations(conn, q, filters, per_page, after=None, before=None):
+    """One page of the conversation list, pinned first, then newest first, as (rows, newer, older, similar).
+
+    Keyset-paginated (pagination.keyset_page): after / before are decoded cursors, and newer / older are
+    the cursor tokens of the adjacent pages. If nothing matches q, up to per_page conversations with
+    similar titles (typos) are listed instead, unpaged, and similar is True.
+    """
+    source, where, args = _list_source(q, filters)
+    rows, newer, older = pagination.keyset_page(
+        conn,
+        f'SELECT {_LIST_COLUMNS} FROM {source} LEFT JOIN conversation_summary s ON s.conversation_id = c.id',
+        where, args, per_page, after=after, before=before,
+    )
+    if rows or after is not None or before is not None or search.title_query(q) is None:
+        return rows, newer, older, False
+    similar_ids = search.similar_titles(conn, q)
+    where, args = facets.filter_clause(filters)
+    placeholders = ','.join('?' * len(similar_ids))
+    found = {row['id']: row for row in conn.execute(f'''
+        SELECT {_LIST_COLUMNS}
+        FROM conversations c
+        LEFT JOIN conversation_summary s ON s.conversation_id = c.id
+        WHERE {' AND '.join([f'c.id IN ({placeholders})', *where])}
+    ''', (*similar_ids, *args)).fetchall()}
+    similar_rows = [found[i] for i in similar_ids if i in found][:per_page]
+    return similar_rows, None, None, bool(similar_rows)
+
+
+def _list_args():
+    """Paging arguments shared by the list page and /api/conversations: (q, filters, per_page, after, before).
+
+    after / before are decoded cursors (pagination.decode_cursor); a malformed one is ignored.
+    """
     per_page = min(max(int(request.args.get('per_page', 50)), 1), 100)
-    page = max(int(request.args.get('page', 1)), 1)
     q = (request.args.get('q') or '').strip()
+    filters = facets.parse_filters(request.args)
+    before = pagination.decode_cursor(request.args.get('before'))
+    after = None if before is not None else pagination.decode_cursor(request.args.get('after'))
+    return q, filters, per_page, after, before
+
+
+@bp.route('/')
+def index():
+    q, filters, per_page, after, before = _list_args()
     conn = db.get_db()
-    if q:
-        total = conn.execute(
-            'SELECT COUNT(*) FROM conversations WHERE title LIKE ?',
-            ('%' + q + '%',),
-        ).fetchone()[0]
-        offset = (page - 1) * per_page
-        conversations = conn.execute('''
-            SELECT c.id, c.title, c.create_time, c.update_time,
-                   (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id) AS message_count
-            FROM conversations c
-            WHERE c.title LIKE ?
-            ORDER BY CAST(c.update_time AS REAL) DESC
-            LIMIT ? OFFSET ?
-        ''', ('%' + q + '%', per_page, offset)).fetchall()
-    else:
-        total = conn.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
-        offset = (page - 1) * per_page
-        conversations = conn.execute('''
-            SELECT c.id, c.title, c.create_time, c.update_time,
-                   (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id) AS message_count
-            FROM conversations c
-            ORDER BY CAST(c.update_time AS REAL) DESC
-            LIMIT ? OFFSET ?
-        ''', (per_page, offset)).fetchall()
-    total_pages = max(1, (total + per_page - 1) // per_page) if total else 1
-    page = min(page, total_pages)
+    conversations, newer, older, similar = _list_conversations(conn, q, filters, per_page, after, before)
+    total = len(conversations) if similar else _count_conversations(conn, q, filters)
+    facet_counts = _facet_counts(conn, filters)
     dev_mode = db.get_setting('dev_mode', 'false') == 'true'
     dark_mode = db.get_setting('dark_mode', 'false') == 'true'
     user_name = db.get_setting('user_name', 'User')
     assistant_name = db.get_setting('assistant_name', 'Assistant')
-    try:
-        pinned_ids = json.loads(db.get_setting('pinned_conversation_ids', '[]'))
-    except (TypeError, ValueError, json.JSONDecodeError):
-        pinned_ids = []
     return render_template('index.html',
                          conversations=conversations,
-                         page=page,
+                         newer=newer,
+                         older=older,
                          per_page=per_page,
                          total=total,
-                         total_pages=total_pages,
                          q=q,
-                         pinned_ids=pinned_ids,
+                         similar=similar,
+                         filters=filters,
+                         filter_args=facets.query_args(filters),
+                         facet_counts=facet_counts,
+                         import_job=request.args.get('import_job'),
                          dev_mode=dev_mode,
                          dark_mode=dark_mode,
                          user_name=user_name,
                          assistant_name=assistant_name)
 
 
+SEARCH_PAGE_SIZE = 20
+
+
+@bp.route('/search')
+def search_messages():
+    """Full-text search over message content: conversations ranked by best match, with a snippet each."""
+    q = (request.args.get('q') or '').strip()
+    page = max(int(request.args.get('page', 1)), 1)
+    per_page = SEARCH_PAGE_SIZE
+    total, results = search.search_messages(db.get_db(), q, per_page, (page - 1) * per_page) if q else (0, [])
+    for result in results:
+        result['message_page'] = result['position'] // MESSAGE_PAGE_SIZE + 1
+    total_pages = max(1, (total + per_page - 1) // per_page)
+    dev_mode = db.get_setting('dev_mode', 'false') == 'true'
+    dark_mode = db.get_setting('dark_mode', 'false') == 'true'
+    return render_template('search.html',
+                         q=q,
+                         results=results,
+                         total=total,
+                         page=page,
+                         total_pages=total_pages,
+                         dev_mode=dev_mode,
+                         dark_mode=dark_mode)
+
+
 @bp.route('/conversation/<conversation_id>')
 def conversation(conversation_id):
     dev_mode = db.get_setting('dev_mode', 'false') == 'true'
@@ -97,10 +225,15 @@ def conversation(conversation_id):
 
     if not conversation:
         return "Conversation not found", 404
-    total_messages = conn.execute(
-        'SELECT COUNT(*) FROM messages WHERE conversation_id = ?',
-        (conversation_id,),
-    ).fetchone()[0]
+    user_name = db.get_setting('user_name', 'User')
+    assistant_name = db.get_setting('assistant_name', 'Assistant')
+    verbose_mode = verbose_mode or override_verbose_mode
+    etag, modified = _page_validators(conn, 'conversation', conversation, dev_mode, dark_mode, verbose_mode,
+                                      user_name, assistant_name, request.args.get('page'))
+    unchanged = http_cache.not_modified(etag, modified, PAGE_CACHE_CONTROL)
+    if unchanged is not None:
+        return unchanged
+    total_messages = _conversation_summary(conn, conversation_id)['message_count']
     msg_page = max(int(request.args.get('page', 1)), 1)
     msg_per_page = MESSAGE_PAGE_SIZE
     msg_total_pages = max(1, (total_messages + msg_per_page - 1) // msg_per_page) if total_messages else 1
@@ -114,21 +247,16 @@ def conversation(conversation_id):
         FROM messages m
         LEFT JOIN message_metadata mm ON m.id = mm.message_id
         WHERE m.conversation_id = ?
-        ORDER BY m.create_time
+        ORDER BY m.create_time, m.rowid
         LIMIT ? OFFSET ?
     ''', (conversation_id, msg_per_page, offset)).fetchall()
 
-    message_list = [message_row_to_dict(msg) for msg in messages]
+    message_list = [message_row_to_dict(msg) for msg in storage.resolve_rows(conn, messages)]
     _attach_content_parts(message_list)
 
-    dev_mode = db.get_setting('dev_mode', 'false') == 'true'
-    dark_mode = db.get_setting('dark_mode', 'false') == 'true'
-    user_name = db.get_setting('user_name', 'User')
-    assistant_name = db.get_setting('assistant_name', 'Assistant')
-
     msg_start = (msg_page - 1) * msg_per_page + 1
     msg_end = min(msg_page * msg_per_page, total_messages) if total_messages else 0
-    return render_template('conversation.html',
+    return http_cache.set_validators(make_response(render_template('conversation.html',
                          conversation=conversation,
                          messages=message_list,
                          total_messages=total_messages,
@@ -138,10 +266,10 @@ def conversation(conversation_id):
                          message_start=msg_start,
                          message_end=msg_end,
                          dev_mode=dev_mode,
-                         verbose_mode=verbose_mode or override_verbose_mode,
+                         verbose_mode=verbose_mode,
                          dark_mode=dark_mode,
                          user_name=user_name,
-                         assistant_name=assistant_name)
+                         assistant_name=assistant_name)), etag, modified, PAGE_CACHE_CONTROL)
 
 
 @bp.route('/conversation/<conversation_id>/nice')
@@ -152,76 +280,65 @@ def nice_conversation(conversation_id):
     if not conversation:
         return "Conversation not found", 404
 
-    canonical_endpoint = conn.execute('''
-        SELECT m.id, m.role, m.content, m.create_time, m.parent_id
-        FROM messages m
-        LEFT JOIN messages child ON m.id = child.parent_id
-        WHERE m.conversation_id = ? AND child.id IS NULL
-        ORDER BY m.create_time DESC
-        LIMIT 1
-    ''', (conversation_id,)).fetchone()
+    dev_mode = db.get_setting('dev_mode', 'false') == 'true'
+    dark_mode = db.get_setting('dark_mode', 'false') == 'true'
+    verbose_mode = db.get_setting('verbose_mode', 'false') == 'true' or session.get('override_verbose_mode', False)
+    user_name = db.get_setting('user_name', 'User')
+    assistant_name = db.get_setting('assistant_name', 'Assistant')
+    etag, modified = _page_validators(conn, 'nice', conversation, dev_mode, dark_mode, verbose_mode,
+                                      user_name, assistant_name)
+    unchanged = http_cache.not_modified(etag, modified, PAGE_CACHE_CONTROL)
+    if unchanged is not None:
+        return unchanged
+
+    # Leaf first, as the template reverses it.
+    path_rows = conn.execute(f'''
+        SELECT {_PATH_COLUMNS}
+        FROM canonical_thread t
+        JOIN messages m ON m.id = t.message_id
+        LEFT JOIN message_metadata mm ON m.id = mm.message_id
+        WHERE t.conversation_id = ?
+        ORDER BY t.position DESC
+    ''', (conversation_id,)).fetchall() or _walk_canonical_path(conn, conversation_id, _PATH_COLUMNS)
 
-    if not canonical_endpoint:
+    if not path_rows:
         return "No canonical endpoint found", 404
 
-    endpoint_id = canonical_endpoint['id']
-    path_rows = conn.execute('''
-        WITH RECURSIVE path AS (
-            SELECT m.id, m.conversation_id, m.role, m.content, m.create_time, m.update_time, m.parent_id,
-                   mm.message_type, mm.model_slug, mm.citations, mm.content_references,
-                   mm.finish_details, mm.is_complete, mm.request_id, mm.timestamp_,
-                   mm.message_source, mm.serialization_metadata
-            FROM messages m
-            LEFT JOIN message_metadata mm ON m.id = mm.message_id
-            WHERE m.id = ?
-            UNION ALL
-            SELECT m.id, m.conversation_id, m.role, m.content, m.create_time, m.update_time, m.parent_id,
-                   mm.message_type, mm.model_slug, mm.citations, mm.content_references,
-                   mm.finish_details, mm.is_complete, mm.request_id, mm.timestamp_,
-                   mm.message_source, mm.serialization_metadata
-            FROM messages m
-            LEFT JOIN message_metadata mm ON m.id = mm.message_id
-            INNER JOIN path p ON m.id = p.parent_id
-        )
-        SELECT * FROM path
-    ''', (endpoint_id,)).fetchall()
-    path = [message_row_to_dict(message) for message in path_rows]
+    path = [message_row_to_dict(message) for message in storage.resolve_rows(conn, path_rows)]
     _attach_content_parts(path)
 
     path = [m for m in path if m.get('role') != 'system' and _message_has_displayable_content(m)]
 
-    total_messages = conn.execute('''
-        SELECT COUNT(*) as count
-        FROM messages
-        WHERE conversation_id = ?
-    ''', (conversation_id,)).fetchone()['count']
+    summary = _conversation_summary(conn, conversation_id)
 
-    dev_mode = db.get_setting('dev_mode', 'false') == 'true'
-    dark_mode = db.get_setting('dark_mode', 'false') == 'true'
-    verbose_mode = db.get_setting('verbose_mode', 'false') == 'true'
-    override_verbose_mode = session.get('override_verbose_mode', False)
-    user_name = db.get_setting('user_name', 'User')
-    assistant_name = db.get_setting('assistant_name', 'Assistant')
-
-    return render_template('nice_conversation.html',
+    return http_cache.set_validators(make_response(render_template('nice_conversation.html',
                          conversation=conversation,
                          canonical_path=path,
-                         total_messages=total_messages,
+                         total_messages=summary['message_count'],
+                         models=summary['models'],
                          dev_mode=dev_mode,
-                         verbose_mode=verbose_mode or override_verbose_mode,
+                         verbose_mode=verbose_mode,
                          dark_mode=dark_mode,
                          user_name=user_name,
-                         assistant_name=assistant_name)
+                         assistant_name=assistant_name)), etag, modified, PAGE_CACHE_CONTROL)
 
 
 @bp.route('/conversation/<conversation_id>/full')
 def full_conversation(conversation_id):
     session['override_dev_mode'] = True
-    return redirect(url_for('main.conversation', conversation_id=conversation_id))
+    return redirect(url_for('main.conversation', conversation_id=conversation_id, page=request.args.get('page')))
+
+
+def _looks_like_export(head):
+    """Cheap check before queueing: a zip archive, or JSON whose top level is an array or object."""
+    if head.startswith(b'PK\x03\x04'):
+        return True
+    return head.lstrip(b' \t\r\n')[:1] in (b'[', b'{')
 
 
 @bp.route('/import', methods=['POST'])
 def import_json():
+    """Spool the upload (conversations.json or export .zip) to disk and queue a background import job."""
     err = validate_csrf()
     if err:
         return err[0], err[1]
@@ -230,38 +347,58 @@ def import_json():
         return 'No file uploaded', 400
     if file.filename == '':
         return 'No file selected', 400
+    fd, path = tempfile.mkstemp(prefix='chatgpt-import-', suffix='.upload')
+    os.close(fd)
     try:
-        content = file.read()
-        if not content:
+        file.save(path)
+        with open(path, 'rb') as f:
+            head = f.read(1024)
+        if not head:
+            os.unlink(path)
             return 'Empty file', 400
-        data = json.loads(content)
-        n = db.import_conversations_data(data)
-        flash(f'Imported {n} conversation{"s" if n != 1 else ""}.')
-        return redirect(url_for('main.index'))
-    except json.JSONDecodeError:
-        return 'Invalid JSON file', 400
+        if not _looks_like_export(head):
+            os.unlink(path)
+            return 'Invalid JSON file', 400
     except Exception as e:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
         return f'Error importing file: {str(e)}', 400
+    job_id = import_jobs.start_import_job(path, file.filename)
+    status_url = url_for('main.import_status', job_id=job_id)
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json' or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'job_id': job_id, 'status_url': status_url}), 202
+    flash(f'Import started for {file.filename}.')
+    return redirect(url_for('main.index', import_job=job_id))
+
+
+@bp.route('/import/status/<job_id>')
+def import_status(job_id):
+    """Progress of a background import job: state, conversations done, rows/sec, ETA."""
+    status = import_jobs.get_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown import job'}), 404
+    return jsonify(status)
 
 
 @bp.route('/conversation/<conversation_id>/pin', methods=['POST'])
 def toggle_pin(conversation_id):
-    """Toggle pinned/favorite state for a conversation (#61). Stored in settings as JSON array."""
+    """Toggle pinned/favorite state for a conversation (#61): one row in pins, deleted or inserted.
+
+    Advances the pins version (not the data version: no cached figure depends on pins), which the list
+    API's ETag includes.
+    """
     err = validate_csrf()
     if err:
         return err[0], err[1]
     conn = db.get_db()
     if conn.execute('SELECT id FROM conversations WHERE id = ?', (conversation_id,)).fetchone() is None:
         return "Conversation not found", 404
-    try:
-        pinned = json.loads(db.get_setting('pinned_conversation_ids', '[]'))
-    except (TypeError, ValueError, json.JSONDecodeError):
-        pinned = []
-    if conversation_id in pinned:
-        pinned = [x for x in pinned if x != conversation_id]
-    else:
-        pinned = list(pinned) + [conversation_id]
-    db.set_setting('pinned_conversation_ids', json.dumps(pinned))
+    if conn.execute('DELETE FROM pins WHERE conversation_id = ?', (conversation_id,)).rowcount == 0:
+        conn.execute('INSERT INTO pins (conversation_id) VALUES (?)', (conversation_id,))
+    aggregates.bump_pins_version(conn)
+    conn.commit()
     return redirect(request.referrer or url_for('main.index'))
 
 
@@ -274,17 +411,25 @@ def delete_conversation(conversation_id):
     conversation = conn.execute('SELECT id FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
     if not conversation:
         return "Conversation not found", 404
-    conn.execute('DELETE FROM message_metadata WHERE message_id IN (SELECT id FROM messages WHERE conversation_id = ?)', (conversation_id,))
-    conn.execute('DELETE FROM message_children WHERE parent_id IN (SELECT id FROM messages WHERE conversation_id = ?) OR child_id IN (SELECT id FROM messages WHERE conversation_id = ?)', (conversation_id, conversation_id))
-    conn.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
-    conn.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+    db.delete_conversation(conn, conversation_id)
     conn.commit()
     flash('Conversation deleted.')
     return redirect(url_for('main.index'))
 
 
-def _get_canonical_path_rows(conn, conversation_id):
-    """Return message rows for the canonical path (root first). Empty if no canonical endpoint."""
+_PATH_COLUMNS = '''m.id, m.conversation_id, m.role, m.content, m.create_time, m.update_time, m.parent_id,
+                   mm.message_type, mm.model_slug, mm.citations, mm.content_references,
+                   mm.finish_details, mm.is_complete, mm.request_id, mm.timestamp_,
+                   mm.message_source, mm.serialization_metadata'''
+_EXPORT_PATH_COLUMNS = 'm.id, m.conversation_id, m.role, m.content, m.create_time, m.update_time, m.parent_id'
+
+
+def _walk_canonical_path(conn, conversation_id, columns):
+    """Canonical path rows (leaf first) computed on the fly from the newest childless message up parent links.
+
+    Fallback for conversations without a stored canonical_thread: rows written outside the importer, or
+    databases imported before it existed (schema migration 2 fills those in).
+    """
     canonical_endpoint = conn.execute('''
         SELECT m.id
         FROM messages m
@@ -295,19 +440,59 @@ def _get_canonical_path_rows(conn, conversation_id):
     ''', (conversation_id,)).fetchone()
     if not canonical_endpoint:
         return []
-    endpoint_id = canonical_endpoint['id']
-    path_rows = conn.execute('''
+    return conn.execute(f'''
         WITH RECURSIVE path AS (
-            SELECT m.id, m.conversation_id, m.role, m.content, m.create_time, m.update_time
-            FROM messages m WHERE m.id = ?
+            SELECT {columns}
+            FROM messages m
+            LEFT JOIN message_metadata mm ON m.id = mm.message_id
+            WHERE m.id = ?
             UNION ALL
-            SELECT m.id, m.conversation_id, m.role, m.content, m.create_time, m.update_time
-            FROM messages m INNER JOIN path p ON m.id = p.parent_id
+            SELECT {columns}
+            FROM messages m
+            LEFT JOIN message_metadata mm ON m.id = mm.message_id
+            INNER JOIN path p ON m.id = p.parent_id
         )
         SELECT * FROM path
-    ''', (endpoint_id,)).fetchall()
-    # path is leaf first; reverse so root is first (position 1)
-    return list(reversed(path_rows))
+    ''', (canonical_endpoint['id'],)).fetchall()
+
+
+def _get_canonical_path_rows(conn, conversation_id):
+    """Return message rows for the canonical path (root first). Empty if no canonical endpoint."""
+    path_rows = conn.execute(f'''
+        SELECT {_EXPORT_PATH_COLUMNS}
+        FROM canonical_thread t
+        JOIN messages m ON m.id = t.message_id
+        WHERE t.conversation_id = ?
+        ORDER BY t.position
+    ''', (conversation_id,)).fetchall()
+    if path_rows:
+        return storage.resolve_rows(conn, path_rows)
+    # the walk is leaf first; reverse so root is first (position 1)
+    return list(reversed(storage.resolve_rows(conn, _walk_canonical_path(conn, conversation_id, _EXPORT_PATH_COLUMNS))))
+
+
+def _iter_canonical_threads(conn):
+    """Yield (conversation row, canonical path rows root first) for every conversation, ordered by update_time.
+
+    Stored threads come from one ordered query over canonical_thread; conversations without one fall back
+    to _get_canonical_path_rows.
+    """
+    cursor = conn.execute(f'''
+        SELECT c.id AS c_id, c.create_time AS c_create_time, c.update_time AS c_update_time, c.title AS c_title,
+               t.position, {_EXPORT_PATH_COLUMNS}
+        FROM conversations c
+        LEFT JOIN canonical_thread t ON t.conversation_id = c.id
+        LEFT JOIN messages m ON m.id = t.message_id
+        ORDER BY c.update_time, c.id, t.position
+    ''')
+    for _, group in itertools.groupby(cursor, key=lambda row: row['c_id']):
+        rows = list(group)
+        conversation = {'id': rows[0]['c_id'], 'create_time': rows[0]['c_create_time'],
+                        'update_time': rows[0]['c_update_time'], 'title': rows[0]['c_title']}
+        if rows[0]['position'] is None:
+            yield conversation, _get_canonical_path_rows(conn, conversation['id'])
+        else:
+            yield conversation, storage.resolve_rows(conn, [row for row in rows if row['id'] is not None])
 
 
 def _build_export_mapping(conn, conversation_id):
@@ -322,6 +507,7 @@ def _build_export_mapping(conn, conversation_id):
         WHERE m.conversation_id = ?
         ORDER BY m.create_time
     ''', (conversation_id,)).fetchall()
+    messages = storage.resolve_rows(conn, messages)
     children_map = {}
     for cr in conn.execute(
         'SELECT parent_id, child_id FROM message_children WHERE parent_id IN (SELECT id FROM messages WHERE conversation_id = ?)',
@@ -396,6 +582,7 @@ def export_conversation_markdown(conversation_id):
         WHERE conversation_id = ?
         ORDER BY create_time
     ''', (conversation_id,)).fetchall()
+    messages = storage.resolve_rows(conn, messages)
     lines = [f"# {conversation['title']}", ""]
     for m in messages:
         role = (m['role'] or 'user').capitalize()
@@ -426,10 +613,6 @@ def export_conversation_markdown(conversation_id):
 def export_canonical_db():
     """Generate a SQLite DB containing only canonical (linear) threads for use in other tools."""
     conn = db.get_db()
-    conversations = conn.execute(
-        'SELECT id, create_time, update_time, title FROM conversations ORDER BY update_time'
-    ).fetchall()
-
     tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
     tmp.close()
     out_path = tmp.name
@@ -454,13 +637,12 @@ def export_canonical_db():
             );
             CREATE INDEX idx_canonical_messages_conversation ON messages(conversation_id);
         ''')
-        for conv in conversations:
+        for conv, path_rows in _iter_canonical_threads(conn):
             cid = conv['id']
             export_conn.execute(
                 'INSERT INTO conversations (id, create_time, update_time, title) VALUES (?, ?, ?, ?)',
                 (cid, conv['create_time'] or '', conv['update_time'] or '', conv['title'] or '')
             )
-            path_rows = _get_canonical_path_rows(conn, cid)
             for pos, row in enumerate(path_rows, start=1):
                 export_conn.execute('''
                     INSERT INTO messages (id, conversation_id, role, content, create_time, update_time, position)
@@ -546,31 +728,55 @@ def _week_rows_to_labels(rows):
     return out
 
 
-@bp.route('/stats')
-def stats():
-    """Conversation statistics dashboard (#58). Expanded: activity span, full by-week history."""
-    conn = db.get_db()
+def _stats_figures(conn):
+    """Totals and activity span for the stats page."""
     total_conversations = conn.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
     total_messages = conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
-    avg_messages = (total_messages / total_conversations) if total_conversations else 0
 
     # Activity span (first/last conversation update_time)
     span = conn.execute('''
-        SELECT MIN(CAST(update_time AS REAL)) AS first_ts,
-               MAX(CAST(update_time AS REAL)) AS last_ts
-        FROM conversations
-        WHERE update_time IS NOT NULL AND update_time != ''
+        SELECT (SELECT MIN(update_ts) FROM conversations) AS first_ts,
+               (SELECT MAX(update_ts) FROM conversations) AS last_ts
     ''').fetchone()
-    first_activity_utc = datetime.fromtimestamp(span['first_ts'], tz=timezone.utc).strftime('%Y-%m-%d') if span and span['first_ts'] else None
-    last_activity_utc = datetime.fromtimestamp(span['last_ts'], tz=timezone.utc).strftime('%Y-%m-%d') if span and span['last_ts'] else None
 
     # Total distinct weeks with activity (for "full history" link)
     total_weeks_row = conn.execute('''
-        SELECT COUNT(DISTINCT CAST(CAST(update_time AS REAL) / 604800 AS INTEGER)) AS n
-        FROM conversations
-        WHERE update_time IS NOT NULL AND update_time != ''
+        SELECT COUNT(*) AS n
+        FROM (SELECT update_week FROM conversations WHERE update_week IS NOT NULL GROUP BY update_week)
     ''').fetchone()
-    total_weeks = total_weeks_row['n'] if total_weeks_row else 0
+    return {
+        'total_conversations': total_conversations,
+        'total_messages': total_messages,
+        'avg_messages': (total_messages / total_conversations) if total_conversations else 0,
+        'first_activity_utc': datetime.fromtimestamp(span['first_ts'], tz=timezone.utc).strftime('%Y-%m-%d') if span and span['first_ts'] else None,
+        'last_activity_utc': datetime.fromtimestamp(span['last_ts'], tz=timezone.utc).strftime('%Y-%m-%d') if span and span['last_ts'] else None,
+        'total_weeks': total_weeks_row['n'] if total_weeks_row else 0,
+    }
+
+
+def _weeks_page(conn, limit, offset):
+    """Conversations per week, newest week first, as week_label / cnt dicts."""
+    rows = conn.execute('''
+        SELECT update_week AS week_key,
+               COUNT(*) AS cnt
+        FROM conversations
+        WHERE update_week IS NOT NULL
+        GROUP BY update_week
+        ORDER BY update_week DESC
+        LIMIT ? OFFSET ?
+    ''', (limit, offset)).fetchall()
+    return _week_rows_to_labels(rows)
+
+
+@bp.route('/stats')
+def stats():
+    """Conversation statistics dashboard (#58). Expanded: activity span, full by-week history.
+
+    Every figure comes from the aggregates cache, so repeat visits run no counts until the next import or delete.
+    """
+    conn = db.get_db()
+    figures = aggregates.get(conn, ('stats',), _stats_figures)
+    total_weeks = figures['total_weeks']
 
     # Conversations per week: either last 20 (preview) or full paginated
     show_all_weeks = request.args.get('weeks') == 'all'
@@ -579,41 +785,19 @@ def stats():
 
     if show_all_weeks:
         offset = (by_week_page - 1) * by_week_per_page
-        by_week_rows = conn.execute('''
-            SELECT CAST(CAST(update_time AS REAL) / 604800 AS INTEGER) AS week_key,
-                   COUNT(*) AS cnt
-            FROM conversations
-            WHERE update_time IS NOT NULL AND update_time != ''
-            GROUP BY week_key
-            ORDER BY week_key DESC
-            LIMIT ? OFFSET ?
-        ''', (by_week_per_page, offset)).fetchall()
-        by_week = _week_rows_to_labels(by_week_rows)
         by_week_pages_total = (total_weeks + by_week_per_page - 1) // by_week_per_page if total_weeks else 1
     else:
-        by_week_rows = conn.execute('''
-            SELECT CAST(CAST(update_time AS REAL) / 604800 AS INTEGER) AS week_key,
-                   COUNT(*) AS cnt
-            FROM conversations
-            WHERE update_time IS NOT NULL AND update_time != ''
-            GROUP BY week_key
-            ORDER BY week_key DESC
-            LIMIT 20
-        ''').fetchall()
-        by_week = _week_rows_to_labels(by_week_rows)
+        offset = 0
         by_week_page = 1
         by_week_per_page = 20
         by_week_pages_total = 1
+    by_week = aggregates.get(conn, ('weeks', by_week_per_page, offset),
+                             lambda c: _weeks_page(c, by_week_per_page, offset))
 
     dev_mode = db.get_setting('dev_mode', 'false') == 'true'
     dark_mode = db.get_setting('dark_mode', 'false') == 'true'
     return render_template('stats.html',
-                         total_conversations=total_conversations,
-                         total_messages=total_messages,
-                         avg_messages=avg_messages,
-                         first_activity_utc=first_activity_utc,
-                         last_activity_utc=last_activity_utc,
-                         total_weeks=total_weeks,
+                         **figures,
                          by_week=by_week,
                          show_all_weeks=show_all_weeks,
                          by_week_page=by_week_page,
@@ -1,30 +1,78 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 # ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
 # Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
-"""CLI ingest: load conversations from a JSON file (e.g. from an extracted ChatGPT export zip)."""
+"""CLI ingest: stream conversations from conversations.json or straight from the ChatGPT export zip."""
 import argparse
-import json
 import os
 import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 from app import app
-from db import import_conversations_data, init_db
+from db import get_ingest_checkpoint, import_conversations_data, import_conversations_sharded, init_db, set_setting
+from export_reader import iter_conversations, open_conversation_stream
 
 
 def main():
     # Change to script dir only when invoked as entry point so app can find chatgpt.db
     os.chdir(BASE_DIR)
-    parser = argparse.ArgumentParser(description="Ingest ChatGPT conversations from a JSON file")
+    parser = argparse.ArgumentParser(description="Ingest ChatGPT conversations from a JSON file or export zip")
     parser.add_argument(
         "path",
         nargs="?",
         default=os.path.join(BASE_DIR, "chatgpt_export", "conversations.json"),
-        help="Path to conversations.json (default: chatgpt_export/conversations.json)",
+        help="Path to conversations.json or the export .zip (default: chatgpt_export/conversations.json)",
     )
     parser.add_argument("--init-db", action="store_true", help="Initialize database before ingest")
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Write each batch of conversations with executemany instead of one statement per row (same result, fewer round trips)",
+    )
+    parser.add_argument(
+        "--bulk-load",
+        action="store_true",
+        help="Cold-load mode for first-time or --init-db ingests: drop secondary indexes and relax durability "
+             "while loading, then rebuild indexes and ANALYZE (implies --bulk)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Normalize conversations in N worker processes; this process remains the only DB writer (default: 1)",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Skip conversations whose content fingerprint is unchanged since the last import (monthly refreshes)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from this file's last committed checkpoint instead of re-reading conversations already loaded",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Write through N shard processes, each into its own temporary SQLite file, then merge them "
+             "into the database with ATTACH (for very large exports on multi-core machines; default: 0, off)",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Turn on compressed storage for this database (large message content is zlib-compressed from now on; "
+             "use compact_db.py --compress to convert what is already stored)",
+    )
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.shards < 0:
+        parser.error("--shards must be 0 (off) or a positive count")
+    if args.shards and (args.workers > 1 or args.delta or args.resume):
+        parser.error("--shards cannot be combined with --workers, --delta or --resume")
 
     if not os.path.isfile(args.path):
         print(f"Error: file not found: {args.path}", file=sys.stderr)
@@ -35,15 +83,66 @@ def main():
             init_db()
         print("Database initialized.")
 
-    print(f"Loading {args.path}...")
-    with open(args.path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if not isinstance(data, list):
-        data = [data]
-    print(f"Loaded {len(data)} conversations.")
-    with app.app_context():
-        import_conversations_data(data)
-    print("Ingest complete.")
+    if args.compress:
+        with app.app_context():
+            init_db()
+            set_setting("compress_content", "true")
+
+    if args.shards:
+        print(f"Streaming {args.path} into {args.shards} shards...")
+        try:
+            with app.app_context():
+                n = import_conversations_sharded(iter_conversations(args.path), args.shards, bulk_load=args.bulk_load)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Ingest complete: {n} conversations.")
+        return
+
+    # Every commit records how far into this file the ingest got; --resume seeks past that point.
+    st = os.stat(args.path)
+    checkpoint = {
+        "source": os.path.realpath(args.path),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "conversations": 0,
+    }
+    resume_offset = 0
+    if args.resume:
+        with app.app_context():
+            saved = get_ingest_checkpoint(checkpoint["source"])
+        if saved is None:
+            print("No checkpoint for this file; starting from the beginning.")
+        elif (saved["size"], saved["mtime"]) != (st.st_size, st.st_mtime):
+            print("File changed since the checkpoint was written; starting from the beginning.")
+        elif saved["complete"]:
+            print(f"Already ingested ({saved['conversations']} conversations); nothing to resume.")
+            return
+        else:
+            resume_offset = saved["byte_offset"]
+            checkpoint["conversations"] = saved["conversations"]
+            checkpoint["last_conversation_id"] = saved["last_conversation_id"]
+            print(f"Resuming after conversation {saved['conversations']} ({saved['last_conversation_id']}).")
+
+    # Conversations are decoded one at a time as the importer consumes them, so peak memory
+    # stays around one conversation regardless of export size.
+    print(f"Streaming {args.path}...")
+    try:
+        with app.app_context(), open_conversation_stream(args.path, resume_offset=resume_offset) as stream:
+            checkpoint["offset"] = lambda: stream.offset
+            n = import_conversations_data(
+                stream,
+                bulk=args.bulk or args.bulk_load,
+                workers=args.workers,
+                delta=args.delta,
+                bulk_load=args.bulk_load,
+                checkpoint=checkpoint,
+            )
+    except ValueError as e:
+        # Malformed JSON or an archive without conversations.json
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Ingest complete: {n} conversations.")
 
 
 if __name__ == "__main__":
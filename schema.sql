@@ -1,12 +1,18 @@
 -- SPDX-License-Identifier: AGPL-3.0-only
 -- ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
 -- Single source of truth for schema. Executed by app.init_db(). conversations.id is TEXT.
+-- New databases are created from this file and stamped with the latest schema_version; existing ones are
+-- first brought forward by the steps in migrations.py, so a change that is not a plain CREATE ... IF NOT
+-- EXISTS (new columns, backfills) goes here and in a new migration.
 
 CREATE TABLE IF NOT EXISTS conversations (
     id TEXT PRIMARY KEY,
     create_time TEXT,
     update_time TEXT,
-    title TEXT
+    title TEXT,
+    -- Numeric forms of update_time for indexed ordering and weekly bucketing (migration 1 for older databases).
+    update_ts REAL GENERATED ALWAYS AS (CAST(NULLIF(update_time, '') AS REAL)) VIRTUAL,
+    update_week INTEGER GENERATED ALWAYS AS (CAST(update_ts / 604800 AS INTEGER)) VIRTUAL
 );
 
 CREATE TABLE IF NOT EXISTS messages (
@@ -43,11 +49,125 @@ CREATE TABLE IF NOT EXISTS message_children (
     FOREIGN KEY (child_id) REFERENCES messages(id)
 );
 
+-- Content-addressed store for long message content and metadata JSON (see storage.py). Those columns
+-- hold either inline text or a BLOB reference b'H' || first 16 bytes of sha256(value) into this table.
+-- data is TEXT, or a BLOB b'Z' || zlib(utf-8) when compress_content is on.
+CREATE TABLE IF NOT EXISTS content_blobs (
+    hash BLOB PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+-- Content fingerprint of each conversation written by a delta import; lets the next one skip unchanged
+-- conversations before normalizing them. Other imports drop the fingerprints of what they rewrite.
+CREATE TABLE IF NOT EXISTS conversation_fingerprints (
+    conversation_id TEXT PRIMARY KEY,
+    update_time TEXT,
+    fingerprint TEXT NOT NULL
+);
+
+-- Canonical thread of each conversation, computed at import: the newest leaf (latest create_time among
+-- messages without children) and its ancestors, position 1 = root. Reading a thread is one range scan.
+CREATE TABLE IF NOT EXISTS canonical_thread (
+    conversation_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, position)
+) WITHOUT ROWID;
+
+-- Per-conversation figures kept by the importer (and delete) so list and detail pages don't aggregate
+-- messages per request. Times are REAL epoch seconds; models is a JSON array of distinct model_slug values.
+CREATE TABLE IF NOT EXISTS conversation_summary (
+    conversation_id TEXT PRIMARY KEY,
+    message_count INTEGER NOT NULL,
+    canonical_length INTEGER NOT NULL,
+    first_message_time REAL,
+    last_message_time REAL,
+    models TEXT NOT NULL DEFAULT '[]'
+);
+
+-- Distinct facet values per conversation (facets.py): facet is 'model', 'role' or 'content_type'.
+-- Written by the importer with the canonical thread and summary; the primary key serves filters and counts.
+CREATE TABLE IF NOT EXISTS conversation_facets (
+    facet TEXT NOT NULL,
+    value TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    PRIMARY KEY (facet, value, conversation_id)
+) WITHOUT ROWID;
+
+-- Pinned (favorite) conversations, listed first on the list page. User state: imports leave it alone,
+-- db.delete_conversation removes a conversation's pin.
+CREATE TABLE IF NOT EXISTS pins (
+    conversation_id TEXT PRIMARY KEY,
+    pinned_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Plain text of each message with any (search.message_text), written by the importer; message_fts indexes
+-- it for full-text search (search.py). The triggers keep the external-content FTS index in step.
+CREATE TABLE IF NOT EXISTS message_text (
+    id INTEGER PRIMARY KEY,
+    message_id TEXT NOT NULL UNIQUE,
+    conversation_id TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+    body, content='message_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS message_text_ai AFTER INSERT ON message_text BEGIN
+    INSERT INTO message_fts (rowid, body) VALUES (new.id, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS message_text_ad AFTER DELETE ON message_text BEGIN
+    INSERT INTO message_fts (message_fts, rowid, body) VALUES ('delete', old.id, old.body);
+END;
+
+-- Trigram index over conversations.title for substring and similar-title search (search.py). The
+-- BEFORE INSERT trigger drops the entry of a row that INSERT OR REPLACE is about to replace, since
+-- REPLACE deletes it without firing delete triggers.
+CREATE VIRTUAL TABLE IF NOT EXISTS title_fts USING fts5(
+    title, content='conversations', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS conversations_title_bi BEFORE INSERT ON conversations BEGIN
+    INSERT INTO title_fts (title_fts, rowid, title) SELECT 'delete', rowid, title FROM conversations WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_title_ai AFTER INSERT ON conversations BEGIN
+    INSERT INTO title_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_title_ad AFTER DELETE ON conversations BEGIN
+    INSERT INTO title_fts (title_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_title_au AFTER UPDATE OF title ON conversations BEGIN
+    INSERT INTO title_fts (title_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+    INSERT INTO title_fts (rowid, title) VALUES (new.rowid, new.title);
+END;
+
+-- Durable CLI ingest progress per source file, written in the same transaction as each batch commit.
+-- byte_offset is just past the last committed conversation in conversations.json (run_ingest.py --resume).
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    conversations INTEGER NOT NULL,
+    last_conversation_id TEXT,
+    byte_offset INTEGER NOT NULL,
+    complete BOOLEAN NOT NULL DEFAULT 0,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Applied migrations.py steps; created (and, for new databases, stamped) by migrations.upgrade().
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE INDEX IF NOT EXISTS idx_conversations_update_time ON conversations(update_time);
+CREATE INDEX IF NOT EXISTS idx_conversations_update_ts_id ON conversations(update_ts, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_update_week ON conversations(update_week);
 CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_messages_parent_id ON messages(parent_id);
 CREATE INDEX IF NOT EXISTS idx_message_children_parent_id ON message_children(parent_id);
 CREATE INDEX IF NOT EXISTS idx_message_children_child_id ON message_children(child_id);
+CREATE INDEX IF NOT EXISTS idx_conversation_facets_conversation_id ON conversation_facets(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_message_text_conversation_id ON message_text(conversation_id);
 
 CREATE TABLE IF NOT EXISTS settings (
     key TEXT PRIMARY KEY,
@@ -59,5 +179,6 @@ INSERT OR IGNORE INTO settings (key, value) VALUES ('assistant_name', 'Assistant
 INSERT OR IGNORE INTO settings (key, value) VALUES ('dev_mode', 'false');
 INSERT OR IGNORE INTO settings (key, value) VALUES ('dark_mode', 'false');
 INSERT OR IGNORE INTO settings (key, value) VALUES ('verbose_mode', 'false');
+INSERT OR IGNORE INTO settings (key, value) VALUES ('compress_content', 'false');
 
 DELETE FROM settings WHERE key = 'nice_mode';
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Ingest benchmark: import generated exports at several sizes and report throughput per phase.
+
+    python scripts/bench_ingest.py --sizes 1000,5000,20000 --output bench_results.json
+    python scripts/bench_ingest.py --mode bulk-load --baseline benchmarks/baseline.json
+
+Exports come from scripts/generate_export.py (same seed, same file). Each size is imported --repeat
+times, each into a fresh database in its own process (so peak RSS is per run), and the median run by
+wall time is kept. Results (conversations/sec, messages/sec, peak RSS, DB size and seconds per importer
+phase) are printed and written as JSON; with --baseline the run is compared against a stored result
+file and exits 1 if throughput regressed by more than --tolerance. Sizes whose median run took less
+than --min-seconds are reported but not flagged: timings that short are mostly noise.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('default', 'bulk', 'bulk-load')
+PHASES = ('parse', 'normalize', 'messages', 'children', 'derived', 'commit', 'index_rebuild')
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _db_size_mb(db_path):
+    size = sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+    return round(size / 1e6, 2)
+
+
+def run_once(export_path, db_path, mode, workers, shards=0):
+    """Import export_path into a new database at db_path in this process and return the result dict."""
+    os.environ['DATABASE_PATH'] = db_path
+    sys.path.insert(0, BASE)
+    import db
+    from export_reader import iter_conversations
+
+    db.DATABASE_PATH = db_path
+    db.init_db()
+    timings = {}
+    start = time.perf_counter()
+    if shards:
+        # Phases happen inside the shard processes; only the total is measured.
+        imported = db.import_conversations_sharded(iter_conversations(export_path), shards, bulk_load=mode == 'bulk-load')
+    else:
+        imported = db.import_conversations_data(
+            iter_conversations(export_path),
+            bulk=mode != 'default',
+            bulk_load=mode == 'bulk-load',
+            workers=workers,
+            timings=timings,
+        )
+    seconds = time.perf_counter() - start
+    conn = sqlite3.connect(db_path)
+    messages = conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+    children = conn.execute('SELECT COUNT(*) FROM message_children').fetchone()[0]
+    conn.close()
+    return {
+        'conversations': imported,
+        'messages': messages,
+        'links': children,
+        'seconds': round(seconds, 3),
+        'conversations_per_sec': round(imported / seconds, 1) if seconds else None,
+        'messages_per_sec': round(messages / seconds, 1) if seconds else None,
+        'peak_rss_mb': _peak_rss_mb(),
+        'db_size_mb': _db_size_mb(db_path),
+        'export_size_mb': round(os.path.getsize(export_path) / 1e6, 2),
+        'phases': {name: round(timings[name], 3) for name in PHASES if name in timings},
+    }
+
+
+def _export_for(size, args, workdir):
+    path = os.path.join(workdir, f'export-{size}-seed{args.seed}.json')
+    if not os.path.exists(path):
+        cmd = [
+            sys.executable, os.path.join(BASE, 'scripts', 'generate_export.py'), path,
+            '--conversations', str(size), '--seed', str(args.seed),
+            '--depth', str(args.depth), '--text-size', str(args.text_size), '--tool-size', str(args.tool_size),
+        ]
+        subprocess.run(cmd, check=True)
+    return path
+
+
+def _run_size(export_path, args, workdir, size):
+    db_path = os.path.join(workdir, f'bench-{size}.db')
+    result_path = db_path + '.json'
+    for p in (db_path, db_path + '-wal', db_path + '-shm', result_path):
+        if os.path.exists(p):
+            os.unlink(p)
+    cmd = [
+        sys.executable, os.path.abspath(__file__), '--run-one', export_path, db_path, result_path,
+        '--mode', args.mode, '--workers', str(args.workers), '--shards', str(args.shards),
+    ]
+    out = None if args.verbose else subprocess.DEVNULL
+    subprocess.run(cmd, check=True, stdout=out, stderr=out)
+    with open(result_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def median_run(runs):
+    """The run with the median wall time (the lower middle one for an even count), with every run's seconds."""
+    ordered = sorted(runs, key=lambda r: r['seconds'])
+    result = dict(ordered[(len(ordered) - 1) // 2])
+    result['runs_seconds'] = [r['seconds'] for r in runs]
+    return result
+
+
+def _bench_size(size, args, workdir):
+    export_path = _export_for(size, args, workdir)
+    result = median_run([_run_size(export_path, args, workdir, size) for _ in range(args.repeat)])
+    result['size'] = size
+    return result
+
+
+def _print_results(results):
+    print(f"{'size':>8} {'conv/s':>9} {'msg/s':>10} {'seconds':>8} {'rss MB':>7} {'db MB':>7}  phases (s)")
+    for r in results:
+        phases = ' '.join(f'{k}={v:.2f}' for k, v in r['phases'].items())
+        rss = '-' if r['peak_rss_mb'] is None else f"{r['peak_rss_mb']:.0f}"
+        print(f"{r['size']:>8} {r['conversations_per_sec']:>9.1f} {r['messages_per_sec']:>10.1f} "
+              f"{r['seconds']:>8.2f} {rss:>7} {r['db_size_mb']:>7.1f}  {phases}")
+
+
+def compare(current, baseline, tolerance, min_seconds=0.0):
+    """Print throughput versus baseline per size; return the sizes that regressed beyond tolerance.
+
+    A size whose current or baseline run took less than min_seconds is printed but never flagged.
+    """
+    if baseline.get('config', {}).get('mode') != current['config']['mode']:
+        print(f"Warning: baseline mode {baseline.get('config', {}).get('mode')!r} differs from {current['config']['mode']!r}")
+    previous = {r['size']: r for r in baseline.get('results', [])}
+    regressed = []
+    for r in current['results']:
+        old = previous.get(r['size'])
+        if not old or not old.get('conversations_per_sec'):
+            print(f"{r['size']:>8}  no baseline")
+            continue
+        change = r['conversations_per_sec'] / old['conversations_per_sec'] - 1
+        flag = ''
+        if min(r.get('seconds', min_seconds), old.get('seconds', min_seconds)) < min_seconds:
+            flag = f'  (under {min_seconds:g}s, not compared)'
+        elif change < -tolerance:
+            regressed.append(r['size'])
+            flag = '  REGRESSION'
+        print(f"{r['size']:>8}  {old['conversations_per_sec']:.1f} -> {r['conversations_per_sec']:.1f} conv/s ({change:+.1%}){flag}")
+    return regressed
+
+
+def _sizes(value):
+    try:
+        sizes = [int(s) for s in value.split(',') if s.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError('sizes must be comma-separated integers')
+    if not sizes or min(sizes) < 1:
+        raise argparse.ArgumentTypeError('sizes must be positive')
+    return sizes
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark db.import_conversations_data on generated exports")
+    parser.add_argument("--sizes", type=_sizes, default=[1000, 5000, 20000], help="Conversation counts to run (default: 1000,5000,20000)")
+    parser.add_argument("--mode", choices=MODES, default='bulk', help="Importer mode (default: bulk)")
+    parser.add_argument("--workers", type=int, default=1, metavar="N", help="Normalization processes (default: 1)")
+    parser.add_argument("--shards", type=int, default=0, metavar="N", help="Use the sharded importer with N shards (default: off)")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed (default: 1)")
+    parser.add_argument("--depth", type=int, default=20, help="Generator --depth (default: 20)")
+    parser.add_argument("--text-size", type=int, default=800, help="Generator --text-size (default: 800)")
+    parser.add_argument("--tool-size", type=int, default=20000, help="Generator --tool-size (default: 20000)")
+    parser.add_argument("--workdir", help="Directory for generated exports and databases (default: a temp dir; reuse to cache exports)")
+    parser.add_argument("--output", default=os.path.join(BASE, 'bench_results.json'), help="Result file (default: bench_results.json)")
+    parser.add_argument("--baseline", help="Stored result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed conv/s drop versus baseline (default: 0.15)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N", help="Runs per size; the median is reported (default: 3)")
+    parser.add_argument("--min-seconds", type=float, default=1.0, metavar="S",
+                        help="Do not flag regressions for sizes whose run took less than S seconds (default: 1.0)")
+    parser.add_argument("--verbose", action="store_true", help="Show importer output")
+    parser.add_argument("--run-one", nargs=3, metavar=("EXPORT", "DB", "RESULT"), help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.run_one:
+        export_path, db_path, result_path = args.run_one
+        result = run_once(export_path, db_path, args.mode, args.workers, args.shards)
+        with open(result_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        results = []
+        for size in args.sizes:
+            print(f"Benchmarking {size} conversations ({args.mode}, workers={args.workers}, shards={args.shards}, "
+                  f"{args.repeat} runs)...", file=sys.stderr)
+            results.append(_bench_size(size, args, workdir))
+    current = {
+        'version': 1,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {k: getattr(args, k) for k in ('mode', 'workers', 'shards', 'seed', 'depth', 'text_size', 'tool_size', 'repeat')},
+        'results': results,
+    }
+    _print_results(results)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+        f.write('\n')
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressed = compare(current, baseline, args.tolerance, args.min_seconds)
+        if regressed:
+            print(f"Throughput regressed more than {args.tolerance:.0%} at sizes: {', '.join(map(str, regressed))}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
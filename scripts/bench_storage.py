@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Storage benchmark: database size and read latency with and without compressed content.
+
+    python scripts/bench_storage.py --conversations 2000 --tool-size 100000 --output bench_storage.json
+
+The same generated export (scripts/generate_export.py) is imported twice, once with compress_content off
+and once on. For each database it reports file size, import time, and the latency of building the JSON
+export mapping (all messages, resolved and decoded) for a seeded sample of conversations, median and p95,
+with a warm page cache.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def bench_mode(export_path, db_path, compress, sample, seed):
+    """Import export_path into a fresh db_path with compression on or off; return size and latency figures."""
+    import db
+    from export_reader import iter_conversations
+    from routes.main import _build_export_mapping
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    db.DATABASE_PATH = db_path
+    db.init_db()
+    db.set_setting('compress_content', 'true' if compress else 'false')
+    start = time.perf_counter()
+    db.import_conversations_data(iter_conversations(export_path), bulk=True)
+    import_seconds = time.perf_counter() - start
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    ids = [r[0] for r in conn.execute('SELECT id FROM conversations ORDER BY id')]
+    picked = random.Random(seed).sample(ids, min(sample, len(ids)))
+    for cid in picked:  # warm the page cache so both modes are compared on decode cost
+        _build_export_mapping(conn, cid)
+    latencies = []
+    for cid in picked:
+        t = time.perf_counter()
+        _build_export_mapping(conn, cid)
+        latencies.append((time.perf_counter() - t) * 1000)
+    blob_bytes = conn.execute('SELECT COALESCE(SUM(length(data)), 0) FROM content_blobs').fetchone()[0]
+    compressed = conn.execute("SELECT COUNT(*) FROM content_blobs WHERE typeof(data) = 'blob'").fetchone()[0]
+    conn.close()
+    return {
+        'compress': compress,
+        'db_size_mb': round(os.path.getsize(db_path) / 1e6, 2),
+        'blob_data_mb': round(blob_bytes / 1e6, 2),
+        'compressed_blobs': compressed,
+        'import_seconds': round(import_seconds, 3),
+        'read_ms_median': round(statistics.median(latencies), 3),
+        'read_ms_p95': round(_percentile(latencies, 95), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare database size and read latency with compressed content on and off")
+    parser.add_argument("--conversations", type=int, default=2000, help="Conversations to generate (default: 2000)")
+    parser.add_argument("--tool-size", type=int, default=50000, help="Generator --tool-size, mean tool output chars (default: 50000)")
+    parser.add_argument("--text-size", type=int, default=800, help="Generator --text-size (default: 800)")
+    parser.add_argument("--sample", type=int, default=200, help="Conversations timed per mode (default: 200)")
+    parser.add_argument("--seed", type=int, default=1, help="Generator and sampling seed (default: 1)")
+    parser.add_argument("--workdir", help="Directory for the export and databases (default: a temp dir)")
+    parser.add_argument("--output", default=os.path.join(BASE, 'bench_storage.json'), help="Result file (default: bench_storage.json)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        export_path = os.path.join(workdir, f'export-{args.conversations}-seed{args.seed}.json')
+        if not os.path.exists(export_path):
+            subprocess.run([
+                sys.executable, os.path.join(BASE, 'scripts', 'generate_export.py'), export_path,
+                '--conversations', str(args.conversations), '--seed', str(args.seed),
+                '--tool-size', str(args.tool_size), '--text-size', str(args.text_size),
+            ], check=True)
+        results = []
+        for compress in (False, True):
+            print(f"Importing with compression {'on' if compress else 'off'}...", file=sys.stderr)
+            results.append(bench_mode(export_path, os.path.join(workdir, f'bench-{int(compress)}.db'),
+                                      compress, args.sample, args.seed))
+
+    print(f"{'compress':>8} {'db MB':>8} {'blobs MB':>9} {'import s':>9} {'read ms p50':>12} {'read ms p95':>12}")
+    for r in results:
+        print(f"{'on' if r['compress'] else 'off':>8} {r['db_size_mb']:>8.1f} {r['blob_data_mb']:>9.1f} "
+              f"{r['import_seconds']:>9.2f} {r['read_ms_median']:>12.2f} {r['read_ms_p95']:>12.2f}")
+    off, on = results
+    if off['db_size_mb']:
+        print(f"Compression: database {on['db_size_mb'] / off['db_size_mb']:.0%} of uncompressed size, "
+              f"median read {on['read_ms_median'] - off['read_ms_median']:+.2f} ms")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        f.write('\n')
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Generate a synthetic ChatGPT export (conversations.json or export .zip) for scale testing.
+
+Output is deterministic for a given seed and set of options, so benchmark runs can be reproduced:
+
+    python scripts/generate_export.py /tmp/conversations.json --conversations 20000 --seed 1
+    python scripts/generate_export.py /tmp/export.zip --depth 60 --branching 3 --branch-prob 0.2 \\
+        --part-types text,image,audio,tool --text-size 2000 --tool-size 200000
+
+Conversations mirror the real export shape: a null root node, a system message, then alternating
+user/assistant turns (with optional tool calls) down to --depth messages. A message branches with
+probability --branch-prob into --branching children (regenerations / edits); alternate branches are
+short. Conversations are written one at a time, so memory stays flat at any count.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import uuid
+import zipfile
+
+PART_TYPES = ('text', 'image', 'audio', 'tool')
+BASE_TIME = 1672531200.0  # 2023-01-01T00:00:00Z
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)  # zip member timestamp (the format's earliest), instead of the current time
+MODELS = ('gpt-4o', 'gpt-4', 'gpt-3.5-turbo', 'o1-preview')
+
+_WORDS = (
+    'the of and to in is that for it as with was on be by this are or at from not but have an they which '
+    'you one were all we can her has there been if more when will would who so no out up into do about '
+    'python sqlite query index export conversation message thread branch model token stream batch'
+).split()
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _text(rng, size):
+    """Roughly size characters of word salad, with the odd markdown block so rendering paths get exercised."""
+    target = max(1, int(rng.expovariate(1.0 / size))) if size > 0 else 0
+    words = []
+    length = 0
+    while length < target:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    text = ' '.join(words)
+    if target > 200 and rng.random() < 0.2:
+        text += '\n\n```python\nprint(%r)\n```\n' % rng.choice(_WORDS)
+    return text
+
+
+def _user_parts(rng, opts):
+    parts = []
+    if 'image' in opts.part_types and rng.random() < 0.1:
+        parts.append({
+            'content_type': 'image_asset_pointer',
+            'asset_pointer': 'file-service://file-' + _uuid(rng).replace('-', '')[:24],
+            'size_bytes': rng.randint(10_000, 4_000_000),
+            'width': rng.choice((512, 1024, 1536)),
+            'height': rng.choice((512, 768, 1024)),
+        })
+    if 'audio' in opts.part_types and rng.random() < 0.1:
+        return parts + [{'content_type': 'audio_transcription', 'text': _text(rng, opts.text_size // 4), 'direction': 'in'}]
+    if 'text' in opts.part_types or not parts:
+        parts.append(_text(rng, opts.text_size // 4))
+    return parts
+
+
+def _assistant_parts(rng, opts):
+    return [_text(rng, opts.text_size)]
+
+
+def _tool_parts(rng, opts):
+    """One large JSON document as a string part, like browsing / code-interpreter results."""
+    results = []
+    size = 0
+    target = max(1, int(rng.expovariate(1.0 / opts.tool_size)))
+    while size < target:
+        snippet = _text(rng, 400)
+        results.append({'title': rng.choice(_WORDS).title(), 'url': f'https://example.com/{_uuid(rng)}', 'snippet': snippet})
+        size += len(snippet) + 80
+    return [json.dumps({'query': _text(rng, 40), 'results': results})]
+
+
+def _message(rng, opts, role, clock, parts, model):
+    metadata = {'timestamp_': 'absolute', 'message_type': None}
+    if role == 'assistant':
+        metadata.update({
+            'model_slug': model,
+            'finish_details': {'type': 'stop', 'stop_tokens': [100260]},
+            'is_complete': True,
+            'request_id': _uuid(rng),
+            'citations': [],
+            'content_references': [],
+        })
+    return {
+        'id': None,
+        'author': {'role': role, 'name': 'browser' if role == 'tool' else None, 'metadata': {}},
+        'create_time': clock,
+        'update_time': clock if role != 'system' else None,
+        'content': {'content_type': 'text', 'parts': parts},
+        'status': 'finished_successfully',
+        'end_turn': True if role == 'assistant' else None,
+        'weight': 0.0 if role == 'system' else 1.0,
+        'metadata': metadata,
+        'recipient': 'all',
+    }
+
+
+def _next_role(role, opts, rng):
+    if role == 'user':
+        if 'tool' in opts.part_types and rng.random() < 0.15:
+            return 'tool'
+        return 'assistant'
+    if role == 'tool':
+        return 'assistant'
+    return 'user'
+
+
+def generate_conversation(rng, index, opts):
+    """Build one export conversation dict (index only feeds the title)."""
+    mapping = {}
+    clock = BASE_TIME + rng.uniform(0, 3 * 365 * 86400)
+    create_time = clock
+    model = rng.choice(MODELS)
+
+    def add(parent_id, message):
+        node_id = _uuid(rng)
+        if message is not None:
+            message['id'] = node_id
+        mapping[node_id] = {'id': node_id, 'message': message, 'parent': parent_id, 'children': []}
+        if parent_id is not None:
+            mapping[parent_id]['children'].append(node_id)
+        return node_id
+
+    def parts_for(role):
+        if role == 'user':
+            return _user_parts(rng, opts)
+        if role == 'tool':
+            return _tool_parts(rng, opts)
+        return _assistant_parts(rng, opts)
+
+    root = add(None, None)
+    node = add(root, _message(rng, opts, 'system', None, [''], model))
+    role = 'system'
+    depth = max(1, rng.randint(max(1, opts.depth // 2), opts.depth)) if opts.depth > 1 else 1
+    current = node
+    for _ in range(depth):
+        role = _next_role(role, opts, rng)
+        clock += rng.uniform(5, 600)
+        parent = current
+        current = add(parent, _message(rng, opts, role, clock, parts_for(role), model))
+        if opts.branching > 1 and rng.random() < opts.branch_prob:
+            # Regenerations / edits: sibling branches of a few messages hanging off the same parent.
+            for _ in range(opts.branching - 1):
+                alt, alt_role = parent, role
+                for _ in range(rng.randint(1, 3)):
+                    alt = add(alt, _message(rng, opts, alt_role, clock + rng.uniform(1, 60), parts_for(alt_role), model))
+                    alt_role = _next_role(alt_role, opts, rng)
+    conversation_id = _uuid(rng)
+    return {
+        'title': f'{_text(rng, 30)[:60].capitalize() or "Conversation"} #{index}',
+        'create_time': create_time,
+        'update_time': clock,
+        'mapping': mapping,
+        'moderation_results': [],
+        'current_node': current,
+        'plugin_ids': None,
+        'conversation_id': conversation_id,
+        'conversation_template_id': None,
+        'gizmo_id': None,
+        'is_archived': False,
+        'safe_urls': [],
+        'default_model_slug': model,
+        'id': conversation_id,
+    }
+
+
+def generate_export(opts):
+    """Yield opts.conversations conversation dicts, deterministic for opts.seed."""
+    rng = random.Random(opts.seed)
+    for i in range(opts.conversations):
+        yield generate_conversation(rng, i, opts)
+
+
+def _zip_entry(name):
+    """Archive member with a fixed timestamp, so the same seed and options give a byte-identical zip."""
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16  # rw-r--r-- when extracted
+    return info
+
+
+def write_export(path, opts):
+    """Write the export as a JSON array to path; a .zip path gets an export archive with conversations.json."""
+    def dump(f):
+        f.write('[')
+        for i, conversation in enumerate(generate_export(opts)):
+            if i:
+                f.write(',\n')
+            f.write(json.dumps(conversation, ensure_ascii=False))
+        f.write(']\n')
+
+    if str(path).endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            with io.TextIOWrapper(zf.open(_zip_entry('conversations.json'), 'w'), encoding='utf-8') as f:
+                dump(f)
+            zf.writestr(_zip_entry('user.json'), json.dumps({'id': 'user-synthetic', 'email': 'synthetic@example.com'}))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            dump(f)
+
+
+def _part_types(value):
+    types = tuple(t.strip() for t in value.split(',') if t.strip())
+    unknown = set(types) - set(PART_TYPES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown part type(s): {', '.join(sorted(unknown))} (choose from {', '.join(PART_TYPES)})")
+    return types
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Write a synthetic ChatGPT export for scale testing")
+    parser.add_argument("output", help="Output path: conversations.json, or a .zip to write an export archive")
+    parser.add_argument("--conversations", type=int, default=1000, metavar="N", help="Number of conversations (default: 1000)")
+    parser.add_argument("--depth", type=int, default=20, metavar="N",
+                        help="Maximum messages on the main thread; each conversation picks between N/2 and N (default: 20)")
+    parser.add_argument("--branching", type=int, default=2, metavar="N",
+                        help="Children at a branch point, i.e. regenerations/edits per branching message (default: 2)")
+    parser.add_argument("--branch-prob", type=float, default=0.1, metavar="P",
+                        help="Probability that a message on the main thread branches (default: 0.1)")
+    parser.add_argument("--part-types", type=_part_types, default=PART_TYPES, metavar="LIST",
+                        help="Comma-separated content to include: text,image,audio,tool (default: all)")
+    parser.add_argument("--text-size", type=int, default=800, metavar="CHARS",
+                        help="Mean characters per assistant text part; user parts are a quarter of that (default: 800)")
+    parser.add_argument("--tool-size", type=int, default=20000, metavar="CHARS",
+                        help="Mean characters per tool JSON output (default: 20000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed and options give the same file (default: 0)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    opts = parser.parse_args(argv)
+    if opts.conversations < 0 or opts.depth < 1 or opts.branching < 1:
+        parser.error("--conversations must be >= 0, --depth and --branching must be >= 1")
+    if not 0.0 <= opts.branch_prob <= 1.0:
+        parser.error("--branch-prob must be between 0 and 1")
+    write_export(opts.output, opts)
+    size = os.path.getsize(opts.output)
+    print(f"Wrote {opts.conversations} conversations to {opts.output} ({size / 1e6:.1f} MB)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Full-text search over message content, and substring / similar-title search over conversation titles.
+
+The importer writes the plain text of each message (string parts, and the text of structured parts such
+as audio transcriptions) to message_text. Triggers keep the FTS5 index message_fts in step with it, and
+db.delete_conversation removes a conversation's rows. search_messages ranks conversations by their best
+matching message (bm25) and returns a highlighted snippet of that message.
+
+Titles are indexed by the trigram FTS5 table title_fts, kept in step with conversations by triggers.
+title_query matches any substring of three or more characters through it; similar_titles finds titles
+sharing most of the query's trigrams, for typos.
+"""
+
+import json
+
+import storage
+
+SNIPPET_START = '\x02'  # highlight markers; control characters never occur in the indexed text
+SNIPPET_END = '\x03'
+SNIPPET_TOKENS = 16
+MAX_INDEXED_LENGTH = 8192  # characters per message; long tool output would otherwise double the database
+
+TITLE_MIN_LENGTH = 3  # trigram index: shorter queries cannot use it
+SIMILAR_CANDIDATES = 200
+SIMILAR_MIN_SCORE = 0.5
+
+_TEXT_SQL = 'INSERT OR IGNORE INTO message_text (message_id, conversation_id, body) VALUES (?, ?, ?)'
+
+
+def message_text(parts):
+    """Searchable text of a message's content parts: string parts and the 'text' of dict parts, one per line.
+
+    Cut to MAX_INDEXED_LENGTH characters, so only the start of very long messages is searchable.
+    """
+    if not isinstance(parts, list):
+        return ''
+    texts = []
+    for part in parts:
+        if isinstance(part, dict):
+            part = part.get('text')
+        if isinstance(part, str) and part.strip():
+            texts.append(part.strip())
+    return '\n'.join(texts)[:MAX_INDEXED_LENGTH]
+
+
+def fts_query(q):
+    """FTS5 MATCH expression for user input: every word must occur (each quoted, so no query syntax leaks through)."""
+    words = [word.replace('"', '""') for word in q.split()]
+    return ' '.join(f'"{word}"' for word in words if word.strip('"'))
+
+
+def title_query(q):
+    """title_fts MATCH expression for a case-insensitive substring q, or None if q is too short to use the index."""
+    if len(q) < TITLE_MIN_LENGTH:
+        return None
+    return '"' + q.replace('"', '""') + '"'
+
+
+def _trigrams(text):
+    text = ' '.join(text.lower().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similar_titles(conn, q):
+    """Ids of conversations whose title shares at least SIMILAR_MIN_SCORE of q's trigrams, best first.
+
+    For typos: the index returns the SIMILAR_CANDIDATES titles with the best bm25 rank for any of q's
+    trigrams, and each is scored by the fraction of q's trigrams it contains.
+    """
+    grams = _trigrams(q)
+    if not grams:
+        return []
+    match = ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in sorted(grams))
+    candidates = conn.execute(
+        'SELECT c.id, c.title FROM title_fts f JOIN conversations c ON c.rowid = f.rowid '
+        'WHERE title_fts MATCH ? ORDER BY f.rank LIMIT ?',
+        (match, SIMILAR_CANDIDATES),
+    ).fetchall()
+    scored = []
+    for conversation_id, title in candidates:
+        score = len(grams & _trigrams(title or '')) / len(grams)
+        if score >= SIMILAR_MIN_SCORE:
+            scored.append((-score, conversation_id))
+    return [conversation_id for _, conversation_id in sorted(scored)]
+
+
+def search_messages(conn, q, limit=20, offset=0):
+    """Conversations whose messages match q, best bm25 match first. Returns (total, results).
+
+    Each result has the conversation's id, title and update_time, 'hits' (matching messages), and the
+    best match's 'message_id', 'snippet' (text with SNIPPET_START / SNIPPET_END around matched terms),
+    'in_thread' and 'position' (see message_locations). The total comes from the same grouped pass as
+    the page; snippets and locations are only looked up for the page.
+    """
+    match = fts_query(q)
+    if not match:
+        return 0, []
+    rows = conn.execute('''
+        SELECT b.conversation_id, b.text_id, b.message_id, b.hits, c.title, c.update_time,
+               COUNT(*) OVER () AS total
+        FROM (
+            SELECT t.conversation_id, t.id AS text_id, t.message_id, MIN(f.rank) AS rank, COUNT(*) AS hits
+            FROM message_fts f
+            JOIN message_text t ON t.id = f.rowid
+            WHERE message_fts MATCH ?
+            GROUP BY t.conversation_id
+        ) b
+        JOIN conversations c ON c.id = b.conversation_id
+        ORDER BY b.rank, b.conversation_id
+        LIMIT ? OFFSET ?
+    ''', (match, limit, offset)).fetchall()
+    if not rows:
+        total = 0 if offset == 0 else search_messages(conn, q, 1, 0)[0]
+        return total, []
+    text_ids = [row[1] for row in rows]
+    placeholders = ','.join('?' * len(text_ids))
+    snippets = dict(conn.execute(
+        f'SELECT rowid, snippet(message_fts, 0, ?, ?, \'…\', ?) FROM message_fts '
+        f'WHERE message_fts MATCH ? AND rowid IN ({placeholders})',
+        (SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS, match, *text_ids),
+    ).fetchall())
+    locations = message_locations(conn, [row[2] for row in rows])
+    results = [{
+        'conversation_id': conversation_id,
+        'message_id': message_id,
+        'hits': hits,
+        'title': title,
+        'update_time': update_time,
+        'snippet': snippets.get(text_id, ''),
+        'in_thread': locations.get(message_id, (False, 0))[0],
+        'position': locations.get(message_id, (False, 0))[1],
+    } for conversation_id, text_id, message_id, hits, title, update_time, _ in rows]
+    return rows[0][6], results
+
+
+def message_locations(conn, message_ids):
+    """message id -> (in_thread, position), for linking to where each message is shown.
+
+    in_thread: the message is on its conversation's stored canonical thread and not a system message,
+    so the nice view shows it. position: its 0-based index in the full view's order (create_time, then
+    rowid), from which the caller derives the full view page.
+    """
+    if not message_ids:
+        return {}
+    placeholders = ','.join('?' * len(message_ids))
+    rows = conn.execute(f'''
+        SELECT m.id,
+               COALESCE(m.role, '') != 'system' AND EXISTS (
+                   SELECT 1 FROM canonical_thread t WHERE t.conversation_id = m.conversation_id AND t.message_id = m.id
+               ),
+               (SELECT COUNT(*) FROM messages o
+                WHERE o.conversation_id = m.conversation_id
+                  AND (o.create_time < m.create_time
+                       OR (o.create_time IS NULL AND m.create_time IS NOT NULL)
+                       OR (o.create_time IS m.create_time AND o.rowid < m.rowid)))
+        FROM messages m
+        WHERE m.id IN ({placeholders})
+    ''', list(message_ids)).fetchall()
+    return {message_id: (bool(in_thread), position) for message_id, in_thread, position in rows}
+
+
+def index_existing(conn, batch_size=1000, progress=None, commit=True):
+    """Fill message_text (and so message_fts) from stored messages that have no row yet. Returns the number added.
+
+    Works in messages rowid batches, resolving blob references; commits after each unless commit=False.
+    """
+    added = 0
+    last = 0
+    while True:
+        rows = conn.execute('''
+            SELECT m.rowid, m.id, m.conversation_id, m.content FROM messages m
+            WHERE m.rowid > ? AND NOT EXISTS (SELECT 1 FROM message_text t WHERE t.message_id = m.id)
+            ORDER BY m.rowid LIMIT ?
+        ''', (last, batch_size)).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        resolved = storage.resolve_rows(
+            conn, [{'id': r[1], 'conversation_id': r[2], 'content': r[3]} for r in rows], storage.MESSAGE_COLUMNS,
+        )
+        texts = []
+        for row in resolved:
+            try:
+                body = message_text(json.loads(row['content'])) if row['content'] else ''
+            except (TypeError, ValueError):
+                body = ''
+            if body:
+                texts.append((row['id'], row['conversation_id'], body))
+        conn.executemany(_TEXT_SQL, texts)
+        if commit:
+            conn.commit()
+        added += len(texts)
+        if progress is not None:
+            progress(added)
+    return added
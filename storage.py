@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser - https://github.com/actuallyrizzn/chatGPT-browser
+# Copyright (C) 2024-2025. Licensed under the GNU AGPLv3. See LICENSE.
+"""Stored message values: content-addressed blobs for long message content and metadata JSON.
+
+messages.content and the JSON columns of message_metadata hold either inline text (short values, and
+databases imported before the blob store) or a blob reference: a BLOB of b'H' plus the first 16 bytes of
+the value's sha256, keyed into content_blobs. Identical values (system prompts, repeated tool output,
+re-imports) are stored once. Readers pass rows through resolve_rows before using these columns.
+
+With the compress_content setting on, blob data of COMPRESS_MIN_LENGTH characters or more is stored as
+b'Z' plus zlib-compressed UTF-8 instead of text; resolve_rows inflates it transparently.
+"""
+
+import hashlib
+import zlib
+
+DEDUP_MIN_LENGTH = 64  # shorter values (e.g. '[]', '{}') are smaller inline than as a 17-byte reference
+BLOB_REF = b'H'
+COMPRESS_MIN_LENGTH = 1024  # below this zlib saves little and costs a decompress per read
+COMPRESSED = b'Z'
+COMPRESS_LEVEL = 6
+
+MESSAGE_COLUMNS = ('content',)
+METADATA_COLUMNS = ('citations', 'content_references', 'finish_details', 'serialization_metadata')
+STORED_COLUMNS = MESSAGE_COLUMNS + METADATA_COLUMNS
+
+_BLOB_SQL = 'INSERT OR IGNORE INTO content_blobs (hash, data) VALUES (?, ?)'
+_LOOKUP_CHUNK = 500  # stays under SQLite's bound-parameter limit
+
+
+def blob_ref(text):
+    """Content-addressed reference for a text value."""
+    return BLOB_REF + hashlib.sha256(text.encode('utf-8', 'surrogatepass')).digest()[:16]
+
+
+def is_blob_ref(value):
+    return isinstance(value, bytes) and value[:1] == BLOB_REF
+
+
+def compress_text(text):
+    """Blob data for text: compressed when compression pays off, else the text unchanged."""
+    if len(text) < COMPRESS_MIN_LENGTH:
+        return text
+    packed = COMPRESSED + zlib.compress(text.encode('utf-8', 'surrogatepass'), COMPRESS_LEVEL)
+    return packed if len(packed) < len(text) else text
+
+
+def decode_blob(data):
+    """Text of stored blob data (inflating compressed data)."""
+    if isinstance(data, bytes) and data[:1] == COMPRESSED:
+        return zlib.decompress(data[1:]).decode('utf-8', 'surrogatepass')
+    return data
+
+
+def store_value(value, blobs, compress=False):
+    """Value to write in place of text: a blob reference (recorded in blobs) for long text, else the value itself."""
+    if isinstance(value, str) and len(value) >= DEDUP_MIN_LENGTH:
+        ref = blob_ref(value)
+        if ref not in blobs:
+            blobs[ref] = compress_text(value) if compress else value
+        return ref
+    return value
+
+
+def compression_enabled(conn):
+    """True if the compress_content setting is on for this database."""
+    row = conn.execute("SELECT value FROM settings WHERE key = 'compress_content'").fetchone()
+    return row is not None and row[0] == 'true'
+
+
+def write_blobs(conn, blobs):
+    """Insert (ref, text) pairs into content_blobs; refs already stored are left alone."""
+    conn.executemany(_BLOB_SQL, blobs)
+
+
+def resolve_rows(conn, rows, columns=STORED_COLUMNS):
+    """Return rows as dicts with blob references in columns replaced by their text (one lookup per 500 refs).
+
+    A reference whose blob is missing resolves to None, which readers already treat as empty content.
+    """
+    dicts = [dict(row) for row in rows]
+    refs = list({d[c] for d in dicts for c in columns if is_blob_ref(d.get(c))})
+    if not refs:
+        return dicts
+    found = {}
+    for i in range(0, len(refs), _LOOKUP_CHUNK):
+        chunk = refs[i:i + _LOOKUP_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        for ref, data in conn.execute(f'SELECT hash, data FROM content_blobs WHERE hash IN ({placeholders})', chunk):
+            found[ref] = decode_blob(data)
+    for d in dicts:
+        for c in columns:
+            if is_blob_ref(d.get(c)):
+                d[c] = found.get(d[c])
+    return dicts
+
+
+def dedup_existing(conn, batch_size=1000, progress=None, compress=False):
+    """Move long inline values of existing rows into content_blobs. Returns the number of values moved.
+
+    Works in rowid batches and commits after each, so it can be interrupted and rerun.
+    """
+    moved = 0
+    for table, columns in (('messages', MESSAGE_COLUMNS), ('message_metadata', METADATA_COLUMNS)):
+        for column in columns:
+            last = 0
+            while True:
+                rows = conn.execute(
+                    f'SELECT rowid, "{column}" FROM {table} WHERE rowid > ? AND typeof("{column}") = \'text\' '
+                    f'AND length("{column}") >= ? ORDER BY rowid LIMIT ?',
+                    (last, DEDUP_MIN_LENGTH, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                blobs = {}
+                updates = [(store_value(row[1], blobs, compress), row[0]) for row in rows]
+                write_blobs(conn, blobs.items())
+                conn.executemany(f'UPDATE {table} SET "{column}" = ? WHERE rowid = ?', updates)
+                conn.commit()
+                moved += len(updates)
+                last = rows[-1][0]
+                if progress is not None:
+                    progress(moved)
+    return moved
+
+
+def recode_blobs(conn, compress, batch_size=500, progress=None):
+    """Compress (or, with compress=False, inflate) existing blob data in place. Returns the number of blobs changed."""
+    if compress:
+        where = "typeof(data) = 'text' AND length(data) >= ?"
+        params = (COMPRESS_MIN_LENGTH,)
+    else:
+        where = "typeof(data) = 'blob'"
+        params = ()
+    changed = 0
+    last = 0
+    while True:
+        rows = conn.execute(
+            f'SELECT rowid, data FROM content_blobs WHERE rowid > ? AND {where} ORDER BY rowid LIMIT ?',
+            (last, *params, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for rowid, data in rows:
+            new = compress_text(data) if compress else decode_blob(data)
+            if new is not data:
+                updates.append((new, rowid))
+        conn.executemany('UPDATE content_blobs SET data = ? WHERE rowid = ?', updates)
+        conn.commit()
+        changed += len(updates)
+        last = rows[-1][0]
+        if progress is not None:
+            progress(changed)
+    return changed
+
+
+def prune_blobs(conn):
+    """Delete blobs no longer referenced by any message or metadata row (e.g. after deletes). Returns the count."""
+    referenced = ' UNION '.join(
+        [f'SELECT "{c}" FROM messages WHERE typeof("{c}") = \'blob\'' for c in MESSAGE_COLUMNS]
+        + [f'SELECT "{c}" FROM message_metadata WHERE typeof("{c}") = \'blob\'' for c in METADATA_COLUMNS]
+    )
+    cur = conn.execute(f'DELETE FROM content_blobs WHERE hash NOT IN ({referenced})')
+    conn.commit()
+    return cur.rowcount
@@ -4,11 +4,14 @@
 
 import io
 import json
+import re
 from unittest.mock import patch
 
 import pytest
 
+import aggregates
 import app as app_module
+import import_jobs
 
 
 @pytest.fixture
@@ -30,15 +33,41 @@ class TestIndexRoute:
         assert b"Test Conversation" in r.data or b"test-conversation" in r.data
 
     def test_index_pagination_params(self, seeded_db):
-        r = seeded_db.get("/?page=1&per_page=50")
+        r = seeded_db.get("/?per_page=50")
         assert r.status_code == 200
-        assert b"Page 1" in r.data and b"Test Conversation" in r.data
-
-    def test_index_page_2_empty_when_single_conversation(self, seeded_db):
-        r = seeded_db.get("/?page=2&per_page=1")
-        assert r.status_code == 200
-        # Page 2 with 1 item total: we clamp to page 1, so still see the conversation
-        assert b"Page" in r.data
+        assert b"1 conversation<" in r.data and b"Test Conversation" in r.data
+        assert b"Older conversations" not in r.data  # a single page has no paging links
+
+    def test_index_pages_by_cursor(self, client_with_db):
+        app_module.import_conversations_data([
+            {"id": f"c{i}", "title": f"Chat number {i}", "update_time": 1700000000.0 + i, "mapping": {}} for i in range(3)
+        ])
+        r = client_with_db.get("/?per_page=2")
+        assert b"Chat number 2" in r.data and b"Chat number 0" not in r.data
+        older = re.search(rb'href="(/\?after=[^"]+)"', r.data).group(1).replace(b"&amp;", b"&").decode()
+        r = client_with_db.get(older)
+        assert b"Chat number 0" in r.data and b"Chat number 1" not in r.data
+        assert b"3 conversations" in r.data
+        assert b"Chat number 2" in client_with_db.get("/?after=not-a-cursor&per_page=2").data
+
+    def test_index_reads_message_count_from_summary(self, seeded_db):
+        r = seeded_db.get("/")
+        assert b"2 messages" in r.data
+        conn = app_module.get_db()
+        conn.execute("UPDATE conversation_summary SET message_count = 41, models = '[\"gpt-test\"]'")
+        conn.commit()
+        conn.close()
+        assert b"41 messages" in seeded_db.get("/").data
+        nice = seeded_db.get("/conversation/test-conversation-123/nice").data
+        assert b"41 in this branch" in nice and b"gpt-test" in nice
+        # Without a stored summary the figures are aggregated on the fly.
+        conn = app_module.get_db()
+        conn.execute("DELETE FROM conversation_summary")
+        aggregates.bump_version(conn)  # an out-of-band write, so cached figures must be dropped by hand
+        conn.commit()
+        conn.close()
+        assert b"2 messages" in seeded_db.get("/").data
+        assert b"2 in this branch" in seeded_db.get("/conversation/test-conversation-123/nice").data
 
 
 class TestConversationRoutes:
@@ -286,7 +315,9 @@ class TestImportRoute:
             follow_redirects=False,
         )
         assert r.status_code in (302, 303)
-        assert "/" in r.location
+        assert "/" in r.location and "import_job=" in r.location
+        job_id = r.location.split("import_job=")[1]
+        assert import_jobs.wait_for_job(job_id, timeout=10)["state"] == "done"
         # Check DB
         conn = app_module.get_db()
         row = conn.execute(
@@ -296,8 +327,8 @@ class TestImportRoute:
         conn.close()
         assert row is not None
 
-    def test_import_generic_exception_400(self, client_with_db, sample_chatgpt_export):
-        """Import returns 400 when import_conversations_data raises (covers except Exception)."""
+    def test_import_generic_exception_reported_by_job(self, client_with_db, sample_chatgpt_export):
+        """A failing import surfaces as a failed job in the status endpoint."""
         import db as db_module
         with patch.object(
             db_module, "import_conversations_data", side_effect=RuntimeError("db error")
@@ -306,18 +337,48 @@ class TestImportRoute:
             r = client_with_db.post(
                 "/import",
                 data={"file": (io.BytesIO(payload), "conversations.json")},
+                headers={"Accept": "application/json"},
             )
-        assert r.status_code == 400
-        assert b"error" in r.data.lower()
-
-    def test_import_success_shows_flash(self, client_with_db, sample_chatgpt_export):
+            assert r.status_code == 202
+            job_id = r.get_json()["job_id"]
+            import_jobs.wait_for_job(job_id, timeout=10)
+        status = client_with_db.get(r.get_json()["status_url"]).get_json()
+        assert status["state"] == "failed"
+        assert "db error" in status["error"]
+
+    def test_import_export_zip(self, client_with_db, sample_chatgpt_export):
+        import zipfile
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("conversations.json", json.dumps(sample_chatgpt_export))
+        buf.seek(0)
+        r = client_with_db.post(
+            "/import",
+            data={"file": (buf, "export.zip")},
+            headers={"Accept": "application/json"},
+        )
+        assert r.status_code == 202
+        import_jobs.wait_for_job(r.get_json()["job_id"], timeout=10)
+        status = client_with_db.get(r.get_json()["status_url"]).get_json()
+        assert status["state"] == "done"
+        assert status["conversations"] == 1
+        assert status["fraction"] == 1.0
+        assert status["rows_per_sec"] is not None
+
+    def test_import_success_shows_flash_and_progress(self, client_with_db, sample_chatgpt_export):
         r = client_with_db.post(
             "/import",
             data={"file": (io.BytesIO(json.dumps(sample_chatgpt_export).encode()), "c.json")},
             follow_redirects=True,
         )
         assert r.status_code == 200
-        assert b"Imported" in r.data
+        assert b"Import started" in r.data
+        assert b"import-progress" in r.data
+        import_jobs.wait_for_job(r.request.args["import_job"], timeout=10)
+
+    def test_import_status_unknown_job_404(self, client_with_db):
+        r = client_with_db.get("/import/status/nope")
+        assert r.status_code == 404
 
 
 class TestDeleteConversation:
@@ -360,6 +421,17 @@ class TestPinConversation:
         assert r.status_code == 200
         assert b"ChatGPT" in r.data or b"conversation" in r.data.lower()
 
+    def test_pinned_conversation_is_listed_first_and_unpins(self, client_with_db):
+        app_module.import_conversations_data([
+            {"id": f"c{i}", "title": f"Chat {i}", "update_time": 1700000000.0 + i, "mapping": {}} for i in range(3)
+        ])
+        client_with_db.post("/conversation/c0/pin")
+        data = client_with_db.get("/api/conversations").get_json()
+        assert [(c["id"], c["pinned"]) for c in data["conversations"]] == [("c0", True), ("c2", False), ("c1", False)]
+        assert b"Unpin conversation: Chat 0" in client_with_db.get("/").data
+        client_with_db.post("/conversation/c0/pin")
+        assert [c["id"] for c in client_with_db.get("/api/conversations").get_json()["conversations"]] == ["c2", "c1", "c0"]
+
 
 class TestSearch:
     def test_index_search_filters_by_title(self, seeded_db):
@@ -370,6 +442,76 @@ class TestSearch:
         assert r2.status_code == 200
         assert b"No conversations" in r2.data or b"0 conversation" in r2.data
 
+    def test_index_search_uses_substrings_and_similar_titles(self, seeded_db):
+        r = seeded_db.get("/?q=onversat")
+        assert b"Test Conversation" in r.data and b"showing similar titles" not in r.data
+        r = seeded_db.get("/?q=Tset+Convresation")
+        assert b"Test Conversation" in r.data and b"showing similar titles" in r.data
+        assert b"Test Conversation" in seeded_db.get("/?q=Te").data
+        r = seeded_db.get("/?q=onversat&per_page=1")
+        assert b"1 conversation<" in r.data and b"Older conversations" not in r.data
+
+    def test_index_filters_by_facets_and_date(self, seeded_db):
+        r = seeded_db.get("/?role=assistant&content_type=text&from=2022-01-01&to=2022-01-01")
+        assert b"Test Conversation" in r.data
+        assert b'value="assistant" selected' in r.data
+        assert b"Test Conversation" not in seeded_db.get("/?content_type=image").data
+        assert b"Test Conversation" not in seeded_db.get("/?from=2022-01-02").data
+
+    def test_api_conversations_returns_filtered_list_and_facet_counts(self, seeded_db):
+        r = seeded_db.get("/api/conversations?role=user&q=Test")
+        assert r.status_code == 200
+        data = r.get_json()
+        assert data["total"] == 1 and data["conversations"][0]["id"] == "test-conversation-123"
+        assert data["conversations"][0]["message_count"] == 2
+        assert data["next_cursor"] is None and data["prev_cursor"] is None
+        assert {"value": "assistant", "count": 1} in data["facets"]["role"]
+        assert seeded_db.get("/api/conversations?model=missing").get_json()["conversations"] == []
+
+    def test_api_conversations_follows_cursors(self, client_with_db):
+        app_module.import_conversations_data([
+            {"id": f"c{i}", "title": f"Chat {i}", "update_time": 1700000000.0 + i, "mapping": {}} for i in range(5)
+        ])
+        first = client_with_db.get("/api/conversations?per_page=2").get_json()
+        assert [c["id"] for c in first["conversations"]] == ["c4", "c3"] and first["total"] == 5
+        second = client_with_db.get(f"/api/conversations?per_page=2&after={first['next_cursor']}").get_json()
+        assert [c["id"] for c in second["conversations"]] == ["c2", "c1"]
+        assert second["total"] == 5 and second["facets"]["role"] == []
+        back = client_with_db.get(f"/api/conversations?per_page=2&before={second['prev_cursor']}").get_json()
+        assert [c["id"] for c in back["conversations"]] == ["c4", "c3"] and back["prev_cursor"] is None
+
+    def test_message_search_shows_highlighted_snippet_and_anchor(self, seeded_db):
+        r = seeded_db.get("/search?q=thank")
+        assert r.status_code == 200
+        assert b"1 conversation matching" in r.data
+        assert b"<mark>thank</mark> you for asking" in r.data
+        assert b"/conversation/test-conversation-123/nice#msg-test-message-124" in r.data
+        nice = seeded_db.get("/conversation/test-conversation-123/nice").data
+        assert b'id="msg-test-message-124"' in nice
+        assert b"No messages match" in seeded_db.get("/search?q=%22%3Cscript%3E").data
+
+    def test_message_search_links_off_thread_hit_to_its_full_view_page(self, client_with_db):
+        mapping = {}
+        for i in range(60):
+            mapping[f"m{i}"] = {"message": {"id": f"m{i}", "author": {"role": "user" if i % 2 == 0 else "assistant"},
+                                            "create_time": 1700000000.0 + i, "content": {"parts": [f"turn {i}"]}},
+                                "parent": f"m{i - 1}" if i else None, "children": [f"m{i + 1}"] if i < 59 else []}
+        mapping["m58"]["message"]["content"]["parts"] = ["canonical needle"]
+        # A regeneration off m10, written after m55: 57th in time order (page 2), not on the canonical thread.
+        mapping["branch"] = {"message": {"id": "branch", "author": {"role": "assistant"}, "create_time": 1700000055.5,
+                                         "content": {"parts": ["branch needle"]}},
+                             "parent": "m10", "children": []}
+        mapping["m10"]["children"].append("branch")
+        app_module.import_conversations_data([{"id": "long", "title": "Long", "update_time": 1700000100.0, "mapping": mapping}])
+
+        r = client_with_db.get("/search?q=needle+branch")
+        link = re.search(rb'href="(/conversation/long/full\?page=2#msg-branch)"', r.data)
+        assert link is not None
+        page = client_with_db.get(link.group(1).decode().split("#")[0], follow_redirects=True)
+        assert b'id="msg-branch"' in page.data
+        r = client_with_db.get("/search?q=needle+canonical")
+        assert b"/conversation/long/nice#msg-m58" in r.data
+
 
 class TestExportConversation:
     def test_export_json_404_when_not_found(self, client_with_db):
@@ -385,6 +527,21 @@ class TestExportConversation:
         assert "title" in data and "mapping" in data
         assert isinstance(data["mapping"], dict)
 
+    def test_export_json_resolves_deduplicated_content(self, client_with_db, sample_chatgpt_export):
+        long_text = "Deduplicated content that is long enough to live in the content blob store. " * 3
+        mapping = sample_chatgpt_export[0]["mapping"]
+        mapping["test-message-123"]["message"]["content"]["parts"] = [long_text]
+        mapping["test-message-124"]["message"]["metadata"] = {
+            "message_type": "next", "citations": [{"url": "https://example.com/" + "x" * 80}],
+        }
+        app_module.import_conversations_data(sample_chatgpt_export)
+        data = json.loads(client_with_db.get("/conversation/test-conversation-123/export/json").data)
+        assert data["mapping"]["test-message-123"]["message"]["content"]["parts"] == [long_text]
+        meta = data["mapping"]["test-message-124"]["message"]["metadata"]
+        assert meta["citations"] == [{"url": "https://example.com/" + "x" * 80}]
+        r = client_with_db.get("/conversation/test-conversation-123/nice")
+        assert long_text.strip().encode() in r.data
+
     def test_export_markdown_404_when_not_found(self, client_with_db):
         r = client_with_db.get("/conversation/nonexistent-id/export/markdown")
         assert r.status_code == 404
@@ -395,3 +552,101 @@ class TestExportConversation:
         assert "attachment" in (r.headers.get("Content-Disposition") or "")
         assert b"Test Conversation" in r.data or b"#" in r.data
         assert b"User" in r.data or b"Assistant" in r.data
+
+    def test_export_canonical_db_contains_threads(self, seeded_db, tmp_path):
+        # A conversation written outside the importer has no stored thread and takes the walk fallback.
+        conn = app_module.get_db()
+        conn.execute("INSERT INTO conversations (id, title, create_time, update_time) VALUES ('raw', 'Raw', '1.0', '2.0')")
+        conn.execute("INSERT INTO messages (id, conversation_id, role, content, create_time, parent_id) VALUES ('r1', 'raw', 'user', '[\"q\"]', '1.0', NULL)")
+        conn.execute("INSERT INTO messages (id, conversation_id, role, content, create_time, parent_id) VALUES ('r2', 'raw', 'assistant', '[\"a\"]', '2.0', 'r1')")
+        conn.commit()
+        conn.close()
+        r = seeded_db.get("/export/canonical-db")
+        assert r.status_code == 200
+        out = tmp_path / "canonical.db"
+        out.write_bytes(r.data)
+        import sqlite3
+        export = sqlite3.connect(out)
+        rows = export.execute("SELECT conversation_id, id, position FROM messages ORDER BY conversation_id, position").fetchall()
+        conversations = export.execute("SELECT id FROM conversations ORDER BY id").fetchall()
+        export.close()
+        assert conversations == [("raw",), ("test-conversation-123",)]
+        assert rows == [
+            ("raw", "r1", 1), ("raw", "r2", 2),
+            ("test-conversation-123", "test-message-123", 1), ("test-conversation-123", "test-message-124", 2),
+        ]
+
+
+class TestConversationApi:
+    def test_detail_returns_summary_and_mapping(self, seeded_db):
+        r = seeded_db.get("/api/conversations/test-conversation-123")
+        assert r.status_code == 200
+        data = r.get_json()
+        assert data["title"] == "Test Conversation" and data["message_count"] == 2 and data["pinned"] is False
+        assert set(data["mapping"]) == {"test-message-123", "test-message-124"}
+        assert seeded_db.get("/api/conversations/missing").status_code == 404
+
+    def test_canonical_thread_is_root_first(self, seeded_db):
+        data = seeded_db.get("/api/conversations/test-conversation-123/canonical").get_json()
+        assert [m["id"] for m in data["messages"]] == ["test-message-123", "test-message-124"]
+        assert data["messages"][1]["parts"][0]["text"] == "I'm doing well, thank you for asking!"
+
+    def test_if_none_match_returns_304_until_data_changes(self, seeded_db):
+        for url in ("/api/conversations", "/api/conversations/test-conversation-123",
+                    "/api/conversations/test-conversation-123/canonical"):
+            r = seeded_db.get(url)
+            etag = r.headers["ETag"]
+            assert etag.startswith('"') and r.headers["Cache-Control"] == "no-cache"
+            again = seeded_db.get(url, headers={"If-None-Match": etag})
+            assert again.status_code == 304 and again.data == b"" and again.headers["ETag"] == etag
+        url = "/api/conversations/test-conversation-123"
+        etag = seeded_db.get(url).headers["ETag"]
+        with patch("routes.api._build_export_mapping", side_effect=AssertionError("messages read")):
+            assert seeded_db.get(url, headers={"If-None-Match": etag}).status_code == 304
+        list_etag = seeded_db.get("/api/conversations").headers["ETag"]
+        canonical_etag = seeded_db.get(url + "/canonical").headers["ETag"]
+        seeded_db.post("/conversation/test-conversation-123/pin")
+        r = seeded_db.get(url, headers={"If-None-Match": etag})
+        assert r.status_code == 200 and r.get_json()["pinned"] is True
+        assert seeded_db.get("/api/conversations", headers={"If-None-Match": list_etag}).status_code == 200
+        # The canonical thread shows no pin state, so its ETag survives the toggle.
+        assert seeded_db.get(url + "/canonical", headers={"If-None-Match": canonical_etag}).status_code == 304
+
+
+class TestConversationPageCaching:
+    URL = "/conversation/test-conversation-123/nice"
+
+    def test_nice_page_sends_validators_and_304_skips_messages(self, seeded_db):
+        r = seeded_db.get(self.URL)
+        assert r.status_code == 200
+        etag = r.headers["ETag"]
+        assert r.headers["Last-Modified"] and r.headers["Cache-Control"] == "private, no-cache"
+        with patch("routes.main.storage.resolve_rows", side_effect=AssertionError("messages read")), \
+                patch("routes.main._walk_canonical_path", side_effect=AssertionError("messages read")):
+            again = seeded_db.get(self.URL, headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.data == b"" and again.headers["ETag"] == etag
+
+    def test_settings_change_invalidates_etag(self, seeded_db):
+        etag = seeded_db.get(self.URL).headers["ETag"]
+        seeded_db.post("/toggle_dark_mode")
+        r = seeded_db.get(self.URL, headers={"If-None-Match": etag})
+        assert r.status_code == 200 and r.headers["ETag"] != etag
+        etag = r.headers["ETag"]
+        seeded_db.post("/update_names", data={"user_name": "Me", "assistant_name": "Bot"})
+        r = seeded_db.get(self.URL, headers={"If-None-Match": etag})
+        assert r.status_code == 200 and b"Bot" in r.data
+
+    def test_pin_toggle_keeps_page_etag(self, seeded_db):
+        etag = seeded_db.get(self.URL).headers["ETag"]
+        seeded_db.post("/conversation/test-conversation-123/pin")
+        assert seeded_db.get(self.URL, headers={"If-None-Match": etag}).status_code == 304
+
+    def test_dev_view_etag_depends_on_page(self, seeded_db):
+        app_module.set_setting("dev_mode", "true")
+        try:
+            url = "/conversation/test-conversation-123"
+            etag = seeded_db.get(url).headers["ETag"]
+            assert seeded_db.get(url, headers={"If-None-Match": etag}).status_code == 304
+            assert seeded_db.get(url + "?page=2", headers={"If-None-Match": etag}).status_code == 200
+        finally:
+            app_module.set_setting("dev_mode", "false")
@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for aggregates: figures cached per database until an import or delete advances the data version."""
+
+import threading
+
+import aggregates
+import app as app_module
+import db as db_module
+
+
+def _conversation(cid):
+    return {"id": cid, "title": f"Title {cid}", "update_time": 1700000000.0, "mapping": {}}
+
+
+def _count(conn):
+    return conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+def test_figures_are_cached_until_import_or_delete(client_with_db):
+    app_module.import_conversations_data([_conversation("c1")])
+    conn = app_module.get_db()
+    version = aggregates.data_version(conn)
+    assert version > 0
+    assert aggregates.get(conn, ("count",), _count) == 1
+    conn.execute("INSERT INTO conversations (id, title) VALUES ('side', 'Written behind the cache')")
+    conn.commit()
+    assert aggregates.get(conn, ("count",), _count) == 1
+
+    app_module.import_conversations_data([_conversation("c2")])
+    assert aggregates.data_version(conn) == version + 1
+    assert aggregates.get(conn, ("count",), _count) == 3
+    db_module.delete_conversation(conn, "side")
+    conn.commit()
+    assert aggregates.get(conn, ("count",), _count) == 2
+    conn.close()
+
+
+def test_unchanged_delta_import_keeps_the_version(client_with_db):
+    app_module.import_conversations_data([_conversation("c1")], delta=True)
+    conn = app_module.get_db()
+    version = aggregates.data_version(conn)
+    app_module.import_conversations_data([_conversation("c1")], delta=True)
+    assert aggregates.data_version(conn) == version
+    conn.close()
+
+
+def test_threads_share_one_computation(client_with_db):
+    conn = app_module.get_db()
+    aggregates.get(conn, ("count",), _count)
+    calls = []
+    results = []
+
+    def read():
+        thread_conn = app_module.get_db()
+        results.append(aggregates.get(thread_conn, ("count",), lambda c: calls.append(1) or _count(c)))
+        thread_conn.close()
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [0, 0, 0, 0] and calls == []
+    conn.close()
+
+
+def test_pin_toggle_keeps_cached_figures(client_with_db):
+    app_module.import_conversations_data([_conversation("c1")])
+    conn = app_module.get_db()
+    version = aggregates.data_version(conn)
+    assert aggregates.get(conn, ("count",), _count) == 1
+    client_with_db.post("/conversation/c1/pin")
+    assert aggregates.data_version(conn) == version
+    assert aggregates.pins_version(conn) == 1
+    assert aggregates.get(conn, ("count",), lambda c: 0) == 1
+    conn.close()
@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for scripts/bench_ingest.py result handling."""
+
+import importlib.util
+import json
+import os
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "bench_ingest.py")
+_spec = importlib.util.spec_from_file_location("bench_ingest", _SCRIPT)
+bench_ingest = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_ingest)
+
+
+def _results(mode, rates, seconds=10.0):
+    return {"config": {"mode": mode},
+            "results": [{"size": s, "conversations_per_sec": r, "seconds": seconds} for s, r in rates.items()]}
+
+
+def test_compare_flags_only_drops_beyond_tolerance(capsys):
+    baseline = _results("bulk", {100: 1000.0, 1000: 1000.0})
+    current = _results("bulk", {100: 900.0, 1000: 800.0, 5000: 700.0})
+    assert bench_ingest.compare(current, baseline, 0.15) == [1000]
+    out = capsys.readouterr().out
+    assert "REGRESSION" in out and "no baseline" in out
+
+
+def test_compare_skips_runs_under_min_seconds(capsys):
+    baseline = _results("bulk", {50: 1000.0}, seconds=0.05)
+    current = _results("bulk", {50: 600.0}, seconds=0.08)
+    assert bench_ingest.compare(current, baseline, 0.15, min_seconds=1.0) == []
+    assert "not compared" in capsys.readouterr().out
+
+
+def test_median_run_keeps_the_middle_run():
+    runs = [{"seconds": 3.0, "phases": {"a": 3}}, {"seconds": 1.0, "phases": {"a": 1}}, {"seconds": 2.0, "phases": {"a": 2}}]
+    result = bench_ingest.median_run(runs)
+    assert result["seconds"] == 2.0 and result["phases"] == {"a": 2}
+    assert result["runs_seconds"] == [3.0, 1.0, 2.0]
+
+
+def test_run_once_reports_throughput_and_phases(tmp_path, sample_chatgpt_export, monkeypatch):
+    import db as db_module
+
+    export = tmp_path / "conversations.json"
+    export.write_text(json.dumps(sample_chatgpt_export), encoding="utf-8")
+    monkeypatch.setattr(db_module, "DATABASE_PATH", db_module.DATABASE_PATH)
+    monkeypatch.setenv("DATABASE_PATH", str(tmp_path / "bench.db"))
+    result = bench_ingest.run_once(str(export), str(tmp_path / "bench.db"), "bulk", 1)
+    assert result["conversations"] == 1 and result["messages"] == 2 and result["links"] == 1
+    assert {"parse", "messages", "children", "derived", "commit"} <= set(result["phases"])
+    assert result["db_size_mb"] > 0
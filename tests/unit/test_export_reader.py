@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for export_reader streaming conversation parser."""
+
+import io
+import json
+import zipfile
+
+import pytest
+
+from export_reader import ConversationStream, iter_conversations, open_conversation_stream
+
+
+def _stream(text, chunk_size=7):
+    return list(ConversationStream(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_streams_array_elements_across_small_chunks(sample_chatgpt_export):
+    data = sample_chatgpt_export + [{"id": "second", "title": "Ünïcode ☃", "mapping": {}}]
+    assert _stream(json.dumps(data, indent=2)) == data
+
+
+def test_element_larger_than_chunk_is_decoded_whole():
+    big = {"id": "big", "mapping": {"m": {"message": {"content": {"parts": ["x" * 10000]}}}}}
+    assert _stream(json.dumps([big, {"id": "n"}]), chunk_size=16) == [big, {"id": "n"}]
+
+
+def test_single_object_is_one_conversation():
+    assert _stream('  {"id": "only", "title": "One"}\n') == [{"id": "only", "title": "One"}]
+
+
+def test_empty_array_and_empty_input():
+    assert _stream("[ ]") == []
+    assert _stream("") == []
+
+
+def test_number_split_at_chunk_edge_is_not_truncated():
+    assert _stream("[12345678, 1]", chunk_size=3) == [12345678, 1]
+
+
+@pytest.mark.parametrize("text", ["[{\"id\": 1} {\"id\": 2}]", "[{\"id\": 1},", "nope", "[1] extra"])
+def test_malformed_input_raises(text):
+    with pytest.raises(json.JSONDecodeError):
+        _stream(text)
+
+
+def test_iter_conversations_reads_path(tmp_path, sample_chatgpt_export):
+    path = tmp_path / "conversations.json"
+    path.write_text(json.dumps(sample_chatgpt_export), encoding="utf-8")
+    assert list(iter_conversations(str(path))) == sample_chatgpt_export
+
+
+def _zip_bytes(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, text in members.items():
+            zf.writestr(name, text)
+    return buf.getvalue()
+
+
+def test_iter_conversations_reads_zip_path(tmp_path, sample_chatgpt_export):
+    path = tmp_path / "export.zip"
+    path.write_bytes(_zip_bytes({"chat.html": "<html/>", "conversations.json": json.dumps(sample_chatgpt_export)}))
+    assert list(iter_conversations(str(path))) == sample_chatgpt_export
+
+
+def test_iter_conversations_reads_nested_zip_member_from_file_object(sample_chatgpt_export):
+    fp = io.BytesIO(_zip_bytes({"export/conversations.json": json.dumps(sample_chatgpt_export)}))
+    assert list(iter_conversations(fp)) == sample_chatgpt_export
+    assert not fp.closed
+
+
+def test_zip_without_conversations_json_raises(tmp_path):
+    path = tmp_path / "export.zip"
+    path.write_bytes(_zip_bytes({"user.json": "{}"}))
+    with pytest.raises(ValueError, match="conversations.json"):
+        list(iter_conversations(str(path)))
+
+
+@pytest.mark.parametrize("zipped", [False, True])
+def test_resume_offset_continues_after_yielded_conversation(tmp_path, zipped):
+    data = [{"id": f"c{i}", "title": "Ünïcode ☃ " * i} for i in range(6)]
+    text = json.dumps(data, indent=1, ensure_ascii=False).replace("\n", "\r\n")
+    if zipped:
+        path = tmp_path / "export.zip"
+        path.write_bytes(_zip_bytes({"conversations.json": text}))
+    else:
+        path = tmp_path / "conversations.json"
+        path.write_bytes(text.encode("utf-8"))
+    with open_conversation_stream(str(path)) as stream:
+        offsets = [stream.offset for _ in stream]
+    for i, offset in enumerate(offsets):
+        with open_conversation_stream(str(path), resume_offset=offset) as stream:
+            assert list(stream) == data[i + 1:]
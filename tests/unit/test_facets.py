@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for facets: content type classification, filter parsing and the facet table kept by import/delete."""
+
+import json
+
+from werkzeug.datastructures import MultiDict
+
+import app as app_module
+import db as db_module
+import facets
+
+
+def _conversation(cid, messages, update_time=1700000000.0):
+    """messages: (role, model_slug, content dict) tuples, chained in order."""
+    mapping = {}
+    for i, (role, model, content) in enumerate(messages):
+        mapping[f"{cid}-m{i}"] = {
+            "message": {"author": {"role": role}, "content": content, "create_time": float(i),
+                        "metadata": {"model_slug": model} if model else {}},
+            "parent": f"{cid}-m{i - 1}" if i else None,
+            "children": [f"{cid}-m{i + 1}"] if i + 1 < len(messages) else [],
+        }
+    return {"id": cid, "title": f"Title {cid}", "update_time": update_time, "mapping": mapping}
+
+
+def _values(conn, cid, facet):
+    return [r[0] for r in conn.execute(
+        "SELECT value FROM conversation_facets WHERE conversation_id = ? AND facet = ? ORDER BY value", (cid, facet),
+    ).fetchall()]
+
+
+def test_content_types_classify_parts_and_code():
+    assert facets.content_types({"parts": ["hi", {"content_type": "image_asset_pointer"}, {"content_type": "x"}, " "]}) == {"text", "image", "other"}
+    assert facets.content_types({"content_type": "code", "text": "print(1)"}) == {"code"}
+    assert facets.content_types({"parts": [{"content_type": "audio_transcription", "text": "hey"}]}) == {"audio"}
+    assert facets.content_types(None) == set()
+
+
+def test_parse_filters_reads_repeated_values_and_inclusive_dates():
+    filters = facets.parse_filters(MultiDict([("model", "gpt-4o"), ("model", "o1"), ("role", ""), ("from", "2023-11-14"), ("to", "bad")]))
+    assert filters["model"] == ["gpt-4o", "o1"] and filters["role"] == []
+    assert filters["from_ts"] == 1699920000.0 and filters["to"] is None and filters["to_ts"] is None
+    assert facets.query_args(filters) == {"model": ["gpt-4o", "o1"], "from": "2023-11-14"}
+    assert facets.parse_filters(MultiDict([("to", "2023-11-14")]))["to_ts"] == 1699920000.0 + 86400
+    assert not facets.is_filtered(facets.parse_filters(MultiDict()))
+
+
+def test_import_records_facets_and_counts_are_disjunctive(client_with_db):
+    app_module.import_conversations_data([
+        _conversation("c1", [("user", None, {"parts": ["draw a cat"]}),
+                             ("assistant", "gpt-4o", {"parts": [{"content_type": "image_asset_pointer"}]})]),
+        _conversation("c2", [("user", None, {"parts": ["run it"]}),
+                             ("assistant", "o1", {"content_type": "code", "text": "print(1)"})]),
+        _conversation("c3", [("user", None, {"parts": ["hello"]})], update_time=1600000000.0),
+    ], bulk=True)
+    conn = app_module.get_db()
+    assert _values(conn, "c1", "content_type") == ["image", "text"]
+    assert _values(conn, "c2", "model") == ["o1"] and "code" in _values(conn, "c2", "content_type")
+    assert _values(conn, "c3", "role") == ["user"]
+
+    filters = facets.parse_filters(MultiDict([("model", "gpt-4o")]))
+    counts = facets.facet_counts(conn, filters)
+    assert counts["model"] == [("gpt-4o", 1), ("o1", 1)]  # its own filter does not narrow it
+    assert dict(counts["content_type"]) == {"image": 1, "text": 1}
+    where, args = facets.filter_clause(facets.parse_filters(MultiDict([("content_type", "text"), ("from", "2023-01-01")])))
+    ids = [r[0] for r in conn.execute(f"SELECT c.id FROM conversations c WHERE {' AND '.join(where)} ORDER BY c.id", args)]
+    assert ids == ["c1", "c2"]
+
+    db_module.delete_conversation(conn, "c1")
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM conversation_facets WHERE conversation_id = 'c1'").fetchone()[0] == 0
+    conn.close()
+
+
+def test_index_existing_records_facets_from_stored_messages(client_with_db):
+    conn = app_module.get_db()
+    conn.execute("INSERT INTO conversations (id, title) VALUES ('old', 'Old')")
+    conn.execute("INSERT INTO messages (id, conversation_id, role, content) VALUES ('o1', 'old', 'assistant', ?)",
+                 (json.dumps(["words", {"content_type": "image_asset_pointer"}]),))
+    conn.execute("INSERT INTO messages (id, conversation_id, role, content) VALUES ('o2', 'old', 'user', 'not json')")
+    conn.execute("INSERT INTO message_metadata (message_id, model_slug) VALUES ('o1', 'gpt-4')")
+    conn.commit()
+    assert facets.index_existing(conn, batch_size=1) == 1
+    assert facets.index_existing(conn) == 0
+    assert _values(conn, "old", "role") == ["assistant", "user"]
+    assert _values(conn, "old", "model") == ["gpt-4"]
+    assert _values(conn, "old", "content_type") == ["image", "text"]
+    conn.close()
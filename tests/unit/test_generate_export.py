@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for scripts/generate_export.py synthetic export generator."""
+
+import importlib.util
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from export_reader import iter_conversations
+
+_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "generate_export.py")
+_spec = importlib.util.spec_from_file_location("generate_export", _SCRIPT)
+generate_export = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(generate_export)
+
+
+def _opts(*args):
+    return generate_export.build_parser().parse_args(["out.json", *args])
+
+
+def test_same_seed_gives_identical_output(tmp_path):
+    opts = _opts("--conversations", "5", "--seed", "7")
+    a, b = tmp_path / "a.json", tmp_path / "b.json"
+    generate_export.write_export(a, opts)
+    generate_export.write_export(b, opts)
+    assert a.read_bytes() == b.read_bytes()
+    generate_export.write_export(b, _opts("--conversations", "5", "--seed", "8"))
+    assert a.read_bytes() != b.read_bytes()
+
+
+def test_same_seed_gives_identical_zip(tmp_path):
+    opts = _opts("--conversations", "5", "--seed", "1")
+    a, b = tmp_path / "a.zip", tmp_path / "b.zip"
+    generate_export.write_export(a, opts)
+    with patch("zipfile.time.time", return_value=time.time() + 86400):
+        generate_export.write_export(b, opts)
+    assert a.read_bytes() == b.read_bytes()
+
+
+def test_mapping_is_a_consistent_tree():
+    opts = _opts("--conversations", "10", "--depth", "12", "--branching", "3", "--branch-prob", "0.5")
+    branched = 0
+    for conversation in generate_export.generate_export(opts):
+        mapping = conversation["mapping"]
+        roots = [n for n in mapping.values() if n["parent"] is None]
+        assert len(roots) == 1 and roots[0]["message"] is None
+        for node_id, node in mapping.items():
+            for child in node["children"]:
+                assert mapping[child]["parent"] == node_id
+        assert conversation["current_node"] in mapping
+        branched += any(len(n["children"]) > 1 for n in mapping.values())
+    assert branched
+
+
+def test_part_types_are_limited_to_requested_ones():
+    opts = _opts("--conversations", "20", "--part-types", "text")
+    roles = set()
+    for conversation in generate_export.generate_export(opts):
+        for node in conversation["mapping"].values():
+            if node["message"]:
+                roles.add(node["message"]["author"]["role"])
+                assert all(isinstance(p, str) for p in node["message"]["content"]["parts"])
+    assert "tool" not in roles
+
+
+def test_zip_output_is_readable_by_importer(tmp_path):
+    path = tmp_path / "export.zip"
+    opts = _opts("--conversations", "3", "--seed", "1")
+    generate_export.write_export(path, opts)
+    assert list(iter_conversations(str(path))) == list(generate_export.generate_export(opts))
+
+
+def test_unknown_part_type_is_rejected():
+    with pytest.raises(SystemExit):
+        _opts("--part-types", "text,video")
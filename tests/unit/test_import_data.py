@@ -2,9 +2,14 @@
 # ChatGPT Browser tests - See LICENSE (AGPL-3.0).
 """Unit tests for import_conversations_data and init_db."""
 
+import json
+import re
+from unittest.mock import patch
+
 import pytest
 
 import app as app_module
+import db as db_module
 
 # Batch size used in app.import_conversations_data for commit frequency
 IMPORT_BATCH_SIZE = getattr(app_module, "IMPORT_BATCH_SIZE", 50)
@@ -36,6 +41,15 @@ class TestImportConversationsData:
         conn.close()
         assert row is not None
 
+    def test_import_accepts_lazy_iterable(self, client_with_db, sample_chatgpt_export):
+        """Generators (e.g. export_reader streams) are consumed without needing len()."""
+        n = app_module.import_conversations_data(c for c in sample_chatgpt_export)
+        assert n == 1
+        conn = app_module.get_db()
+        count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        conn.close()
+        assert count == 2
+
     def test_import_skips_missing_id(self, client_with_db):
         data = [{"title": "No ID", "mapping": {}}]  # no 'id'
         app_module.import_conversations_data(data)
@@ -190,3 +204,419 @@ class TestInitDb:
         assert "dev_mode" in keys
         assert "dark_mode" in keys
         assert "verbose_mode" in keys
+
+
+def _tricky_export():
+    """Conversations exercising the importer's edge cases (shared ids, bad children, bad metadata)."""
+    def msg(role, text, **extra):
+        m = {"author": {"role": role}, "create_time": 1640995200.0, "content": {"parts": [text]}}
+        m.update(extra)
+        return m
+
+    return [
+        {
+            "id": "conv-a",
+            "title": "A",
+            "create_time": 1.0,
+            "update_time": 2.0,
+            "mapping": {
+                "root": {"message": None, "parent": None, "children": ["a1"]},
+                "a1": {"message": msg("user", "hi", metadata={"model_slug": "gpt-4"}), "parent": "root",
+                       "children": ["a2", "missing", "a2", "a3"]},
+                "a2": {"message": msg("assistant", "yo", metadata=["not", "a", "dict"]), "parent": "a1", "children": 7},
+                "a3": {"message": msg("assistant", "alt"), "parent": "a1", "children": []},
+                "shared": {"message": msg("user", "first"), "parent": None, "children": ["a3"]},
+            },
+        },
+        {
+            "id": "conv-b",
+            "title": "B",
+            "create_time": 3.0,
+            "update_time": 4.0,
+            "mapping": {
+                "shared": {"message": msg("user", "second"), "parent": None, "children": ["b1"]},
+                "b1": {"message": msg("assistant", "ok"), "parent": "shared", "children": []},
+                "broken": "not a dict",
+            },
+        },
+        {"id": "conv-c", "title": "C", "mapping": None},
+        {"title": "no id"},
+    ]
+
+
+def _dump_tables(conn):
+    tables = ("conversations", "messages", "message_metadata", "message_children", "canonical_thread", "conversation_facets")
+    dump = {t: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {t}").fetchall()) for t in tables}
+    # message_text ids depend on write order; compare contents only
+    dump["message_text"] = sorted(tuple(r) for r in conn.execute("SELECT message_id, conversation_id, body FROM message_text").fetchall())
+    return dump
+
+
+def _clear_tables(conn):
+    for t in ("conversation_facets", "message_text", "canonical_thread", "message_children", "message_metadata", "messages", "conversations"):
+        conn.execute(f"DELETE FROM {t}")
+    conn.commit()
+
+
+class TestBulkImport:
+    """import_conversations_data(bulk=True) must produce the same rows as the default path."""
+
+    def test_bulk_matches_row_at_a_time(self, client_with_db):
+        n_default = app_module.import_conversations_data(_tricky_export())
+        conn = app_module.get_db()
+        expected = _dump_tables(conn)
+        _clear_tables(conn)
+        conn.close()
+
+        n_bulk = app_module.import_conversations_data(_tricky_export(), bulk=True)
+        conn = app_module.get_db()
+        actual = _dump_tables(conn)
+        conn.close()
+        assert n_bulk == n_default == 2
+        assert actual == expected
+        assert ("a1", "a2") in expected["message_children"]
+        assert ("shared", "b1") in expected["message_children"]
+
+    def test_bulk_spanning_several_batches_matches(self, client_with_db, sample_chatgpt_export):
+        data = []
+        for i in range(IMPORT_BATCH_SIZE * 2 + 3):
+            conv = json.loads(json.dumps(sample_chatgpt_export[0]))
+            conv["id"] = f"conv-{i}"
+            conv["mapping"] = {f"{k}-{i}": v for k, v in conv["mapping"].items()}
+            for v in conv["mapping"].values():
+                v["children"] = [f"{c}-{i}" for c in v["children"]]
+            data.append(conv)
+        assert app_module.import_conversations_data(data, bulk=True) == len(data)
+        conn = app_module.get_db()
+        counts = [conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("messages", "message_children")]
+        conn.close()
+        assert counts == [2 * len(data), len(data)]
+
+    def test_bulk_falls_back_row_by_row_on_unbindable_value(self, client_with_db, sample_chatgpt_export):
+        bad = json.loads(json.dumps(sample_chatgpt_export[0]))
+        bad["id"] = "conv-bad"
+        bad["mapping"] = {"bad-msg": {"message": {"author": {"role": {"nested": True}}, "content": {"parts": []}},
+                                      "parent": None, "children": []}}
+        n = app_module.import_conversations_data(sample_chatgpt_export + [bad], bulk=True)
+        conn = app_module.get_db()
+        ids = {r[0] for r in conn.execute("SELECT id FROM messages").fetchall()}
+        conn.close()
+        assert n == 2
+        assert ids == {"test-message-123", "test-message-124"}
+
+    def test_worker_pool_matches_single_process(self, client_with_db):
+        n_default = app_module.import_conversations_data(_tricky_export())
+        conn = app_module.get_db()
+        expected = _dump_tables(conn)
+        _clear_tables(conn)
+        conn.close()
+
+        n_workers = app_module.import_conversations_data(iter(_tricky_export()), bulk=True, workers=2)
+        conn = app_module.get_db()
+        actual = _dump_tables(conn)
+        conn.close()
+        assert n_workers == n_default
+        assert actual == expected
+
+
+class TestShardedImport:
+    """import_conversations_sharded writes through per-process shard files and merges them with ATTACH."""
+
+    def _export(self):
+        # Message ids shared across conversations may resolve differently across shards; keep them apart.
+        data = [c for c in _tricky_export() if c.get("id") != "conv-b"]
+        for i in range(130):
+            data.append({"id": f"bulk-{i}", "title": f"T{i}", "update_time": float(i), "mapping": {
+                f"m{i}-1": {"message": {"author": {"role": "user"}, "content": {"parts": [f"q{i}"]}},
+                            "parent": None, "children": [f"m{i}-2"]},
+                f"m{i}-2": {"message": {"author": {"role": "assistant"}, "content": {"parts": [f"a{i}"]},
+                                        "metadata": {"model_slug": "gpt-4"}},
+                            "parent": f"m{i}-1", "children": []},
+            }})
+        return data
+
+    @pytest.mark.parametrize("bulk_load", [False, True])
+    def test_sharded_matches_single_writer(self, client_with_db, bulk_load):
+        n_default = app_module.import_conversations_data(self._export())
+        conn = app_module.get_db()
+        expected = _dump_tables(conn)
+        _clear_tables(conn)
+        conn.close()
+
+        n_sharded = db_module.import_conversations_sharded(iter(self._export()), 3, bulk_load=bulk_load)
+        conn = app_module.get_db()
+        actual = _dump_tables(conn)
+        conn.close()
+        assert n_sharded == n_default
+        assert actual == expected
+
+    def test_reimport_replaces_links(self, client_with_db):
+        data = self._export()
+        db_module.import_conversations_sharded(data, 2)
+        data[-1]["mapping"]["m129-3"] = {"message": {"author": {"role": "assistant"}, "content": {"parts": ["b"]}},
+                                         "parent": "m129-1", "children": []}
+        data[-1]["mapping"]["m129-1"]["children"] = ["m129-3"]
+        db_module.import_conversations_sharded(data, 2)
+        conn = app_module.get_db()
+        links = conn.execute("SELECT child_id FROM message_children WHERE parent_id = 'm129-1'").fetchall()
+        conn.close()
+        assert [r[0] for r in links] == ["m129-3"]
+
+    def test_reimport_drops_links_of_a_parent_left_without_children(self, client_with_db):
+        data = self._export()
+        db_module.import_conversations_sharded(data, 2)
+        data[-1]["mapping"]["m129-1"]["children"] = []
+        db_module.import_conversations_sharded(data, 2)
+        conn = app_module.get_db()
+        links = conn.execute("SELECT child_id FROM message_children WHERE parent_id = 'm129-1'").fetchall()
+        conn.close()
+        assert links == []
+
+
+class TestDeltaImport:
+    """delta=True skips conversations whose stored fingerprint matches."""
+
+    def test_unchanged_conversations_are_skipped(self, client_with_db, sample_chatgpt_export):
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True) == 1
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True) == 0
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True, bulk=True) == 0
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True, workers=2) == 0
+
+    def test_unchanged_conversations_are_not_normalized(self, client_with_db, sample_chatgpt_export):
+        app_module.import_conversations_data(sample_chatgpt_export, delta=True)
+        with patch.object(db_module, "_conversation_rows", side_effect=AssertionError("normalized")):
+            assert app_module.import_conversations_data(sample_chatgpt_export, delta=True) == 0
+
+    def test_plain_import_drops_fingerprints(self, client_with_db, sample_chatgpt_export):
+        app_module.import_conversations_data(sample_chatgpt_export, delta=True)
+        app_module.import_conversations_data(sample_chatgpt_export)
+        conn = app_module.get_db()
+        assert conn.execute("SELECT COUNT(*) FROM conversation_fingerprints").fetchone()[0] == 0
+        conn.close()
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True) == 1
+
+    def test_changed_conversation_is_rewritten(self, client_with_db, sample_chatgpt_export):
+        app_module.import_conversations_data(sample_chatgpt_export, delta=True)
+        changed = json.loads(json.dumps(sample_chatgpt_export))
+        changed[0]["title"] = "Renamed"
+        changed[0]["update_time"] = 1640999999.0
+        other = dict(changed[0], id="brand-new", mapping={})
+        assert app_module.import_conversations_data(changed + [other], delta=True) == 2
+        conn = app_module.get_db()
+        title = conn.execute("SELECT title FROM conversations WHERE id = ?", ("test-conversation-123",)).fetchone()[0]
+        stored = conn.execute(
+            "SELECT update_time FROM conversation_fingerprints WHERE conversation_id = ?",
+            ("test-conversation-123",),
+        ).fetchone()[0]
+        conn.close()
+        assert title == "Renamed"
+        assert float(stored) == 1640999999.0
+
+    def test_deleted_conversation_is_reimported(self, client_with_db, sample_chatgpt_export):
+        import db as db_module
+        app_module.import_conversations_data(sample_chatgpt_export)
+        conn = app_module.get_db()
+        db_module.delete_conversation(conn, "test-conversation-123")
+        conn.commit()
+        conn.close()
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True) == 1
+        assert app_module.import_conversations_data(sample_chatgpt_export, delta=True) == 0
+
+
+class TestReimport:
+    """Re-importing a conversation replaces its messages; ones missing from the new export are removed."""
+
+    @pytest.mark.parametrize("options", [{}, {"bulk": True}, {"delta": True}, {"shards": 2}])
+    def test_removed_message_is_deleted(self, client_with_db, sample_chatgpt_export, options):
+        def run(data):
+            if "shards" in options:
+                return db_module.import_conversations_sharded(data, options["shards"])
+            return app_module.import_conversations_data(data, **options)
+
+        run(sample_chatgpt_export)
+        pruned = json.loads(json.dumps(sample_chatgpt_export))
+        del pruned[0]["mapping"]["test-message-124"]
+        pruned[0]["mapping"]["test-message-123"]["children"] = []
+        pruned[0]["update_time"] = 1640999999.0
+        assert run(pruned) == 1
+        conn = app_module.get_db()
+        counts = [conn.execute(sql).fetchone()[0] for sql in (
+            "SELECT COUNT(*) FROM messages",
+            "SELECT COUNT(*) FROM message_metadata WHERE message_id = 'test-message-124'",
+            "SELECT COUNT(*) FROM message_children",
+            "SELECT COUNT(*) FROM message_text WHERE message_id = 'test-message-124'",
+        )]
+        conn.close()
+        assert counts == [1, 0, 0, 0]
+
+
+class TestBulkLoad:
+    """bulk_load=True drops and rebuilds secondary indexes around the load."""
+
+    def test_bulk_load_rebuilds_indexes_and_analyzes(self, client_with_db):
+        conn = app_module.get_db()
+        indexes_before = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name"
+        ).fetchall()
+        conn.close()
+
+        n = app_module.import_conversations_data(_tricky_export(), bulk=True, bulk_load=True)
+
+        conn = app_module.get_db()
+        indexes_after = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name"
+        ).fetchall()
+        has_stats = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0]
+        loaded = _dump_tables(conn)
+        _clear_tables(conn)
+        conn.close()
+        assert [tuple(r) for r in indexes_after] == [tuple(r) for r in indexes_before]
+        assert has_stats == 1
+
+        assert app_module.import_conversations_data(_tricky_export()) == n
+        conn = app_module.get_db()
+        assert _dump_tables(conn) == loaded
+        conn.close()
+
+    @pytest.mark.parametrize("sharded", [False, True])
+    def test_cold_load_never_scans_conversation_facets(self, client_with_db, monkeypatch, sharded):
+        statements = []
+        get_db = db_module.get_db
+
+        def traced_db():
+            conn = get_db()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(db_module, "get_db", traced_db)
+        if sharded:
+            db_module.import_conversations_sharded(_tricky_export(), 2, bulk_load=True)
+        else:
+            app_module.import_conversations_data(_tricky_export(), bulk=True, bulk_load=True)
+        assert any("INSERT INTO conversation_facets" in s or 'main."conversation_facets"' in s for s in statements)
+        # With idx_conversation_facets_conversation_id dropped, any per-conversation delete is a full scan.
+        assert not [s for s in statements if re.search(r'DELETE FROM (main\.)?"?conversation_facets', s)]
+
+
+class TestImportTimings:
+    """timings= accumulates seconds per importer phase (used by scripts/bench_ingest.py)."""
+
+    @pytest.mark.parametrize("kwargs", [{}, {"bulk": True, "bulk_load": True}])
+    def test_phases_are_reported(self, client_with_db, kwargs):
+        timings = {}
+        app_module.import_conversations_data(iter(_tricky_export()), timings=timings, **kwargs)
+        expected = {"parse", "normalize", "messages", "children", "derived", "commit"}
+        if kwargs:
+            expected.add("index_rebuild")
+        assert set(timings) == expected
+        assert all(seconds >= 0 for seconds in timings.values())
+
+
+class TestCanonicalThread:
+    """Imports store each conversation's canonical thread; it matches the on-the-fly walk it replaces."""
+
+    def _branched(self):
+        import importlib.util
+        import os
+        path = os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "generate_export.py")
+        spec = importlib.util.spec_from_file_location("generate_export", path)
+        generate_export = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(generate_export)
+        opts = generate_export.build_parser().parse_args(
+            ["out.json", "--conversations", "25", "--depth", "10", "--branching", "3", "--branch-prob", "0.5"])
+        return list(generate_export.generate_export(opts))
+
+    def _threads(self, conn):
+        rows = conn.execute("SELECT conversation_id, message_id FROM canonical_thread ORDER BY conversation_id, position")
+        threads = {}
+        for conversation_id, message_id in rows.fetchall():
+            threads.setdefault(conversation_id, []).append(message_id)
+        return threads
+
+    @pytest.mark.parametrize("kwargs", [{}, {"bulk": True}])
+    def test_thread_matches_walk(self, client_with_db, kwargs):
+        from routes.main import _walk_canonical_path
+        data = self._branched()
+        app_module.import_conversations_data(data, **kwargs)
+        conn = app_module.get_db()
+        threads = self._threads(conn)
+        walked = {c["id"]: [r["id"] for r in reversed(_walk_canonical_path(conn, c["id"], "m.id, m.parent_id"))] for c in data}
+        conn.close()
+        assert threads == walked
+        assert any(len(c["mapping"]) - 1 > len(threads[c["id"]]) for c in data)  # some threads skip branches
+
+    def test_reimport_and_delete_replace_thread(self, client_with_db):
+        data = self._branched()[:3]
+        app_module.import_conversations_data(data)
+        data[0]["mapping"] = {k: v for k, v in list(data[0]["mapping"].items())[:2]}
+        first = list(data[0]["mapping"])[1]
+        data[0]["mapping"][first]["children"] = []
+        app_module.import_conversations_data(data[:1])
+        conn = app_module.get_db()
+        db_module.delete_conversation(conn, data[1]["id"])
+        conn.commit()
+        threads = self._threads(conn)
+        conn.close()
+        assert threads[data[0]["id"]] == [first]
+        assert data[1]["id"] not in threads and data[2]["id"] in threads
+
+    def test_rebuild_fills_missing_threads(self, client_with_db):
+        app_module.import_conversations_data(self._branched())
+        conn = app_module.get_db()
+        expected = self._threads(conn)
+        conn.execute("DELETE FROM canonical_thread WHERE conversation_id IN (SELECT id FROM conversations LIMIT 10)")
+        conn.commit()
+        rebuilt = db_module.rebuild_canonical_threads(conn, batch_size=4)
+        actual = self._threads(conn)
+        conn.close()
+        assert rebuilt == 10
+        assert actual == expected
+
+
+class TestConversationSummary:
+    """Imports keep conversation_summary equal to what aggregating the stored rows gives."""
+
+    _AGGREGATE = """
+        SELECT c.id,
+               (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id),
+               (SELECT COUNT(*) FROM canonical_thread t WHERE t.conversation_id = c.id),
+               (SELECT MIN(CAST(create_time AS REAL)) FROM messages m WHERE m.conversation_id = c.id),
+               (SELECT MAX(CAST(create_time AS REAL)) FROM messages m WHERE m.conversation_id = c.id),
+               (SELECT json_group_array(model_slug) FROM (SELECT DISTINCT mm.model_slug FROM messages m
+                    JOIN message_metadata mm ON mm.message_id = m.id
+                    WHERE m.conversation_id = c.id AND mm.model_slug != '' ORDER BY 1))
+        FROM conversations c ORDER BY c.id
+    """
+
+    @staticmethod
+    def _row(r):
+        # messages.create_time is TEXT (15 significant digits); the importer keeps the full float
+        ms = lambda t: None if t is None else round(t, 3)  # noqa: E731
+        return (r[0], r[1], r[2], ms(r[3]), ms(r[4]), json.loads(r[5]))
+
+    def _summaries(self, conn):
+        return [self._row(r) for r in conn.execute("SELECT * FROM conversation_summary ORDER BY conversation_id").fetchall()]
+
+    @pytest.mark.parametrize("kwargs", [{}, {"bulk": True}])
+    def test_summary_matches_aggregates(self, client_with_db, kwargs):
+        data = [c for c in _tricky_export() if c.get("id") != "conv-b"] + TestCanonicalThread()._branched()
+        app_module.import_conversations_data(data, **kwargs)
+        conn = app_module.get_db()
+        expected = [self._row(r) for r in conn.execute(self._AGGREGATE).fetchall()]
+        stored = self._summaries(conn)
+        conn.close()
+        # conv-c could not be walked, so it has a conversation row but no summary
+        assert stored == [row for row in expected if row[0] != "conv-c"]
+        assert ["gpt-4"] in [row[5] for row in stored]
+
+    def test_delete_and_rebuild(self, client_with_db):
+        app_module.import_conversations_data(TestCanonicalThread()._branched())
+        conn = app_module.get_db()
+        expected = self._summaries(conn)
+        db_module.delete_conversation(conn, expected[0][0])
+        conn.execute("DELETE FROM conversation_summary WHERE conversation_id IN (SELECT id FROM conversations LIMIT 5)")
+        conn.commit()
+        assert db_module.rebuild_conversation_summaries(conn, batch_size=2) == 5
+        actual = self._summaries(conn)
+        conn.close()
+        assert actual == expected[1:]
@@ -55,3 +55,46 @@ def test_init_db_main_refuses_when_db_exists_without_force(tmp_path, monkeypatch
         init_db_module.main()
     assert exc_info.value.code != 0
     assert db_path.read_bytes() == b"existing"
+
+
+def test_init_db_main_migrate_upgrades_existing_db(tmp_path, monkeypatch, capsys):
+    """init_db.py status lists pending migrations; migrate applies them and keeps the data."""
+    import sqlite3
+    import sys
+    import db as db_module
+    import migrations
+    db_path = tmp_path / "chatgpt.db"
+    monkeypatch.setattr(db_module, "DATABASE_PATH", str(db_path))
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        "CREATE TABLE conversations (id TEXT PRIMARY KEY, create_time TEXT, update_time TEXT, title TEXT);"
+        "CREATE TABLE messages (id TEXT PRIMARY KEY, conversation_id TEXT, role TEXT, content TEXT,"
+        " create_time TEXT, update_time TEXT, parent_id TEXT);"
+        "CREATE TABLE message_metadata (message_id TEXT PRIMARY KEY, model_slug TEXT);"
+        "INSERT INTO conversations (id, title, update_time) VALUES ('c1', 'Kept', '1700000000');"
+    )
+    conn.close()
+    import init_db as init_db_module
+    monkeypatch.setattr(sys, "argv", ["init_db.py", "status"])
+    init_db_module.main()
+    assert "Schema version: 0" in capsys.readouterr().out
+    monkeypatch.setattr(sys, "argv", ["init_db.py", "migrate"])
+    init_db_module.main()
+    assert f"schema version is now {migrations.LATEST_VERSION}" in capsys.readouterr().out
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT title, update_ts FROM conversations").fetchone() == ("Kept", 1700000000.0)
+    conn.close()
+
+
+def test_init_db_main_migrate_requires_existing_db(tmp_path, monkeypatch):
+    """init_db.py migrate exits with error instead of creating a database."""
+    import sys
+    import db as db_module
+    db_path = tmp_path / "chatgpt.db"
+    monkeypatch.setattr(db_module, "DATABASE_PATH", str(db_path))
+    monkeypatch.setattr(sys, "argv", ["init_db.py", "migrate"])
+    import init_db as init_db_module
+    with pytest.raises(SystemExit) as exc_info:
+        init_db_module.main()
+    assert exc_info.value.code != 0
+    assert not db_path.exists()
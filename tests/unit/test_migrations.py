@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for migrations: versioned upgrades of databases created by older releases."""
+
+import json
+import sqlite3
+
+import pytest
+
+import app as app_module
+import db as db_module
+import migrations
+import search
+
+# schema.sql as released before schema_version existed
+LEGACY_SCHEMA = """
+CREATE TABLE conversations (id TEXT PRIMARY KEY, create_time TEXT, update_time TEXT, title TEXT);
+CREATE TABLE messages (id TEXT PRIMARY KEY, conversation_id TEXT, role TEXT, content TEXT,
+                       create_time TEXT, update_time TEXT, parent_id TEXT);
+CREATE TABLE message_metadata (message_id TEXT PRIMARY KEY, message_type TEXT, model_slug TEXT, citations TEXT,
+                               content_references TEXT, finish_details TEXT, is_complete BOOLEAN, request_id TEXT,
+                               timestamp_ TEXT, message_source TEXT, serialization_metadata TEXT);
+CREATE TABLE message_children (parent_id TEXT, child_id TEXT, PRIMARY KEY (parent_id, child_id));
+CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
+CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "legacy.db")
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO conversations (id, update_time) VALUES (?, ?)",
+                     [("c1", "1700000000.5"), ("c2", ""), ("empty", "1600000000")])
+    # c1 branches at m1: m3 is the newer leaf, so the canonical thread is m1 -> m3
+    conn.executemany("INSERT INTO messages (id, conversation_id, role, content, create_time, parent_id) VALUES (?, ?, ?, ?, ?, ?)", [
+        ("m1", "c1", "user", '["q"]', "1700000000.0", None),
+        ("m2", "c1", "assistant", '["a"]', "1700000001.0", "m1"),
+        ("m3", "c1", "assistant", '["b"]', "1700000002.0", "m1"),
+        ("n1", "c2", "user", '["x"]', None, None),
+    ])
+    conn.execute("INSERT INTO message_metadata (message_id, model_slug) VALUES ('m3', 'gpt-4o')")
+    conn.execute("""INSERT INTO settings (key, value) VALUES ('pinned_conversation_ids', '["c2", "gone"]')""")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_upgrade_applies_pending_steps_in_order(legacy_db, capsys):
+    applied = migrations.upgrade(legacy_db)
+    assert [m.version for m in applied] == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.current_version(legacy_db) == migrations.LATEST_VERSION
+    assert "Applying migration 1/" in capsys.readouterr().err
+
+    weeks = legacy_db.execute("SELECT id, update_ts, update_week FROM conversations ORDER BY update_ts DESC").fetchall()
+    assert weeks[:2] == [("c1", 1700000000.5, 2810), ("empty", 1600000000.0, 2645)]
+    assert weeks[2] == ("c2", None, None)
+    plan = legacy_db.execute("EXPLAIN QUERY PLAN SELECT id FROM conversations ORDER BY update_ts DESC LIMIT 10").fetchall()
+    assert "idx_conversations_update_ts_id" in plan[0][3]
+    threads = legacy_db.execute("SELECT conversation_id, position, message_id FROM canonical_thread ORDER BY 1, 2").fetchall()
+    assert threads == [("c1", 1, "m1"), ("c1", 2, "m3"), ("c2", 1, "n1")]
+    summary = legacy_db.execute("SELECT * FROM conversation_summary WHERE conversation_id = 'c1'").fetchone()
+    assert summary[:5] == ("c1", 3, 2, 1700000000.0, 1700000002.0) and json.loads(summary[5]) == ["gpt-4o"]
+    assert search.search_messages(legacy_db, "b")[1][0]["message_id"] == "m3"
+    legacy_db.execute("INSERT INTO title_fts (title_fts) VALUES ('integrity-check')")
+    facet_rows = legacy_db.execute("SELECT facet, value FROM conversation_facets WHERE conversation_id = 'c1' ORDER BY 1, 2").fetchall()
+    assert facet_rows == [("content_type", "text"), ("model", "gpt-4o"), ("role", "assistant"), ("role", "user")]
+    assert legacy_db.execute("SELECT conversation_id FROM pins").fetchall() == [("c2",)]
+    assert legacy_db.execute("SELECT 1 FROM settings WHERE key = 'pinned_conversation_ids'").fetchone() is None
+
+    assert migrations.upgrade(legacy_db) == []
+    db_module._apply_schema(legacy_db)  # schema.sql now applies cleanly on top
+    assert legacy_db.execute("SELECT COUNT(*) FROM content_blobs").fetchone()[0] == 0
+
+
+def test_failed_step_rolls_back_and_keeps_earlier_ones(legacy_db, monkeypatch):
+    def broken(conn, progress):
+        conn.execute("CREATE TABLE half_done (x)")
+        raise ValueError("boom")
+
+    steps = migrations.MIGRATIONS + (migrations.Migration(migrations.LATEST_VERSION + 1, "Broken step", broken),)
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps)
+    with pytest.raises(RuntimeError, match="Broken step.*boom"):
+        migrations.upgrade(legacy_db, progress=lambda message: None)
+    assert migrations.current_version(legacy_db) == migrations.LATEST_VERSION
+    assert legacy_db.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+
+def test_app_refuses_requests_until_migrated(legacy_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(db_module, "DATABASE_PATH", str(tmp_path / "legacy.db"))
+    monkeypatch.setattr(app_module, "_schema_ready", False)
+    with app_module.app.test_client() as client:
+        r = client.get("/")
+        assert r.status_code == 503 and b"python init_db.py migrate" in r.data
+        assert migrations.current_version(legacy_db) == 0  # nothing ran inside the request
+        migrations.upgrade(legacy_db, progress=lambda message: None)
+        assert client.get("/").status_code == 200
+    assert app_module._schema_ready
+
+
+def test_app_creates_a_new_database_on_first_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_module, "DATABASE_PATH", str(tmp_path / "new.db"))
+    monkeypatch.setattr(app_module, "_schema_ready", False)
+    with app_module.app.test_client() as client:
+        assert client.get("/").status_code == 200
+    conn = sqlite3.connect(tmp_path / "new.db")
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    conn.close()
+
+
+def test_new_database_is_stamped_without_running_steps():
+    conn = sqlite3.connect(":memory:")
+    db_module._apply_schema(conn)
+    assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert migrations.pending(conn) == []
+    conn.close()
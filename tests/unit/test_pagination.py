@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for pagination: cursor tokens and keyset pages over conversations, including pinned and undated ones."""
+
+import app as app_module
+import pagination
+
+SELECT = "SELECT c.id, c.update_ts, EXISTS (SELECT 1 FROM pins p WHERE p.conversation_id = c.id) AS pinned FROM conversations c"
+
+
+def _ids(rows):
+    return [row["id"] for row in rows]
+
+
+def _seed():
+    conn = app_module.get_db()
+    conn.executemany("INSERT INTO conversations (id, update_time) VALUES (?, ?)", [
+        ("a", "100"), ("b", "300"), ("c", "200"), ("d", "200"), ("e", ""), ("f", None),
+    ])
+    conn.commit()
+    return conn
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    token = pagination.encode_cursor({"pinned": 0, "update_ts": 1700000000.25, "id": "x/y"})
+    assert pagination.decode_cursor(token) == (False, 1700000000.25, "x/y")
+    assert pagination.decode_cursor(pagination.encode_cursor({"pinned": 1, "update_ts": None, "id": "z"})) == (True, None, "z")
+    for bad in (None, "", "!!!", pagination.encode_cursor({"pinned": 0, "update_ts": "1", "id": "z"})):
+        assert pagination.decode_cursor(bad) is None
+
+
+def test_pages_walk_newest_first_and_back(client_with_db):
+    conn = _seed()
+    pages, after = [], None
+    while True:
+        rows, newer, older = pagination.keyset_page(conn, SELECT, [], [], 2, after=after)
+        pages.append(_ids(rows))
+        if older is None:
+            break
+        after = pagination.decode_cursor(older)
+    assert pages == [["b", "d"], ["c", "a"], ["f", "e"]]  # ties on update_ts by id; undated last
+
+    rows, newer, older = pagination.keyset_page(conn, SELECT, [], [], 2, before=pagination.decode_cursor(newer))
+    assert _ids(rows) == ["c", "a"] and newer is not None and older is not None
+    rows, newer, _ = pagination.keyset_page(conn, SELECT, [], [], 2, before=pagination.decode_cursor(newer))
+    assert _ids(rows) == ["b", "d"] and newer is None
+    rows, _, _ = pagination.keyset_page(conn, SELECT, ["c.id != ?"], ["d"], 3)
+    assert _ids(rows) == ["b", "c", "a"]
+    conn.close()
+
+
+def test_pinned_conversations_come_first(client_with_db):
+    conn = _seed()
+    conn.executemany("INSERT INTO pins (conversation_id) VALUES (?)", [("a",), ("f",)])
+    conn.commit()
+    rows, _, older = pagination.keyset_page(conn, SELECT, [], [], 3)
+    assert _ids(rows) == ["a", "f", "b"] and [r["pinned"] for r in rows] == [1, 1, 0]
+    rows, newer, _ = pagination.keyset_page(conn, SELECT, [], [], 3, after=pagination.decode_cursor(older))
+    assert _ids(rows) == ["d", "c", "e"]
+    rows, _, _ = pagination.keyset_page(conn, SELECT, [], [], 2, before=pagination.decode_cursor(newer))
+    assert _ids(rows) == ["f", "b"]
+    conn.close()
+
+
+def test_deep_page_seeks_the_index(client_with_db):
+    conn = _seed()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT c.id FROM conversations c WHERE (c.update_ts, c.id) < (?, ?) "
+        "ORDER BY c.update_ts DESC, c.id DESC LIMIT 10", (200, "d"),
+    ).fetchall()
+    assert "SEARCH c USING INDEX idx_conversations_update_ts_id" in plan[0][3]
+    conn.close()
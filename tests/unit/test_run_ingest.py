@@ -87,3 +87,112 @@ def test_run_ingest_init_db_flag(tmp_path, monkeypatch, sample_chatgpt_export):
         assert row is not None
     finally:
         db_module.get_db = original_get_db
+
+
+def test_run_ingest_rejects_zero_workers(tmp_path, monkeypatch):
+    """--workers must be a positive process count."""
+    import run_ingest as run_ingest_module
+    monkeypatch.setattr(sys, "argv", ["run_ingest.py", "--workers", "0", str(tmp_path / "c.json")])
+    with pytest.raises(SystemExit) as exc_info:
+        run_ingest_module.main()
+    assert exc_info.value.code != 0
+
+
+def test_run_ingest_from_export_zip(tmp_path, monkeypatch, sample_chatgpt_export):
+    """run_ingest accepts the export .zip and reads conversations.json from inside it."""
+    import zipfile
+    import app as app_module
+    import db as db_module
+    import run_ingest as run_ingest_module
+
+    zip_path = tmp_path / "chatgpt-export.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("conversations.json", json.dumps(sample_chatgpt_export))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["run_ingest.py", "--init-db", str(zip_path)])
+    db_path = tmp_path / "chatgpt.db"
+
+    def get_test_db():
+        import sqlite3
+        conn = sqlite3.connect(str(db_path))
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    monkeypatch.setattr(db_module, "get_db", get_test_db)
+    run_ingest_module.main()
+    conn = get_test_db()
+    count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    conn.close()
+    assert count == 2
+
+
+def test_run_ingest_resume_continues_from_checkpoint(tmp_path, monkeypatch, capsys):
+    """An interrupted ingest resumes after the last committed batch without rewriting it."""
+    import db as db_module
+    import run_ingest as run_ingest_module
+
+    data = [{"id": f"conv-{i}", "title": f"T{i}", "mapping": {}} for i in range(120)]
+    json_path = tmp_path / "conversations.json"
+    json_path.write_text(json.dumps(data), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / "chatgpt.db"
+    opened = []
+
+    def get_test_db():
+        import sqlite3
+        conn = sqlite3.connect(str(db_path))
+        conn.row_factory = sqlite3.Row
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db_module, "get_db", get_test_db)
+    real_write = db_module._write_conversation
+    written = []
+
+    def crash_after_70(conn, rows, timings=None):
+        if len(written) == 70:
+            raise KeyboardInterrupt
+        written.append(rows["id"])
+        return real_write(conn, rows, timings)
+
+    monkeypatch.setattr(db_module, "_write_conversation", crash_after_70)
+    monkeypatch.setattr(sys, "argv", ["run_ingest.py", "--init-db", str(json_path)])
+    with pytest.raises(KeyboardInterrupt):
+        run_ingest_module.main()
+    for conn in opened:  # the interrupted process would have died, discarding its open transaction
+        conn.close()
+
+    written.clear()
+    monkeypatch.setattr(db_module, "_write_conversation", lambda conn, rows, timings=None: written.append(rows["id"]) or real_write(conn, rows, timings))
+    monkeypatch.setattr(sys, "argv", ["run_ingest.py", "--resume", str(json_path)])
+    run_ingest_module.main()
+    assert written == [f"conv-{i}" for i in range(50, 120)]
+    conn = get_test_db()
+    assert conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 120
+    saved = dict(conn.execute("SELECT * FROM ingest_checkpoints").fetchone())
+    conn.close()
+    assert saved["conversations"] == 120 and saved["complete"] == 1
+    assert saved["last_conversation_id"] == "conv-119"
+    assert saved["byte_offset"] == len(json.dumps(data)) - 1
+
+    capsys.readouterr()
+    run_ingest_module.main()
+    assert "nothing to resume" in capsys.readouterr().out
+
+
+def test_run_ingest_rejects_negative_shards(tmp_path, monkeypatch, capsys):
+    import run_ingest as run_ingest_module
+    monkeypatch.setattr(sys, "argv", ["run_ingest.py", "--shards", "-1", str(tmp_path / "c.json")])
+    with pytest.raises(SystemExit):
+        run_ingest_module.main()
+    assert "--shards must be 0 (off) or a positive count" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("extra", [["--delta"], ["--resume"], ["--workers", "2"]])
+def test_run_ingest_rejects_shards_with_incompatible_flags(tmp_path, monkeypatch, extra):
+    """--shards bypasses the checkpointed single-writer path, so it cannot be mixed with these."""
+    import run_ingest as run_ingest_module
+    monkeypatch.setattr(sys, "argv", ["run_ingest.py", "--shards", "2", *extra, str(tmp_path / "c.json")])
+    with pytest.raises(SystemExit) as exc_info:
+        run_ingest_module.main()
+    assert exc_info.value.code != 0
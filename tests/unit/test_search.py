@@ -0,0 +1,113 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for search: message text extraction, the FTS indexes kept by import/delete, ranked and title search."""
+
+import json
+
+import app as app_module
+import db as db_module
+import search
+
+TOOL_OUTPUT = "Traceback: the flux capacitor overheated while rendering the report. " * 3
+
+
+def _conversation(cid, texts, update_time=1.0):
+    mapping = {}
+    for i, text in enumerate(texts):
+        mapping[f"{cid}-m{i}"] = {
+            "message": {"author": {"role": "user" if i % 2 == 0 else "assistant"}, "content": {"parts": [text]}},
+            "parent": f"{cid}-m{i - 1}" if i else None,
+            "children": [f"{cid}-m{i + 1}"] if i + 1 < len(texts) else [],
+        }
+    return {"id": cid, "title": f"Title {cid}", "update_time": update_time, "mapping": mapping}
+
+
+def test_message_text_keeps_strings_and_text_parts():
+    parts = ["  Hello  ", {"content_type": "audio_transcription", "text": "spoken words"},
+             {"content_type": "image_asset_pointer", "asset_pointer": "file-service://x"}, "", None]
+    assert search.message_text(parts) == "Hello\nspoken words"
+    assert search.message_text("not a list") == ""
+
+
+def test_fts_query_quotes_every_word():
+    assert search.fts_query('flux "capacitor') == '"flux" """capacitor"'
+    assert search.fts_query('  AND ( ') == '"AND" "("'
+    assert search.fts_query('"') == ''
+
+
+def test_import_indexes_and_search_ranks_conversations(client_with_db):
+    app_module.import_conversations_data([
+        _conversation("c1", ["How do I fix the flux capacitor?", TOOL_OUTPUT, "Thanks"]),
+        _conversation("c2", ["Unrelated question", "A capacitor stores charge."]),
+        _conversation("c3", ["Nothing to see here"]),
+    ], bulk=True)
+    conn = app_module.get_db()
+    total, results = search.search_messages(conn, "capacitor")
+    assert total == 2
+    assert [r["conversation_id"] for r in results] == ["c2", "c1"]  # shorter matching message ranks higher
+    assert results[1]["hits"] == 2 and results[1]["title"] == "Title c1"
+    assert f"{search.SNIPPET_START}capacitor{search.SNIPPET_END}" in results[0]["snippet"]
+    assert search.search_messages(conn, "flux capacitor", limit=1, offset=1) == (1, [])
+    assert search.search_messages(conn, "overheated")[1][0]["message_id"] == "c1-m1"  # long part, stored as a blob
+    conn.close()
+
+
+def test_reimport_and_delete_keep_index_in_step(client_with_db):
+    app_module.import_conversations_data([_conversation("c1", ["first draft", "reply"])])
+    app_module.import_conversations_data([_conversation("c1", ["second draft", "reply"])])
+    conn = app_module.get_db()
+    assert search.search_messages(conn, "first")[0] == 0
+    assert search.search_messages(conn, "second")[0] == 1
+    db_module.delete_conversation(conn, "c1")
+    conn.commit()
+    assert search.search_messages(conn, "reply")[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM message_text").fetchone()[0] == 0
+    conn.execute("INSERT INTO message_fts (message_fts) VALUES ('integrity-check')")
+    conn.close()
+
+
+def test_index_existing_fills_in_messages_without_text(client_with_db):
+    conn = app_module.get_db()
+    conn.execute("INSERT INTO conversations (id, title) VALUES ('old', 'Old')")
+    conn.execute("INSERT INTO messages (id, conversation_id, content) VALUES ('o1', 'old', ?)", (json.dumps(["legacy words"]),))
+    conn.execute("INSERT INTO messages (id, conversation_id, content) VALUES ('o2', 'old', 'not json')")
+    conn.commit()
+    assert search.index_existing(conn, batch_size=1) == 1
+    assert search.index_existing(conn) == 0
+    assert search.search_messages(conn, "legacy")[1][0]["message_id"] == "o1"
+    conn.close()
+
+
+def test_title_query_needs_three_characters():
+    assert search.title_query("ab") is None
+    assert search.title_query('say "hi"') == '"say ""hi"""'
+
+
+def test_title_index_follows_reimport_and_delete(client_with_db):
+    app_module.import_conversations_data([_conversation("c1", ["x"]), _conversation("c2", ["y"])])
+    renamed = dict(_conversation("c1", ["x"]), title="Kubernetes networking")
+    app_module.import_conversations_data([renamed])
+    conn = app_module.get_db()
+    titles = lambda q: [r[0] for r in conn.execute(
+        "SELECT c.id FROM title_fts f JOIN conversations c ON c.rowid = f.rowid WHERE title_fts MATCH ? ORDER BY c.id",
+        (search.title_query(q),),
+    ).fetchall()]
+    assert titles("itle c") == ["c2"]
+    assert titles("ERNETES NET") == ["c1"]
+    db_module.delete_conversation(conn, "c1")
+    conn.commit()
+    assert titles("kubernetes") == []
+    conn.execute("INSERT INTO title_fts (title_fts) VALUES ('integrity-check')")
+    conn.close()
+
+
+def test_similar_titles_tolerate_typos(client_with_db):
+    conn = app_module.get_db()
+    conn.executemany("INSERT INTO conversations (id, title) VALUES (?, ?)", [
+        ("a", "Postgres replication lag"), ("b", "Postgres vacuum tuning"), ("c", "Baking sourdough bread"),
+    ])
+    conn.commit()
+    assert search.similar_titles(conn, "postgress replicaton") == ["a"]
+    assert search.similar_titles(conn, "sourdugh") == ["c"]
+    assert search.similar_titles(conn, "zz") == []
+    conn.close()
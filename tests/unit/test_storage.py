@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: AGPL-3.0-only
+# ChatGPT Browser tests - See LICENSE (AGPL-3.0).
+"""Unit tests for storage: content-addressed message blobs."""
+
+import json
+
+import app as app_module
+import storage
+
+LONG = "A system prompt long enough to be stored once in the blob store and referenced by hash."
+
+
+def _conversation(cid, texts):
+    mapping = {}
+    for i, text in enumerate(texts):
+        mapping[f"{cid}-m{i}"] = {
+            "message": {
+                "author": {"role": "user" if i % 2 == 0 else "assistant"},
+                "content": {"parts": [text]},
+                "metadata": {"message_type": "next", "finish_details": {"type": "stop", "stop_tokens": [100260, 100265]}},
+            },
+            "parent": f"{cid}-m{i - 1}" if i else None,
+            "children": [f"{cid}-m{i + 1}"] if i + 1 < len(texts) else [],
+        }
+    return {"id": cid, "title": cid, "mapping": mapping}
+
+
+def test_short_values_stay_inline():
+    blobs = {}
+    assert storage.store_value("[]", blobs) == "[]"
+    assert storage.store_value(None, blobs) is None
+    ref = storage.store_value(LONG, blobs)
+    assert storage.is_blob_ref(ref) and len(ref) == 17
+    assert blobs == {ref: LONG}
+
+
+def test_import_stores_repeated_values_once(client_with_db):
+    app_module.import_conversations_data([_conversation("c1", [LONG, "short", LONG]), _conversation("c2", [LONG])])
+    conn = app_module.get_db()
+    blobs = conn.execute("SELECT COUNT(*) FROM content_blobs").fetchone()[0]
+    kinds = {r[0] for r in conn.execute("SELECT typeof(content) FROM messages").fetchall()}
+    rows = storage.resolve_rows(conn, conn.execute(
+        "SELECT m.id, m.content, mm.finish_details FROM messages m JOIN message_metadata mm ON mm.message_id = m.id ORDER BY m.id"
+    ).fetchall())
+    conn.close()
+    # one blob for the repeated long part; "short" and the small finish_details stay inline
+    assert blobs == 1
+    assert kinds == {"blob", "text"}
+    assert json.loads(rows[0]["content"]) == [LONG]
+    assert json.loads(rows[1]["content"]) == ["short"]
+    assert all(json.loads(r["finish_details"]) == {"type": "stop", "stop_tokens": [100260, 100265]} for r in rows)
+
+
+def test_dedup_existing_and_prune(client_with_db):
+    conn = app_module.get_db()
+    conn.execute("INSERT INTO conversations (id) VALUES ('old')")
+    for i in range(3):
+        conn.execute("INSERT INTO messages (id, conversation_id, content) VALUES (?, 'old', ?)", (f"old-{i}", json.dumps([LONG])))
+    conn.execute("INSERT INTO content_blobs (hash, data) VALUES (?, 'orphan')", (storage.blob_ref("x" * 100),))
+    conn.commit()
+
+    assert storage.dedup_existing(conn, batch_size=2) == 3
+    assert storage.prune_blobs(conn) == 1
+    rows = storage.resolve_rows(conn, conn.execute("SELECT content FROM messages ORDER BY id").fetchall())
+    count = conn.execute("SELECT COUNT(*) FROM content_blobs").fetchone()[0]
+    conn.close()
+    assert count == 1
+    assert [r["content"] for r in rows] == [json.dumps([LONG])] * 3
+
+
+def test_missing_blob_resolves_to_none():
+    import sqlite3
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE content_blobs (hash BLOB PRIMARY KEY, data TEXT NOT NULL)")
+    rows = storage.resolve_rows(conn, [{"content": storage.blob_ref(LONG), "citations": "[]"}])
+    assert rows == [{"content": None, "citations": "[]"}]
+
+
+def test_compress_round_trip():
+    big = "tool output line\n" * 200
+    packed = storage.compress_text(big)
+    assert isinstance(packed, bytes) and packed[:1] == storage.COMPRESSED and len(packed) < len(big)
+    assert storage.decode_blob(packed) == big
+    assert storage.compress_text(LONG) == LONG  # under COMPRESS_MIN_LENGTH stays text
+    assert storage.decode_blob(LONG) == LONG
+
+
+def test_compressed_import_and_recode(client_with_db):
+    big = "Traceback (most recent call last):\n  File \"x.py\", line 1\n" * 100
+    conn = app_module.get_db()
+    conn.execute("UPDATE settings SET value = 'true' WHERE key = 'compress_content'")
+    conn.commit()
+    conn.close()
+    app_module.import_conversations_data([_conversation("c1", [big, LONG])])
+    conn = app_module.get_db()
+    kinds = sorted(r[0] for r in conn.execute("SELECT typeof(data) FROM content_blobs").fetchall())
+    query = "SELECT content FROM messages ORDER BY id"
+    before = [r["content"] for r in storage.resolve_rows(conn, conn.execute(query).fetchall())]
+    inflated = storage.recode_blobs(conn, compress=False)
+    after_inflate = [r["content"] for r in storage.resolve_rows(conn, conn.execute(query).fetchall())]
+    recompressed = storage.recode_blobs(conn, compress=True)
+    after_compress = [r["content"] for r in storage.resolve_rows(conn, conn.execute(query).fetchall())]
+    conn.close()
+    # only the large part is compressed; the 89-char part stays text
+    assert kinds == ["blob", "text"]
+    assert before == [json.dumps([big]), json.dumps([LONG])]
+    assert inflated == 1 and recompressed == 1
+    assert after_inflate == before and after_compress == before